@@ -1,37 +1,448 @@
-import io, re, regex
-from typing import Tuple, List
+import bisect, hashlib, io, multiprocessing, os, re, regex, threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Tuple, List, Optional, Union
 from pypdf import PdfReader
+from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, StreamObject
+from page_store import Revision
+from pdf_cache import cache_from_env, content_key
+from spool import SpooledBuffer
+from textdoc import Document
+from finders import (DATE_RX, ID_RX, BUYER_RX, EMAIL_RX, PHONE_RX, CURRENCY_RX, MONEY_RX, TITLE_RX,
+                     KEYWORD_STOPWORDS, SECTION_PATTERNS, top_keywords)
 
-DATE_RX = regex.compile(
-    r"(closing|due|submission)\s*(date|deadline)[^\S\r\n]*[:\-]?\s*"
-    r"(?P<date>(?:\d{4}[-/]\d{1,2}[-/]\d{1,2})|(?:\d{1,2}\s+\w+\s+\d{4})|(?:\w+\s+\d{1,2},\s*\d{4}))",
-    regex.IGNORECASE
-)
-ID_RX = regex.compile(r"(solicitation|tender|rfp|rfq|itt|reference)\s*(no\.?|#|id)?\s*[:\-]?\s*(?P<id>[A-Z0-9\-_/]{4,})", regex.IGNORECASE)
-BUYER_RX = regex.compile(r"(buyer|purchasing|procurement|organization|department)\s*[:\-]\s*(?P<buyer>.+)", regex.IGNORECASE)
-EMAIL_RX = re.compile(r"[A-Z0-9._%+-]+@[A-Z0-9.-]+\.[A-Z]{2,}", re.I)
-PHONE_RX = re.compile(r"(\+?\d[\d\-\s().]{7,}\d)")
-CURRENCY_RX = re.compile(r"\b(CAD|USD|C\$|\$)\b")
-MONEY_RX = re.compile(r"(?<!\w)(\d{1,3}(?:,\d{3})*(?:\.\d{2})?)")
-TITLE_RX = regex.compile(r"(?m)^\s*(request for.*|rfp.*|rfq.*|tender.*|standing offer.*|proposal.*)$", regex.IGNORECASE)
-
-def pdf_to_text(data: bytes) -> str:
-    reader = PdfReader(io.BytesIO(data))
-    chunks = []
+# raw upload bytes, or an upload spooled to disk and memory-mapped
+PdfSource = Union[bytes, SpooledBuffer]
+
+# Parallel extraction: 0 workers means "one per CPU"; documents shorter than
+# PDF_PARALLEL_MIN_PAGES stay on the serial path so small RFQs skip the pool.
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", "0") or 0)
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "40") or 40)
+
+# repeat uploads of the same bytes skip PDF parsing entirely
+EXTRACT_CACHE = cache_from_env("pages")
+
+_pools: Dict[int, ProcessPoolExecutor] = {}
+_pools_lock = threading.Lock()
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    # long-lived pools, one per worker count; spawning workers per request costs more than it saves.
+    # pdf_pages runs on several request threads at once, so creation is locked and a pool is never
+    # shut down while another thread may still submit to it. Workers come from a forkserver, not a
+    # fork of this threaded server (a child could inherit a lock held by another thread);
+    # _extract_pages only takes bytes or a path, so they need nothing from this process.
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            pool = _pools[workers] = ProcessPoolExecutor(max_workers=workers,
+                                                         mp_context=multiprocessing.get_context("forkserver"))
+        return pool
+
+def _cpu_count() -> int:
+    # respects cgroup/affinity limits on Cloud Run where os.cpu_count() reports the host
+    try:
+        return len(os.sched_getaffinity(0)) or 1
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def _extract_pages(src: Union[bytes, str], indices: List[int]) -> List[str]:
+    # src is the PDF bytes, or the path of a spooled upload so workers map the file themselves
+    reader = PdfReader(src if isinstance(src, str) else io.BytesIO(src))
+    return [reader.pages[i].extract_text() or "" for i in indices]
+
+def _reader(data: PdfSource) -> PdfReader:
+    return PdfReader(data.stream() if isinstance(data, SpooledBuffer) else io.BytesIO(data))
+
+def _buffer(data: PdfSource):
+    return data.buf if isinstance(data, SpooledBuffer) else data
+
+def pdf_pages(data: PdfSource, workers: Optional[int] = None, min_pages: Optional[int] = None,
+              only: Optional[List[int]] = None, reader: Optional[PdfReader] = None) -> List[str]:
+    """Extract text per page (or of the pages in `only`, in that order), sharding them across a process pool for long documents."""
+    reader = reader or _reader(data)
+    indices = list(range(len(reader.pages))) if only is None else list(only)
+    n = len(indices)
+    workers = PDF_WORKERS if workers is None else workers
+    workers = workers or _cpu_count()
+    min_pages = PDF_PARALLEL_MIN_PAGES if min_pages is None else min_pages
+    if workers <= 1 or n < max(min_pages, 2):
+        return [reader.pages[i].extract_text() or "" for i in indices]
+
+    # a few shards per worker keeps the pool busy when some pages are much heavier than others;
+    # the pool keeps the configured size, so short documents do not create pools of their own
+    pool = _get_pool(workers)
+    shards = min(n, workers * 4)
+    step = -(-n // shards)
+    src = (data.path or bytes(data.buf)) if isinstance(data, SpooledBuffer) else data
+    futures = [pool.submit(_extract_pages, src, indices[i:i + step]) for i in range(0, n, step)]
+    pages: List[str] = []
+    for fut in futures:  # submission order == page order
+        pages.extend(fut.result())
+    return pages
+
+def cached_pdf_pages(data: PdfSource, workers: Optional[int] = None, min_pages: Optional[int] = None) -> Tuple[List[str], bool]:
+    """Like pdf_pages, but served from EXTRACT_CACHE when the same bytes were seen before. Returns (pages, hit)."""
+    def extract():
+        pages = pdf_pages(data, workers=workers, min_pages=min_pages)
+        return pages, len(pages)
+    entry, hit = EXTRACT_CACHE.get_or_extract(_buffer(data), extract)
+    return entry["pages"], hit
+
+# page entries that cannot change a page's extracted text
+_FP_SKIP = frozenset(("/Parent", "/FontFile", "/FontFile2", "/FontFile3", "/CharProcs", "/Thumb", "/Annots"))
+
+def _digest(obj, memo: dict, depth: int = 0) -> bytes:
+    # shared objects (fonts, forms) are digested once per document
+    if isinstance(obj, IndirectObject):
+        ref = (obj.idnum, obj.generation)
+        if ref not in memo:
+            memo[ref] = b"cycle"
+            memo[ref] = _digest(obj.get_object(), memo, depth + 1)
+        return memo[ref]
+    if depth > 32:
+        return b"deep"
+    h = hashlib.blake2b(digest_size=16)
+    if isinstance(obj, DictionaryObject):
+        if obj.get("/Subtype") == "/Image":
+            return b"image"
+        for k in sorted(obj):
+            if k not in _FP_SKIP:
+                h.update(k.encode("utf-8"))
+                h.update(_digest(obj.raw_get(k), memo, depth + 1))
+        if isinstance(obj, StreamObject):
+            h.update(obj.get_data())
+    elif isinstance(obj, ArrayObject):
+        for x in obj:
+            h.update(_digest(x, memo, depth + 1))
+    else:
+        h.update(repr(obj).encode("utf-8"))
+    return h.digest()
+
+def page_fingerprints(data: PdfSource, reader: Optional[PdfReader] = None) -> List[str]:
+    """Digest of each page's content stream and the fonts and forms it draws text with.
+
+    Images, embedded font programs and annotations are left out, so the
+    digest changes exactly when the page's extracted text can. Costs a small
+    fraction of extracting the text.
+    """
+    reader = reader or _reader(data)
+    memo: dict = {}
+    out = []
     for page in reader.pages:
-        chunks.append(page.extract_text() or "")
-    return "\n".join(chunks)
-
-def top_keywords(text: str, k: int = 12) -> List[str]:
-    words = regex.findall(r"\b[^\W\d_]{3,}\b", text.lower())
-    stop = set("the and for with this that from are was were will would shall into upon about your have not you our any all per his her its may can as is on to of in by or an be it a".split())
-    freq = {}
-    for w in words:
-        if w in stop: continue
-        freq[w] = freq.get(w, 0) + 1
-    return [w for w,_ in sorted(freq.items(), key=lambda x: (-x[1], x[0]))[:k]]
-
-def extract_basic_fields(text: str) -> Tuple[dict, List[str]]:
+        h = hashlib.blake2b(digest_size=16)
+        contents = page.get_contents()
+        h.update(contents.get_data() if contents is not None else b"")
+        h.update(_digest(page.get("/Resources"), memo))
+        h.update(repr(page.get("/Rotate", 0)).encode("ascii"))
+        out.append(h.hexdigest())
+    return out
+
+def revised_pdf_pages(data: PdfSource, store, workers: Optional[int] = None,
+                      min_pages: Optional[int] = None) -> Tuple[List[str], int, Revision]:
+    """Per-page text, extracting only the pages that differ from the closest version in `store` (a PageStore).
+
+    Returns (pages, pages actually parsed, revision). Repeat uploads of the
+    same bytes are still served from EXTRACT_CACHE.
+    """
+    reader = _reader(data)
+    rev = store.revision(page_fingerprints(data, reader))
+    key = content_key(_buffer(data))
+    entry = EXTRACT_CACHE.get(key)
+    if entry is not None:
+        return entry["pages"], 0, rev
+    fresh = pdf_pages(data, workers=workers, min_pages=min_pages, only=rev.changed, reader=reader)
+    pages = rev.patch(fresh)
+    EXTRACT_CACHE.put(key, pages, len(pages))
+    return pages, len(fresh), rev
+
+def pdf_to_text(data: PdfSource, workers: Optional[int] = None, min_pages: Optional[int] = None) -> str:
+    pages, _hit = cached_pdf_pages(data, workers=workers, min_pages=min_pages)
+    return "\n".join(pages)
+
+# bullets inside a SECTION_PATTERNS section (see finders.py)
+BULLET_RX = regex.compile(r"^\s*(?:[-*•]\s+|\d+\.\s+)(.+)$")
+DANGLING_BULLET_RX = regex.compile(r"^\s*(?:[-*•]|\d+\.)\s*$")
+# every DATE_RX / ID_RX match starts with one of these keywords
+DATE_TRIGGERS = ("closing", "due", "submission")
+ID_TRIGGERS = ("solicitation", "tender", "rfp", "rfq", "itt", "reference")
+TRIGGER_RX = regex.compile(r"(?P<date>closing|due|submission)|(?P<id>solicitation|tender|rfp|rfq|itt|reference)", regex.IGNORECASE)
+PHONE_START_RX = re.compile(r"[+\d]")
+# how far a DATE_RX/ID_RX/PHONE_RX attempt can read: past a separator run
+# (whitespace, which spans pages, and :-#.) each part of the match is one
+# whitespace-free word, so an attempt stops at most a few words on
+_SEP_RX = re.compile(r"[\s:\-#.]*")
+_WORD_RX = re.compile(r"\S*")
+_PHONE_RUN_RX = re.compile(r"[\d\-\s().]*")
+DATE_WORDS = 5  # keyword, date|deadline, then up to three words of the date
+ID_WORDS = 3    # keyword, no.|#|id, then the id
+
+def _reads_to(text: str, pos: int, words: int) -> int:
+    """The furthest offset a DATE_RX/ID_RX attempt at `pos` can examine (len(text) at the end)."""
+    for _ in range(words):
+        pos = _WORD_RX.match(text, _SEP_RX.match(text, pos).end()).end()
+    return pos
+
+def _trigger_hits(line: str, want_date: bool, want_id: bool) -> List[Tuple[int, str]]:
+    """Offsets in `line` where a DATE_RX/ID_RX match could start, in order."""
+    low = line.lower()
+    if len(low) != len(line):  # case mapping changed offsets; let the regex find them
+        return [(t.start(), t.lastgroup) for t in TRIGGER_RX.finditer(line, overlapped=True)]
+    hits = []
+    for kind, kws, wanted in (("date", DATE_TRIGGERS, want_date), ("id", ID_TRIGGERS, want_id)):
+        if not wanted:
+            continue
+        for kw in kws:
+            i = low.find(kw)
+            while i != -1:
+                hits.append((i, kind))
+                i = low.find(kw, i + 1)
+    if len(hits) > 1:
+        hits.sort()
+    return hits
+
+class FieldScanner:
+    """Precompiled single-pass field extractor.
+
+    Walks the text line by line once, building the stripped line index and
+    resolving title, buyer, id, closing date, contacts, currency and the
+    bullet sections as it goes. Full-text regexes are only anchored at
+    keyword hits, so cost grows linearly with document length.
+    """
+
+    def __init__(self, sections: Optional[dict] = None, max_items: int = 12):
+        self.sections = dict(sections or SECTION_PATTERNS)
+        self.max_items = max_items
+        self.heading_rx = regex.compile(
+            r"(?:" + "|".join(f"(?P<{name}>{'|'.join(pats)})" for name, pats in self.sections.items()) + r")\b",
+            regex.IGNORECASE | regex.DOTALL,
+        )
+
+    def scan(self, text: Union[str, Document]) -> Tuple[dict, List[str]]:
+        doc = Document.of(text)
+        st = self._start()
+        lines: List[str] = []
+        self._run(doc.text, 0, len(doc.text), st, lines)
+        return self._fields(st, lines, doc), lines
+
+    def _start(self) -> dict:
+        # scanner state between lines; plain JSON so page checkpoints can be stored
+        return {"n": 0, "title": None, "buyer": None, "sol_id": None, "closing": None, "email": None,
+                "phone": None, "phone_done": False, "cad": False, "usd": False,
+                "items": {name: [] for name in self.sections}, "seen": [], "current": None, "dangling": False}
+
+    def _run(self, text: str, begin: int, end: int, st: dict, lines: List[str],
+             probes: Optional[List[int]] = None) -> None:
+        """Scan the lines of text[begin:end] (a line boundary) from state `st`, updating it.
+
+        Regexes still match against the whole text; with `probes`, the furthest
+        offset each attempt can have examined is appended to it.
+        """
+        title, buyer, sol_id, closing = st["title"], st["buyer"], st["sol_id"], st["closing"]
+        email, phone, phone_done, cad, usd = st["email"], st["phone"], st["phone_done"], st["cad"], st["usd"]
+        items = {name: list(v) for name, v in st["items"].items()}
+        seen = set(st["seen"])
+        current = st["current"]     # section whose body we are inside
+        dangling = st["dangling"]   # a bare bullet marker whose text is on the next line
+        offset = begin
+        n_base = st["n"] - len(lines)  # line number = len(lines) + n_base
+
+        for raw in text[begin:end].split("\n"):
+            start, offset = offset, offset + len(raw) + 1
+
+            # line index (same splitting/stripping as str.splitlines)
+            for part in raw.splitlines():
+                l = part.strip()
+                if not l:
+                    continue
+                n = len(lines) + n_base
+                lines.append(l)
+                if title is None and n < 30 and TITLE_RX.search(l):
+                    title = l
+                if buyer is None and n < 120:
+                    m = BUYER_RX.search(l)
+                    if m:
+                        buyer = m.group("buyer").strip()
+
+            # anchored field matches
+            if sol_id is None or closing is None:
+                for pos, kind in _trigger_hits(raw, closing is None, sol_id is None):
+                    if kind == "date":
+                        if closing is not None:
+                            continue
+                        m = DATE_RX.match(text, start + pos)
+                        if m:
+                            closing = m.group("date").strip()
+                    elif sol_id is None:
+                        m = ID_RX.match(text, start + pos)
+                        if m:
+                            sol_id = m.group("id").strip()
+                    else:
+                        continue
+                    if probes is not None:
+                        probes.append(_reads_to(text, start + pos, DATE_WORDS if kind == "date" else ID_WORDS))
+            if email is None and "@" in raw:
+                m = EMAIL_RX.search(raw)
+                if m:
+                    email = m.group(0)
+            if not phone_done:
+                m = PHONE_START_RX.search(raw)
+                if m:
+                    # the first possible phone start: one search from here is exact
+                    m = PHONE_RX.search(text, start + m.start())
+                    phone = m.group(1) if m else None
+                    phone_done = True
+                    if probes is not None:
+                        # the greedy run is read to its end before backing off to the last digit
+                        probes.append(_PHONE_RUN_RX.match(text, m.end()).end() if m else len(text))
+            if not cad and ("CAD" in raw or "C$" in raw or "Canadian" in raw):
+                cad = True
+            if not usd and "USD" in raw:
+                usd = True
+
+            # section boundaries and bullets
+            if raw and not raw[0].isspace():
+                current, dangling = None, False
+                m = self.heading_rx.match(raw)
+                if m and m.lastgroup not in seen:
+                    current = m.lastgroup
+                    seen.add(current)
+            elif current is not None and len(items[current]) < self.max_items:
+                if dangling:
+                    li = raw.strip()
+                    if li:
+                        dangling = False
+                        if len(li) > 3:
+                            items[current].append(li)
+                    continue
+                m = BULLET_RX.match(raw)
+                if m:
+                    li = m.group(1).strip()
+                    if len(li) > 3:
+                        items[current].append(li)
+                elif DANGLING_BULLET_RX.match(raw):
+                    dangling = True
+
+        st.update(n=len(lines) + n_base, title=title, buyer=buyer, sol_id=sol_id, closing=closing,
+                  email=email, phone=phone, phone_done=phone_done, cad=cad, usd=usd, items=items,
+                  seen=sorted(seen), current=current, dangling=dangling)
+
+    def _fields(self, st: dict, lines: List[str], doc: Document) -> dict:
+        currency = "CAD" if st["cad"] else "USD" if st["usd"] else "CAD"
+        items = st["items"]
+        return {
+            "title": st["title"] or (lines[0] if lines else ""),
+            "buyer": st["buyer"] or "",
+            "solicitation_id": st["sol_id"] or "",
+            "closing_date": st["closing"] or "",
+            "contact": {"name": "", "email": st["email"] or "", "phone": st["phone"] or ""},
+            "budget": {"currency": currency, "min": None, "max": None, "notes": ""},
+            "keywords": top_keywords(doc),
+            "deliverables": items.get("deliverables", []),
+            "mandatory": items.get("mandatory", []),
+            "rated": items.get("rated", []),
+            "submission": items.get("submission", []),
+        }
+
+    def scan_pages(self, pages: List[str], doc: Optional[Document] = None, prior: Optional[dict] = None,
+                   ops: Optional[list] = None) -> Tuple[dict, List[str], dict]:
+        """scan() of "\\n".join(pages), reusing the checkpoints of an earlier version's scan.
+
+        `prior` is the scan record returned for the earlier version and `ops` the
+        difflib opcodes turning its pages into these. A run of unchanged pages is
+        skipped when the scanner reaches it in the state it was in there last
+        time, so only the changed pages, and any pages after them until the
+        state settles again, are read. Returns (fields, lines, scan); scan holds
+        the state before each page and after the last, for the next version.
+        """
+        doc = doc or Document("\n".join(pages))
+        text = doc.text
+        n_pages = len(pages)
+        bounds, o = [], 0
+        for p in pages:
+            bounds.append(o)
+            o += len(p) + 1
+
+        def reach_of(pos: int) -> int:
+            # the page holding the last character an attempt examined; past the end, every later page
+            return n_pages if pos >= len(text) else bisect.bisect_right(bounds, pos) - 1
+
+        old = prior.get("ckpt") if prior and ops else None
+        if old and len(old) != max(i2 for _tag, _i1, i2, _j1, _j2 in ops) + 1:
+            old = None
+        st = self._start()
+        reach = -1  # furthest page the state so far depends on
+        ckpt = [dict(st, reach=reach)]
+        lines: List[str] = []
+        probes: List[int] = []
+        scanned = 0
+        for tag, i1, i2, j1, j2 in (ops if old else [("insert", 0, 0, 0, n_pages)]):
+            j = j1
+            while j < j2:
+                if tag == "equal":
+                    i = i1 + (j - j1)
+                    if _same_state(st, old[i]):
+                        # the furthest checkpoint in this run that depends on nothing past it
+                        t = i2
+                        while t > i and old[t]["reach"] >= i2:
+                            t -= 1
+                        if t > i:
+                            for k in range(i + 1, t + 1):
+                                c = _carry(st, old[i], old[k])
+                                c["reach"] = max(reach, old[k]["reach"] + j - i)
+                                ckpt.append(c)
+                                lines.extend(_page_lines(pages[j + k - i - 1]))
+                            st = {k: v for k, v in c.items() if k != "reach"}
+                            reach = c["reach"]
+                            j += t - i
+                            continue
+                probes.clear()
+                self._run(text, bounds[j], bounds[j] + len(pages[j]), st, lines, probes)
+                for pos in probes:
+                    reach = max(reach, reach_of(pos))
+                ckpt.append(dict(st, reach=reach))
+                scanned += 1
+                j += 1
+        return self._fields(st, lines, doc), lines, {"ckpt": ckpt, "scanned": scanned}
+
+_VALUES = ("title", "buyer", "sol_id", "closing", "email", "phone")
+
+def _same_state(st: dict, saved: dict) -> bool:
+    """Whether the scanner would go on the same way from both states.
+
+    Only which fields are still missing matters, not what was found, and
+    the line count only while title or buyer can still be found.
+    """
+    n, m = st["n"], saved["n"]
+    if n != m and ((st["title"] is None and min(n, m) < 30) or (st["buyer"] is None and min(n, m) < 120)):
+        return False
+    return (all((st[k] is None) == (saved[k] is None) for k in _VALUES)
+            and all(st[k] == saved[k] for k in ("phone_done", "cad", "usd", "seen", "current", "dangling"))
+            and all(len(v) == len(saved["items"][name]) for name, v in st["items"].items()))
+
+def _carry(st: dict, base: dict, saved: dict) -> dict:
+    # `saved` reached from `base` over unchanged pages, replayed on top of `st` (_same_state(st, base))
+    out = dict(saved, n=saved["n"] + st["n"] - base["n"],
+               items={name: v + saved["items"][name][len(base["items"][name]):] for name, v in st["items"].items()})
+    for k in _VALUES:
+        if base[k] is not None or (k == "phone" and base["phone_done"]):
+            out[k] = st[k]
+    return out
+
+def _page_lines(page: str) -> List[str]:
+    return [l for raw in page.split("\n") for part in raw.splitlines() for l in (part.strip(),) if l]
+
+FIELD_SCANNER = FieldScanner()
+
+def extract_basic_fields(text: Union[str, Document]) -> Tuple[dict, List[str]]:
+    return FIELD_SCANNER.scan(text)
+
+def extract_page_fields(pages: List[str], doc: Optional[Document] = None, prior_scan: Optional[dict] = None,
+                        ops: Optional[list] = None) -> Tuple[dict, List[str], dict]:
+    """extract_basic_fields over the joined pages, re-reading only what changed since `prior_scan` (see scan_pages)."""
+    return FIELD_SCANNER.scan_pages(pages, doc, prior_scan, ops)
+
+def _extract_basic_fields_multipass(text: str) -> Tuple[dict, List[str]]:
+    # Original one-regex-per-field implementation; kept as the reference for
+    # tools/bench_fields.py equivalence and speed checks.
     lines = [l.strip() for l in text.splitlines() if l.strip()]
     title = ""
     for l in lines[:30]:
@@ -1,16 +1,64 @@
-import os, io, json, datetime, requests
-from typing import Optional
+import os, io, json, asyncio, datetime, contextlib, hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Union
+import httpx
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Header
 from fastapi.middleware.cors import CORSMiddleware
-from models import Meta, Facts, Requirements, RiskAndCompliance, Summary, SummarizeResponse
-from extract import pdf_to_text, extract_basic_fields
-from summarize import heuristic_summary
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from models import (Meta, Facts, Requirements, RiskAndCompliance, Summary, SummarizeResponse, BatchItem,
+                    NearDuplicate, Amendment)
+from extract import (EXTRACT_CACHE, _cpu_count, cached_pdf_pages, extract_basic_fields, extract_page_fields,
+                     revised_pdf_pages)
+from metrics import PROMETHEUS_CONTENT_TYPE, StageTimer, new_registry
+from near_dup import index_from_env, minhash
+from page_store import store_from_env
+from search_index import SearchIndex
+from spool import CHUNK_SIZE, SpooledBuffer, aspool_chunks, spool_upload
+from summarize import SignalTable, heuristic_summary, signal_table
+from textdoc import Document
 
 APP_NAME = "rfp-summarizer-upgrade"
 CORS_ORIGINS = [o.strip() for o in os.getenv("CORS_ORIGINS", "*").split(",")]
 PREVIEW_SECRET = os.getenv("PREVIEW_SECRET", "")
+MAX_DOWNLOAD_BYTES = int(float(os.getenv("MAX_DOWNLOAD_MB", "50") or 50) * 1024 * 1024)
+FETCH_TIMEOUT = float(os.getenv("FETCH_TIMEOUT", "30") or 30)
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", "0") or 0) or _cpu_count()  # os.cpu_count() reports the host on Cloud Run
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4") or 4)
+MAX_BATCH_ITEMS = int(os.getenv("MAX_BATCH_ITEMS", "100") or 100)
+SEARCH_INDEX_DIR = os.getenv("SEARCH_INDEX_DIR", "")
+MAX_SEARCH_RESULTS = 100
 
-app = FastAPI(title=APP_NAME, version="1.0.0")
+# CPU-bound extraction runs here so the event loop keeps serving other requests
+cpu_executor = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="extract")
+METRICS = new_registry("rfp_upgrade", EXTRACT_CACHE)
+# uploads whose text nearly matches an earlier summary reuse it (NEAR_DUP_DIR)
+NEAR_DUP = index_from_env()
+if NEAR_DUP is not None:
+    METRICS.describe("near_duplicate_hit_ratio", "Uploads answered with an earlier summary / lookups")
+    METRICS.gauge("near_duplicate_hit_ratio", lambda: NEAR_DUP.stats()["hit_ratio"])
+    METRICS.gauge("near_duplicate_documents", lambda: NEAR_DUP.stats()["documents"])
+# page texts of earlier versions, so amendments re-extract only their changed pages (PAGE_STORE_DIR)
+PAGE_STORE = store_from_env()
+http_client: Optional[httpx.AsyncClient] = None
+# built and updated by tools/search_tenders.py; reopened here whenever its manifest changes
+SEARCH = SearchIndex(SEARCH_INDEX_DIR) if SEARCH_INDEX_DIR else None
+
+@contextlib.asynccontextmanager
+async def lifespan(_app):
+    global http_client
+    # one pooled keep-alive client for pdf_url fetches
+    http_client = httpx.AsyncClient(
+        timeout=FETCH_TIMEOUT,
+        follow_redirects=True,
+        limits=httpx.Limits(max_connections=64, max_keepalive_connections=16),
+    )
+    try:
+        yield
+    finally:
+        await http_client.aclose()
+        http_client = None
+
+app = FastAPI(title=APP_NAME, version="1.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -18,6 +66,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],  # browsers hide it from cross-origin scripts otherwise
 )
 
 @app.get("/")
@@ -28,6 +77,10 @@ def root():
 def health():
     return {"ok": True}
 
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(METRICS.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
 def guard(secret_header: Optional[str]):
     if PREVIEW_SECRET and (secret_header or "") != PREVIEW_SECRET:
         raise HTTPException(status_code=401, detail="Invalid preview secret")
@@ -36,34 +89,195 @@ def guard(secret_header: Optional[str]):
 async def summarize(
     file: UploadFile | None = File(default=None),
     pdf_url: str | None = Form(default=None),
+    client: str | None = Form(default=None),
     x_preview_secret: str | None = Header(default=None)
 ):
     guard(x_preview_secret)
+    signals = signal_table(client)
     source = ""
-    data: bytes | None = None
+    upload: SpooledBuffer | None = None
+    timer = StageTimer()
 
+    # uploads over SPOOL_THRESHOLD_MB are streamed to a temp file and memory-mapped
     if file is not None:
         source = file.filename
-        data = await file.read()
+        with timer.stage("upload"):
+            upload = await spool_upload(file)
     elif pdf_url:
         source = pdf_url
         try:
-            r = requests.get(pdf_url, timeout=30)
-            r.raise_for_status()
-            data = r.content
+            with timer.stage("download"):
+                upload = await fetch_pdf(pdf_url)
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Failed to fetch PDF: {e}")
     else:
         raise HTTPException(status_code=400, detail="Provide a PDF file or pdf_url")
 
+    with upload:
+        loop = asyncio.get_running_loop()
+        resp = await loop.run_in_executor(cpu_executor, build_response, upload, source, timer, signals)
+    with timer.stage("serialize"):
+        body = resp.model_dump_json()
+    METRICS.record(timer, resp.meta.bytes, resp.meta.pages_parsed)
+    return Response(body, media_type="application/json", headers={"Server-Timing": timer.server_timing()})
+
+@app.get("/v1/search")
+def search(q: str = "", k: int = 10, x_preview_secret: str | None = Header(default=None)):
+    """BM25 search over the indexed tender corpus."""
+    guard(x_preview_secret)
+    if SEARCH is None:
+        raise HTTPException(status_code=503, detail="Search index not configured (SEARCH_INDEX_DIR)")
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Provide a query (q)")
+    return SEARCH.search(q, max(1, min(k, MAX_SEARCH_RESULTS)))
+
+@app.get("/v1/summaries/{summary_id}", response_model=SummarizeResponse)
+def stored_summary(summary_id: str, x_preview_secret: str | None = Header(default=None)):
+    """A response kept for near-duplicate detection, as linked from meta.near_duplicate."""
+    guard(x_preview_secret)
+    if NEAR_DUP is None:
+        raise HTTPException(status_code=503, detail="Near-duplicate detection not configured (NEAR_DUP_DIR)")
+    body = NEAR_DUP.response(summary_id)
+    if body is None:
+        raise HTTPException(status_code=404, detail="Unknown summary_id")
+    return Response(body, media_type="application/json")
+
+@app.post("/v1/summarize/batch")
+async def summarize_batch(
+    files: List[UploadFile] = File(default=[]),
+    pdf_url: List[str] = Form(default=[]),
+    client: str | None = Form(default=None),
+    x_preview_secret: str | None = Header(default=None)
+):
+    """Summarize many files/URLs; one BatchItem per line (NDJSON) in completion order."""
+    guard(x_preview_secret)
+    signals = signal_table(client)
+    urls = [u.strip() for u in pdf_url if u and u.strip()]
+    if not files and not urls:
+        raise HTTPException(status_code=400, detail="Provide PDF files or pdf_url values")
+    if len(files) + len(urls) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_ITEMS} items per batch")
+
+    # UploadFiles are closed once this handler returns, so spool them before streaming
+    jobs: List[tuple] = []
+    for f in files:
+        jobs.append((len(jobs), f.filename or f"file-{len(jobs)}", await spool_upload(f)))
+    for u in urls:
+        jobs.append((len(jobs), u, u))
+    return StreamingResponse(batch_stream(jobs, signals), media_type="application/x-ndjson")
+
+async def summarize_item(index: int, source: str, src: Union[SpooledBuffer, str],
+                         signals: Optional[SignalTable] = None) -> BatchItem:
+    timer = StageTimer()
     try:
-        text = pdf_to_text(data or b"")
+        if isinstance(src, str):
+            try:
+                with timer.stage("download"):
+                    src = await fetch_pdf(src)
+            except Exception as e:
+                raise HTTPException(status_code=400, detail=f"Failed to fetch PDF: {e}")
+        with src:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(cpu_executor, build_response, src, source, timer, signals)
+        METRICS.record(timer, result.meta.bytes, result.meta.pages_parsed)
+        return BatchItem(index=index, source=source, ok=True, result=result)
+    except HTTPException as e:
+        return BatchItem(index=index, source=source, ok=False, status=e.status_code, error=str(e.detail))
+    except Exception as e:
+        return BatchItem(index=index, source=source, ok=False, status=500, error=str(e))
+
+async def batch_stream(jobs: List[tuple], signals: Optional[SignalTable] = None):
+    sem = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def bounded(job):
+        async with sem:
+            return await summarize_item(*job, signals=signals)
+
+    tasks = [asyncio.create_task(bounded(job)) for job in jobs]
+    try:
+        for fut in asyncio.as_completed(tasks):
+            item = await fut
+            yield item.model_dump_json() + "\n"
+    finally:
+        # client went away or we are done: stop pending work and drop any unread spools
+        for t in tasks:
+            t.cancel()
+        for _, _, src in jobs:
+            if isinstance(src, SpooledBuffer):
+                src.close()
+
+async def fetch_pdf(url: str) -> SpooledBuffer:
+    """Stream `url` into a SpooledBuffer over the shared client, aborting past MAX_DOWNLOAD_BYTES."""
+    client = http_client or httpx.AsyncClient(timeout=FETCH_TIMEOUT, follow_redirects=True)
+    try:
+        async with client.stream("GET", url) as r:
+            r.raise_for_status()
+            declared = int(r.headers.get("content-length") or 0)
+            if declared > MAX_DOWNLOAD_BYTES:
+                raise ValueError(f"document is {declared} bytes; limit is {MAX_DOWNLOAD_BYTES}")
+            return await aspool_chunks(r.aiter_bytes(CHUNK_SIZE), max_bytes=MAX_DOWNLOAD_BYTES)
+    finally:
+        if client is not http_client:
+            await client.aclose()
+
+def build_response(upload: SpooledBuffer, source: str, timer: Optional[StageTimer] = None,
+                   signals: Optional[SignalTable] = None) -> SummarizeResponse:
+    # runs on cpu_executor: PDF parsing, field extraction and summarization
+    timer = timer or StageTimer()
+    rev = None
+    try:
+        with timer.stage("parse"):
+            if PAGE_STORE is None:
+                pages, hit = cached_pdf_pages(upload)
+                parsed = 0 if hit else len(pages)
+            else:
+                pages, parsed, rev = revised_pdf_pages(upload, PAGE_STORE)
+            text = "\n".join(pages)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Could not read PDF: {e}")
 
-    basics, _lines = extract_basic_fields(text)
+    meta = Meta(
+        source=source,
+        processed_at=datetime.datetime.utcnow().isoformat() + "Z",
+        pages=len(pages),
+        pages_parsed=parsed,
+        bytes=upload.size,
+    )
+    prior = rev.prior if rev is not None else None
+    if prior is not None and any(op[0] != "equal" for op in rev.ops):
+        meta.amendment = Amendment(previous_source=prior.get("source", ""),
+                                   previous_processed_at=prior.get("processed_at", ""),
+                                   previous_pages=len(prior["fingerprints"]),
+                                   changed_pages=[j + 1 for j in rev.changed],
+                                   removed_pages=[i + 1 for i in rev.removed])
+
+    sig, reused = None, None
+    if NEAR_DUP is not None:
+        # an amendment or re-issue of a summarized tender reuses that summary; its facts are always read afresh
+        with timer.stage("near_dup"):
+            scope = (signals or signal_table()).fingerprint
+            meta.summary_id = hashlib.sha256(f"{scope}\0{text}".encode("utf-8")).hexdigest()[:32]
+            sig = minhash(text)
+            match = NEAR_DUP.lookup(sig, scope) if sig is not None else None
+            stored = NEAR_DUP.response(match[0]["id"]) if match else None
+            reused = SummarizeResponse.model_validate_json(stored).summary if stored is not None else None
+        if reused is not None:
+            rec, sim = match
+            meta.near_duplicate = NearDuplicate(summary_id=rec["id"], source=rec.get("source", ""),
+                                                processed_at=rec.get("processed_at", ""), similarity=round(sim, 3))
+
+    with timer.stage("fields"):
+        doc = Document(text)  # tokenized once for keywords and the summary
+        if rev is None:
+            basics, _lines = extract_basic_fields(doc)
+        else:
+            # only pages changed since the stored version (and what they affect) are scanned again
+            basics, _lines, scan = extract_page_fields(pages, doc, prior and prior.get("scan"), rev.ops)
+            if meta.amendment is not None:
+                meta.amendment.pages_rescanned = scan["scanned"]
+    if rev is not None:
+        PAGE_STORE.save(rev, pages, scan, source=source, processed_at=meta.processed_at)
 
-    meta = Meta(source=source, processed_at=datetime.datetime.utcnow().isoformat() + "Z")
     facts = Facts(
         title=basics["title"],
         buyer=basics["buyer"],
@@ -94,13 +308,22 @@ async def summarize(
         notes=""
     )
 
-    sumdict = heuristic_summary(text)
-    summary = Summary(**sumdict)
+    if reused is not None:
+        summary = reused
+    else:
+        with timer.stage("summarize"):
+            sumdict = heuristic_summary(doc, signals)
+        summary = Summary(**sumdict)
+    meta.timings = timer.as_ms()
 
-    return SummarizeResponse(
+    resp = SummarizeResponse(
         meta=meta,
         facts=facts,
         requirements=requirements,
         risk_and_compliance=risk,
         summary=summary
     )
+    if sig is not None and reused is None:
+        NEAR_DUP.add(meta.summary_id, sig, resp.model_dump_json(), scope,
+                     source=source, processed_at=meta.processed_at)
+    return resp
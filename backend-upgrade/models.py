@@ -30,10 +30,31 @@ class Attachment(BaseModel):
     filename: str
     url: str = ""
 
+class NearDuplicate(BaseModel):
+    summary_id: str                 # GET /v1/summaries/{summary_id} returns the earlier response
+    source: str = ""
+    processed_at: str = ""
+    similarity: float = 0.0         # estimated Jaccard similarity of the two texts' 5-word shingles
+
+class Amendment(BaseModel):
+    previous_source: str = ""
+    previous_processed_at: str = ""
+    previous_pages: int = 0
+    changed_pages: List[int] = []   # 1-based pages of this upload that are new or differ from the previous version
+    removed_pages: List[int] = []   # 1-based pages of the previous version with no counterpart here
+    pages_rescanned: int = 0        # pages field extraction had to read again
+
 class Meta(BaseModel):
     source: str
     processed_at: str
     language: str = "en"
+    pages: int = 0
+    pages_parsed: int = 0
+    bytes: int = 0
+    timings: Dict[str, float] = {}  # ms per stage; serialization is only in Server-Timing
+    summary_id: str = ""            # set when near-duplicate detection is on (NEAR_DUP_DIR)
+    near_duplicate: Optional[NearDuplicate] = None  # set when the summary below was reused from that document
+    amendment: Optional[Amendment] = None  # set when PAGE_STORE_DIR holds an earlier, different version of this document
 
 class Facts(BaseModel):
     title: str = ""
@@ -77,3 +98,11 @@ class SummarizeResponse(BaseModel):
     requirements: Requirements
     risk_and_compliance: RiskAndCompliance
     summary: Summary
+
+class BatchItem(BaseModel):
+    index: int
+    source: str
+    ok: bool
+    status: int = 200
+    error: str = ""
+    result: Optional[SummarizeResponse] = None
@@ -0,0 +1,195 @@
+"""Near-duplicate detection for uploaded tenders (MinHash over word shingles, banded LSH).
+
+Amendments and re-issues of a solicitation differ from the original by a
+few pages, so their bytes (and the extraction cache key) differ while their
+text is almost the same. Each summarized document gets a MinHash signature
+of its 5-word shingles (see minhash); the fraction of equal signature slots estimates the
+Jaccard similarity of two documents' shingle sets. Signatures are split into
+BANDS bands of ROWS slots and a document is a candidate when any band matches
+exactly, so a lookup only compares against the documents sharing a bucket
+(a pair at 0.7 similarity becomes a candidate with probability ~0.6, at 0.85 ~0.99).
+
+NearDupIndex keeps the signatures in an append-only log (index.jsonl) and each
+summary under responses/, in one directory that several workers can share:
+a lookup first reads whatever other processes appended since the last one.
+Matches are only made within a scope (the signal table the summary was built
+with), since a different table gives a different summary.
+"""
+import base64, hashlib, json, os, tempfile, threading
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+SHINGLE = 5
+BANDS = 16
+ROWS = 8
+NUM_PERM = BANDS * ROWS  # signature slots; a power of two, one bin of the hash range each
+BIN_BITS = NUM_PERM.bit_length() - 1
+_P = np.uint64(1099511628211)
+_C = np.uint32(0x9E3779B1)  # offsets a borrowed value by the distance it was borrowed from
+_U32 = np.uint64(0xFFFFFFFF)
+
+
+def _term_hash(t: str) -> int:
+    return int.from_bytes(hashlib.blake2b(t.encode("utf-8"), digest_size=8).digest(), "little")
+
+def _mix(x: np.ndarray) -> np.ndarray:
+    # murmur3 fmix64, so the top bits (the bin) and the rest are independent
+    x = x ^ (x >> np.uint64(33))
+    x = x * np.uint64(0xFF51AFD7ED558CCD)
+    x = x ^ (x >> np.uint64(33))
+    x = x * np.uint64(0xC4CEB9FE1A85EC53)
+    return x ^ (x >> np.uint64(33))
+
+def minhash(text: str) -> Optional[np.ndarray]:
+    """uint32[NUM_PERM] signature of the text's word shingles; None when it has no words.
+
+    One-permutation MinHash: every shingle is hashed once, the top BIN_BITS
+    bits pick its slot and the slot keeps the smallest of the next 32 bits.
+    Empty slots (short texts) take the next filled slot's value, offset by
+    the distance, as in rotation densification. The fraction of equal slots
+    estimates Jaccard similarity like NUM_PERM independent hashes would, at
+    the cost of a single hash per shingle.
+    """
+    toks = text.casefold().split()
+    if not toks:
+        return None
+    vocab = {t: _term_hash(t) for t in set(toks)}
+    ids = np.fromiter(map(vocab.__getitem__, toks), dtype=np.uint64, count=len(toks))
+    k = min(SHINGLE, len(ids))
+    n = len(ids) - k + 1
+    sh = ids[:n].copy()
+    for j in range(1, k):  # polynomial hash of each window, wrapping mod 2**64
+        sh *= _P
+        sh += ids[j:j + n]
+    sh = np.unique(_mix(sh))  # sorted, so each bin is a contiguous run that starts at its minimum
+    starts = np.searchsorted(sh, np.arange(NUM_PERM, dtype=np.uint64) << np.uint64(64 - BIN_BITS))
+    ends = np.append(starts[1:], len(sh))
+    filled = np.flatnonzero(starts < ends)
+    vals = ((sh[np.minimum(starts, len(sh) - 1)] >> np.uint64(64 - BIN_BITS - 32)) & _U32).astype(np.uint32)
+    if len(filled) == NUM_PERM:
+        return vals
+    j = np.arange(NUM_PERM)
+    nxt = filled[np.searchsorted(filled, j) % len(filled)]
+    dist = ((nxt - j) % NUM_PERM).astype(np.uint32)
+    return vals[nxt] + dist * _C
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.count_nonzero(a == b)) / NUM_PERM
+
+def _bands(sig: np.ndarray) -> List[Tuple[int, bytes]]:
+    raw = sig.tobytes()
+    w = ROWS * sig.itemsize
+    return [(i, raw[i * w:(i + 1) * w]) for i in range(BANDS)]
+
+
+class NearDupIndex:
+    def __init__(self, path: str, threshold: float = 0.85):
+        self.path = path
+        self.threshold = threshold
+        os.makedirs(os.path.join(path, "responses"), exist_ok=True)
+        self._log = os.path.join(path, "index.jsonl")
+        self._lock = threading.Lock()
+        self._offset = 0
+        self.records: List[dict] = []
+        self.sigs: List[np.ndarray] = []
+        self.ids: Dict[str, int] = {}
+        self.buckets: Dict[Tuple[int, bytes], List[int]] = {}
+        self.hits = 0
+        self.misses = 0
+        with self._lock:
+            self._catch_up()
+
+    def _catch_up(self) -> None:
+        # caller holds the lock; reads only complete lines appended since the last call
+        try:
+            size = os.path.getsize(self._log)
+        except OSError:
+            return
+        if size <= self._offset:
+            return
+        with open(self._log, "rb") as f:
+            f.seek(self._offset)
+            blob = f.read(size - self._offset)
+        end = blob.rfind(b"\n") + 1
+        self._offset += end
+        for line in blob[:end].splitlines():
+            try:
+                rec = json.loads(line)
+                sig = np.frombuffer(base64.b64decode(rec.pop("sig")), dtype=np.uint32)
+            except (ValueError, KeyError):
+                continue
+            if len(sig) != NUM_PERM or rec["id"] in self.ids:
+                continue
+            row = len(self.records)
+            self.ids[rec["id"]] = row
+            self.records.append(rec)
+            self.sigs.append(sig)
+            for band in _bands(sig):
+                self.buckets.setdefault(band, []).append(row)
+
+    def lookup(self, sig: np.ndarray, scope: str = "") -> Optional[Tuple[dict, float]]:
+        """The most similar indexed document in `scope` at or above the threshold, as (record, similarity)."""
+        with self._lock:
+            self._catch_up()
+            rows = set()
+            for band in _bands(sig):
+                rows.update(self.buckets.get(band, ()))
+            best, best_sim = None, self.threshold
+            for row in rows:
+                rec = self.records[row]
+                if rec.get("scope", "") != scope:
+                    continue
+                sim = similarity(sig, self.sigs[row])
+                if sim >= best_sim:
+                    best, best_sim = rec, sim
+            if best is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return best, best_sim
+
+    def _response_path(self, doc_id: str) -> str:
+        return os.path.join(self.path, "responses", doc_id[:2], doc_id + ".json")
+
+    def add(self, doc_id: str, sig: np.ndarray, response_json: str, scope: str = "", **meta) -> None:
+        """Store a summary and index its signature; extra keyword fields go into the log record."""
+        with self._lock:
+            self._catch_up()
+            if doc_id in self.ids:
+                return
+        p = self._response_path(doc_id)
+        os.makedirs(os.path.dirname(p), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(p), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(response_json)
+        os.replace(tmp, p)
+        rec = dict(meta, id=doc_id, scope=scope, sig=base64.b64encode(sig.astype(np.uint32).tobytes()).decode("ascii"))
+        line = (json.dumps(rec, ensure_ascii=False) + "\n").encode("utf-8")
+        # one O_APPEND write per record, so concurrent workers never interleave lines
+        fd = os.open(self._log, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+    def response(self, doc_id: str) -> Optional[str]:
+        if not doc_id or any(c not in "0123456789abcdef" for c in doc_id):
+            return None
+        try:
+            with open(self._response_path(doc_id), encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {"documents": len(self.records), "hits": self.hits, "misses": self.misses,
+                    "hit_ratio": (self.hits / total) if total else 0.0}
+
+
+def index_from_env() -> Optional[NearDupIndex]:
+    path = os.getenv("NEAR_DUP_DIR", "").strip()
+    if not path:
+        return None
+    return NearDupIndex(path, float(os.getenv("NEAR_DUP_THRESHOLD", "0.85") or 0.85))
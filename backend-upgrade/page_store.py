@@ -0,0 +1,155 @@
+"""Per-page fingerprints and texts of processed tenders, for extracting amendments incrementally.
+
+Every processed document is stored as the list of its page fingerprints
+(extract.page_fingerprints: a digest of what text extraction reads from the
+page), the extracted page texts and the field scanner's page checkpoints.
+A new upload is matched to the stored version it shares the most pages
+with; difflib aligns the two fingerprint lists, so only pages that are new
+or changed are extracted, the rest of the text is patched in from the
+stored version and field extraction resumes from the checkpoint before the
+first changed page (FieldScanner.scan_pages).
+
+Records live in one directory that several workers can share: docs/ holds
+one zlib-compressed JSON record per version and index.jsonl is an
+append-only log of each version's fingerprints, read up to date before
+every lookup. Nothing is evicted.
+"""
+import difflib, hashlib, json, os, tempfile, threading, zlib
+from collections import Counter
+from typing import Dict, List, Optional
+
+
+class Revision:
+    """An upload's pages against the stored version it most resembles (if any)."""
+
+    def __init__(self, fingerprints: List[str], prior: Optional[dict] = None):
+        self.fingerprints = fingerprints
+        self.key = hashlib.sha256("\n".join(fingerprints).encode("ascii")).hexdigest()[:32]
+        self.prior = prior
+        self.ops: List[tuple] = []
+        self.changed: List[int] = list(range(len(fingerprints)))  # 0-based pages to extract
+        self.removed: List[int] = []                               # 0-based pages of the prior version
+        if prior is not None:
+            sm = difflib.SequenceMatcher(None, prior["fingerprints"], fingerprints, autojunk=False)
+            self.ops = sm.get_opcodes()
+            self.changed = [j for tag, _i1, _i2, j1, j2 in self.ops if tag != "equal" for j in range(j1, j2)]
+            self.removed = [i for tag, i1, i2, _j1, _j2 in self.ops if tag in ("delete", "replace") for i in range(i1, i2)]
+
+    def patch(self, extracted: List[str]) -> List[str]:
+        """All page texts, given the texts of self.changed in order."""
+        if self.prior is None:
+            return list(extracted)
+        fresh = dict(zip(self.changed, extracted))
+        old = self.prior["pages"]
+        pages = [""] * len(self.fingerprints)
+        for tag, i1, _i2, j1, j2 in self.ops:
+            for j in range(j1, j2):
+                pages[j] = old[i1 + j - j1] if tag == "equal" else fresh[j]
+        return pages
+
+
+class PageStore:
+    def __init__(self, path: str, min_shared: float = 0.5):
+        self.path = path
+        self.min_shared = min_shared
+        os.makedirs(os.path.join(path, "docs"), exist_ok=True)
+        self._log = os.path.join(path, "index.jsonl")
+        self._lock = threading.Lock()
+        self._offset = 0
+        self.order: Dict[str, int] = {}            # version key -> position in the log
+        self.sizes: Dict[str, int] = {}            # version key -> distinct fingerprints
+        self.postings: Dict[str, List[str]] = {}   # fingerprint -> version keys
+        with self._lock:
+            self._catch_up()
+
+    def _catch_up(self) -> None:
+        # caller holds the lock; reads only complete lines appended since the last call
+        try:
+            size = os.path.getsize(self._log)
+        except OSError:
+            return
+        if size <= self._offset:
+            return
+        with open(self._log, "rb") as f:
+            f.seek(self._offset)
+            blob = f.read(size - self._offset)
+        end = blob.rfind(b"\n") + 1
+        self._offset += end
+        for line in blob[:end].splitlines():
+            try:
+                rec = json.loads(line)
+                key, fps = rec["key"], set(rec["fingerprints"])
+            except (ValueError, KeyError, TypeError):
+                continue
+            if key in self.order:
+                continue
+            self.order[key] = len(self.order)
+            self.sizes[key] = len(fps)
+            for fp in fps:
+                self.postings.setdefault(fp, []).append(key)
+
+    def _record_path(self, key: str) -> str:
+        return os.path.join(self.path, "docs", key[:2], key + ".json.z")
+
+    def load(self, key: str) -> Optional[dict]:
+        try:
+            with open(self._record_path(key), "rb") as f:
+                return json.loads(zlib.decompress(f.read()).decode("utf-8"))
+        except (OSError, ValueError, zlib.error):
+            return None
+
+    def revision(self, fingerprints: List[str]) -> Revision:
+        """Match an upload's page fingerprints to the closest stored version.
+
+        That is the version sharing the most distinct pages with it (the
+        latest on a tie), provided they share at least min_shared of the
+        smaller document's pages.
+        """
+        distinct = set(fingerprints)
+        with self._lock:
+            self._catch_up()
+            shared = Counter(k for fp in distinct for k in self.postings.get(fp, ()))
+            best = max(shared, key=lambda k: (shared[k], self.order[k]), default=None)
+            if best is not None and shared[best] < self.min_shared * min(len(distinct), self.sizes[best]):
+                best = None
+        prior = self.load(best) if best is not None else None
+        return Revision(fingerprints, prior)
+
+    def save(self, rev: Revision, pages: List[str], scan: Optional[dict] = None, **meta) -> None:
+        """Store this version's page texts and field-scan checkpoints; extra keyword fields go in the record.
+
+        A version stored before keeps its record, and so its original source
+        and processed_at; only checkpoints it lacks are added.
+        """
+        with self._lock:
+            self._catch_up()
+            known = rev.key in self.order
+        if known:
+            old = self.load(rev.key)
+            if old is not None:
+                if scan is None or old.get("scan") is not None:
+                    return
+                meta = dict(meta, **{k: old[k] for k in meta if k in old})
+        rec = dict(meta, key=rev.key, fingerprints=rev.fingerprints, pages=pages, scan=scan)
+        p = self._record_path(rev.key)
+        os.makedirs(os.path.dirname(p), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(p), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(zlib.compress(json.dumps(rec, ensure_ascii=False).encode("utf-8"), 6))
+        os.replace(tmp, p)
+        if known:
+            return
+        line = json.dumps({"key": rev.key, "fingerprints": rev.fingerprints}) + "\n"
+        # one O_APPEND write per record, so concurrent workers never interleave lines
+        fd = os.open(self._log, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line.encode("ascii"))
+        finally:
+            os.close(fd)
+
+
+def store_from_env() -> Optional[PageStore]:
+    path = os.getenv("PAGE_STORE_DIR", "").strip()
+    if not path:
+        return None
+    return PageStore(path, float(os.getenv("PAGE_STORE_MIN_SHARED", "0.5") or 0.5))
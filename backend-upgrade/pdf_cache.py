@@ -0,0 +1,173 @@
+"""Content-addressed cache for extracted PDF text.
+
+Entries are keyed by the SHA-256 of the raw upload and hold the per-page
+texts plus the document's page count. A repeat upload of the same bytes is
+served from an in-process LRU, then from an optional on-disk tier, and only
+falls through to PDF parsing on a miss.
+
+This file is shared verbatim by backend/, backend-upgrade/,
+cloudfn_summarizer/ and gcp_functions/summarize_rfp/ (each deploys from its
+own directory); keep the copies in sync.
+
+Env:
+- EXTRACT_CACHE_ENTRIES: in-memory LRU size (default 32, 0 disables)
+- EXTRACT_CACHE_DIR: enables the disk tier when set
+- EXTRACT_CACHE_MAX_MB: disk tier size budget before oldest entries are evicted (default 512)
+"""
+import hashlib, json, os, tempfile, threading, zlib
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+def content_key(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class ExtractionCache:
+    def __init__(self, max_entries: int = 32, disk_dir: Optional[str] = None,
+                 disk_max_bytes: int = 512 * 1024 * 1024, namespace: str = "pages"):
+        self.max_entries = max_entries
+        self.disk_dir = os.path.join(disk_dir, namespace) if disk_dir else None
+        self.disk_max_bytes = disk_max_bytes
+        self._mem: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._disk_bytes = 0
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._disk_bytes = sum(size for _, size, _ in self._disk_files())
+
+    # -- memory tier -------------------------------------------------------
+    def _mem_get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None:
+                self._mem.move_to_end(key)
+            return entry
+
+    def _mem_put(self, key: str, entry: dict) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._mem[key] = entry
+            self._mem.move_to_end(key)
+            while len(self._mem) > self.max_entries:
+                self._mem.popitem(last=False)
+
+    # -- disk tier ---------------------------------------------------------
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], key + ".json.z")
+
+    def _disk_files(self) -> List[Tuple[str, int, float]]:
+        out = []
+        for root, _dirs, files in os.walk(self.disk_dir):
+            for fn in files:
+                if not fn.endswith(".json.z"):
+                    continue
+                p = os.path.join(root, fn)
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    continue
+                out.append((p, st.st_size, st.st_mtime))
+        return out
+
+    def _disk_get(self, key: str) -> Optional[dict]:
+        if not self.disk_dir:
+            return None
+        p = self._path(key)
+        try:
+            with open(p, "rb") as f:
+                entry = json.loads(zlib.decompress(f.read()).decode("utf-8"))
+            os.utime(p)  # mtime doubles as last-access for eviction
+            return entry
+        except (OSError, ValueError, zlib.error):
+            return None
+
+    def _disk_put(self, key: str, entry: dict) -> None:
+        if not self.disk_dir:
+            return
+        p = self._path(key)
+        blob = zlib.compress(json.dumps(entry, ensure_ascii=False).encode("utf-8"), 6)
+        try:
+            os.makedirs(os.path.dirname(p), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(p), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(blob)
+            os.replace(tmp, p)
+        except OSError:
+            return
+        with self._lock:
+            self._disk_bytes += len(blob)
+            over = self._disk_bytes > self.disk_max_bytes
+        if over:
+            self._evict_disk()
+
+    def _evict_disk(self) -> None:
+        files = sorted(self._disk_files(), key=lambda x: x[2])
+        total = sum(size for _, size, _ in files)
+        target = int(self.disk_max_bytes * 0.9)
+        for p, size, _ in files:
+            if total <= target:
+                break
+            try:
+                os.remove(p)
+                total -= size
+            except OSError:
+                pass
+        with self._lock:
+            self._disk_bytes = total
+
+    # -- public API --------------------------------------------------------
+    def get(self, key: str) -> Optional[dict]:
+        entry = self._mem_get(key)
+        if entry is None:
+            entry = self._disk_get(key)
+            if entry is not None:
+                self._mem_put(key, entry)
+                with self._lock:
+                    self.disk_hits += 1
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entry
+
+    def put(self, key: str, pages: List[str], page_count: int) -> dict:
+        entry = {"pages": list(pages), "page_count": page_count}
+        self._mem_put(key, entry)
+        self._disk_put(key, entry)
+        return entry
+
+    def get_or_extract(self, data: bytes, extract: Callable[[], Tuple[List[str], int]]) -> Tuple[dict, bool]:
+        """Return (entry, hit). `extract` runs only on a miss and returns (pages, page_count)."""
+        key = content_key(data)
+        entry = self.get(key)
+        if entry is not None:
+            return entry, True
+        pages, page_count = extract()
+        return self.put(key, pages, page_count), False
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits / total) if total else 0.0,
+                "entries": len(self._mem),
+                "disk_bytes": self._disk_bytes,
+            }
+
+
+def cache_from_env(namespace: str = "pages") -> ExtractionCache:
+    return ExtractionCache(
+        max_entries=int(os.getenv("EXTRACT_CACHE_ENTRIES", "32") or 0),
+        disk_dir=os.getenv("EXTRACT_CACHE_DIR", "").strip() or None,
+        disk_max_bytes=int(float(os.getenv("EXTRACT_CACHE_MAX_MB", "512") or 512) * 1024 * 1024),
+        namespace=namespace,
+    )
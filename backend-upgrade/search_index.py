@@ -0,0 +1,346 @@
+"""On-disk BM25 index over processed tenders (work/*.json from tools/rfp_from_pdf.py).
+
+An index directory holds immutable segments plus index.json, the manifest
+naming the live segments and the documents deleted from each. Every add()
+writes one new segment; a document added again under the same id
+replaces the old copy (which becomes a deletion) unless its content is
+unchanged. Once there are more than MAX_SEGMENTS segments they are merged
+into one, dropping deleted documents; the segments it replaces are only
+removed at the next compaction, so a reader still opening them finds them.
+
+A segment directory contains:
+- terms.bin + term_off.npy: the sorted vocabulary (UTF-8), binary-searched in place
+- post_off.npy, df.npy, width.npy: per term, where its postings start, how
+  many documents it has and the byte width of its doc-id gaps (1, 2 or 4)
+- postings.bin: per term, the doc-id gaps then the term frequencies (uint8)
+- dl.npy: document lengths in tokens; docs.json: id, title, source, mtime, sig
+
+Arrays and postings are memory-mapped, so opening an index reads only the
+manifest and the per-document metadata; a query touches just the postings
+of its terms. One writer at a time; every manifest it writes carries the
+next generation number, and readers reopen on refresh() when it changes.
+"""
+import bisect, hashlib, heapq, json, os, shutil, tempfile, threading, time
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+from finders import KEYWORD_STOPWORDS
+from textdoc import TOKEN_RX
+
+K1 = 1.2
+B = 0.75
+MAX_SEGMENTS = 8
+MAX_TERM_LEN = 64
+WIDTHS = {1: "<u1", 2: "<u2", 4: "<u4"}
+
+
+def tokens(text: str) -> List[str]:
+    return [t for t in TOKEN_RX.findall(text.casefold())
+            if 2 <= len(t) <= MAX_TERM_LEN and t not in KEYWORD_STOPWORDS]
+
+def doc_sig(doc: dict) -> str:
+    return hashlib.sha1(f"{doc.get('title') or ''}\0{doc.get('text') or ''}".encode("utf-8")).hexdigest()[:16]
+
+
+class _Terms:
+    """The segment vocabulary as a sorted sequence of bytes, for bisect."""
+
+    def __init__(self, blob, offsets):
+        self._blob = blob
+        self._off = offsets
+
+    def __len__(self):
+        return len(self._off) - 1
+
+    def __getitem__(self, i):
+        return bytes(self._blob[self._off[i]:self._off[i + 1]])
+
+
+class Segment:
+    def __init__(self, path: str):
+        self.name = os.path.basename(path)
+        with open(os.path.join(path, "docs.json"), encoding="utf-8") as f:
+            self.docs: List[dict] = json.load(f)
+        load = lambda n: np.load(os.path.join(path, n), mmap_mode="r")
+        self.dl = load("dl.npy")
+        self.df = load("df.npy")
+        self.width = load("width.npy")
+        self.post_off = load("post_off.npy")
+        term_off = load("term_off.npy")
+        self.n_terms = len(term_off) - 1
+        if self.n_terms:
+            self.terms = _Terms(np.memmap(os.path.join(path, "terms.bin"), dtype=np.uint8, mode="r"), term_off)
+            self.postings = np.memmap(os.path.join(path, "postings.bin"), dtype=np.uint8, mode="r")
+        else:
+            self.terms = _Terms(b"", [0])
+            self.postings = None
+
+    def find(self, term: bytes) -> int:
+        i = bisect.bisect_left(self.terms, term)
+        return i if i < self.n_terms and self.terms[i] == term else -1
+
+    def read(self, i: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(doc ordinals, term frequencies) of term number i."""
+        df, w = int(self.df[i]), int(self.width[i])
+        start = int(self.post_off[i])
+        gaps = self.postings[start:start + df * w].view(WIDTHS[w])
+        tf = self.postings[start + df * w:start + df * (w + 1)]
+        return np.cumsum(gaps, dtype=np.int64), tf
+
+    def iter_terms(self, tag: int) -> Iterator[Tuple[bytes, int, int]]:
+        for i in range(self.n_terms):
+            yield self.terms[i], tag, i
+
+
+def _write_segment(path: str, docs: List[dict], dl: List[int],
+                   postings: Iterable[Tuple[bytes, np.ndarray, np.ndarray]]) -> None:
+    """Write a segment from postings given in ascending term order."""
+    tmp = path + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    term_off, post_off, dfs, widths = [0], [0], [], []
+    with open(os.path.join(tmp, "terms.bin"), "wb") as tf_out, open(os.path.join(tmp, "postings.bin"), "wb") as pf:
+        for term, ords, tfs in postings:
+            gaps = np.diff(ords, prepend=0)
+            top = int(gaps.max())
+            w = 1 if top < 1 << 8 else 2 if top < 1 << 16 else 4
+            pf.write(gaps.astype(WIDTHS[w]).tobytes())
+            pf.write(np.minimum(tfs, 255).astype(np.uint8).tobytes())
+            tf_out.write(term)
+            term_off.append(term_off[-1] + len(term))
+            post_off.append(post_off[-1] + len(ords) * (w + 1))
+            dfs.append(len(ords))
+            widths.append(w)
+    np.save(os.path.join(tmp, "term_off.npy"), np.array(term_off, dtype=np.uint64))
+    np.save(os.path.join(tmp, "post_off.npy"), np.array(post_off, dtype=np.uint64))
+    np.save(os.path.join(tmp, "df.npy"), np.array(dfs, dtype=np.uint32))
+    np.save(os.path.join(tmp, "width.npy"), np.array(widths, dtype=np.uint8))
+    np.save(os.path.join(tmp, "dl.npy"), np.array(dl, dtype=np.uint32))
+    with open(os.path.join(tmp, "docs.json"), "w", encoding="utf-8") as f:
+        json.dump(docs, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+class SearchIndex:
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._segments: Dict[str, Segment] = {}
+        self._generation = None
+        self.refresh()
+
+    # -- manifest ----------------------------------------------------------
+    def _manifest_path(self) -> str:
+        return os.path.join(self.path, "index.json")
+
+    def _read_manifest(self) -> dict:
+        try:
+            with open(self._manifest_path(), encoding="utf-8") as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            manifest = {"segments": [], "deleted": {}, "next": 1}
+        manifest.setdefault("generation", 0)
+        manifest.setdefault("retired", [])
+        return manifest
+
+    def refresh(self) -> None:
+        """Reopen if another process has written a new manifest."""
+        manifest = self._read_manifest()
+        if manifest["generation"] == self._generation:
+            return
+        with self._lock:
+            for attempt in range(3):
+                try:
+                    segs = {name: self._segments.get(name) or Segment(os.path.join(self.path, name))
+                            for name in manifest["segments"]}
+                    break
+                except FileNotFoundError:
+                    # compacted away since the manifest was read; the current one names its replacement
+                    if attempt == 2:
+                        raise
+                    manifest = self._read_manifest()
+            self._install(manifest, segs)
+            self._generation = manifest["generation"]
+
+    def _install(self, manifest: dict, segs: Dict[str, Segment]) -> None:
+        self.manifest = manifest
+        self._segments = segs
+        self.deleted = {name: np.zeros(len(s.docs), dtype=bool) for name, s in segs.items()}
+        for name, ords in manifest["deleted"].items():
+            if name in self.deleted:
+                self.deleted[name][ords] = True
+        self.live: Dict[str, Tuple[str, int]] = {}
+        total = 0
+        for name in manifest["segments"]:
+            s, dead = segs[name], self.deleted[name]
+            for o, d in enumerate(s.docs):
+                if not dead[o]:
+                    self.live[d["id"]] = (name, o)
+            total += int(np.asarray(s.dl, dtype=np.int64)[~dead].sum()) if len(s.docs) else 0
+        self.n_docs = len(self.live)
+        self.avgdl = total / self.n_docs if self.n_docs else 0.0
+
+    def _save_manifest(self, manifest: dict) -> None:
+        manifest["generation"] = self.manifest["generation"] + 1
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, self._manifest_path())
+
+    # -- writing -----------------------------------------------------------
+    def doc(self, doc_id: str) -> Optional[dict]:
+        at = self.live.get(doc_id)
+        return self._segments[at[0]].docs[at[1]] if at else None
+
+    def add(self, docs: Iterable[dict]) -> Dict[str, int]:
+        """Index documents ({"id", "title", "text", optional "source", "mtime"}); returns counts.
+
+        A repeated id keeps its last copy, both within one call and across calls.
+        """
+        self.refresh()
+        manifest = json.loads(json.dumps(self.manifest))
+        metas, dl, inverted = [], [], defaultdict(list)
+        replaced = skipped = 0
+        latest = {}
+        for d in docs:
+            if d.get("id") and d.get("text"):
+                latest[d["id"]] = d  # a later copy of an id replaces an earlier one, as in the bulk JSONL
+        for d in latest.values():
+            sig = doc_sig(d)
+            old = self.live.get(d["id"])
+            if old and self._segments[old[0]].docs[old[1]].get("sig") == sig:
+                skipped += 1
+                continue
+            if old:
+                manifest["deleted"].setdefault(old[0], []).append(old[1])
+                replaced += 1
+            toks = tokens(f"{d.get('title') or ''}\n{d['text']}")
+            ordinal = len(metas)
+            for t, c in Counter(toks).items():
+                inverted[t.encode("utf-8")].append((ordinal, c))
+            metas.append({"id": d["id"], "title": d.get("title") or "", "source": d.get("source") or "",
+                          "mtime": d.get("mtime"), "sig": sig})
+            dl.append(len(toks))
+        if metas:
+            name = f"seg-{manifest['next']:06d}"
+            manifest["next"] += 1
+
+            def postings():
+                for term in sorted(inverted):
+                    p = np.array(inverted[term], dtype=np.int64)
+                    yield term, p[:, 0], p[:, 1]
+            _write_segment(os.path.join(self.path, name), metas, dl, postings())
+            manifest["segments"].append(name)
+        if metas or replaced:
+            self._save_manifest(manifest)
+            self.refresh()
+        if len(self.manifest["segments"]) > MAX_SEGMENTS:
+            self.compact()
+        return {"added": len(metas) - replaced, "replaced": replaced, "unchanged": skipped}
+
+    def compact(self) -> None:
+        """Merge every segment into one, dropping deleted documents."""
+        self.refresh()
+        names = list(self.manifest["segments"])
+        if len(names) <= 1 and not any(self.manifest["deleted"].values()):
+            return
+        segs = [self._segments[n] for n in names]
+        metas, dl, remap = [], [], []
+        for n, s in zip(names, segs):
+            keep = ~self.deleted[n]
+            new = np.full(len(s.docs), -1, dtype=np.int64)
+            new[keep] = np.arange(len(metas), len(metas) + int(keep.sum()))
+            remap.append(new)
+            metas += [d for d, k in zip(s.docs, keep) if k]
+            dl += [int(x) for x, k in zip(s.dl, keep) if k]
+
+        def postings():
+            merged = heapq.merge(*[s.iter_terms(k) for k, s in enumerate(segs)])
+            cur, parts = None, []
+            for term, k, i in merged:
+                if term != cur:
+                    if parts:
+                        yield from _joined(cur, parts)
+                    cur, parts = term, []
+                ords, tf = segs[k].read(i)
+                ords = remap[k][ords]
+                keep = ords >= 0
+                if keep.any():
+                    parts.append((ords[keep], np.asarray(tf)[keep]))
+            if parts:
+                yield from _joined(cur, parts)
+
+        manifest = dict(self.manifest, deleted={})
+        name = f"seg-{manifest['next']:06d}"
+        manifest["next"] += 1
+        _write_segment(os.path.join(self.path, name), metas, dl, postings())
+        manifest["segments"] = [name]
+        stale, manifest["retired"] = manifest["retired"], names
+        self._save_manifest(manifest)
+        self.refresh()
+        # segments replaced by the previous compaction: no manifest has named them since.
+        # Open readers keep their mmaps; the files go once they close.
+        for n in stale:
+            shutil.rmtree(os.path.join(self.path, n), ignore_errors=True)
+
+    # -- search ------------------------------------------------------------
+    def search(self, query: str, k: int = 10) -> Dict[str, object]:
+        t0 = time.perf_counter()
+        self.refresh()
+        with self._lock:
+            segs, deleted, n_docs, avgdl = self._segments, self.deleted, self.n_docs, self.avgdl
+        terms = list(dict.fromkeys(tokens(query)))
+        # postings of the query terms per segment, minus deleted documents, so df counts live documents only
+        found = []
+        df = Counter()
+        for s in segs.values():
+            dead = deleted[s.name]
+            hits = []
+            for t in terms:
+                i = s.find(t.encode("utf-8"))
+                if i >= 0:
+                    ords, tf = s.read(i)
+                    keep = ~dead[ords]
+                    hits.append((t, ords[keep], tf[keep]))
+                    df[t] += int(keep.sum())
+            if hits:
+                found.append((s, hits))
+
+        best: List[Tuple[float, str, int]] = []
+        total = 0
+        for s, hits in found:
+            norm = K1 * (1 - B + B * np.asarray(s.dl, dtype=np.float64) / max(avgdl, 1e-9))
+            scores = np.zeros(len(s.docs))
+            for t, ords, tf in hits:
+                idf = np.log1p((n_docs - df[t] + 0.5) / (df[t] + 0.5))
+                tf = tf.astype(np.float64)
+                scores[ords] += idf * tf * (K1 + 1) / (tf + norm[ords])
+            hit = np.flatnonzero(scores > 0)
+            total += len(hit)
+            if len(hit) > k:
+                hit = hit[np.argpartition(-scores[hit], k - 1)[:k]]
+            best += [(float(scores[o]), s.name, int(o)) for o in hit]
+
+        best = heapq.nlargest(k, best, key=lambda x: (x[0], x[1], -x[2]))
+        results = []
+        for score, name, o in best:
+            d = segs[name].docs[o]
+            results.append({"id": d["id"], "title": d["title"], "score": round(score, 4), "source": d["source"]})
+        return {"query": query, "terms": terms, "total": total, "results": results,
+                "took_ms": round((time.perf_counter() - t0) * 1000, 2)}
+
+    def stats(self) -> Dict[str, object]:
+        self.refresh()
+        size = 0
+        for root, _dirs, files in os.walk(self.path):
+            size += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+        return {"documents": self.n_docs, "segments": len(self._segments),
+                "deleted": sum(len(v) for v in self.manifest["deleted"].values()),
+                "terms": sum(s.n_terms for s in self._segments.values()),
+                "avgdl": round(self.avgdl, 1), "bytes": size}
+
+
+def _joined(term: bytes, parts: List[Tuple[np.ndarray, np.ndarray]]):
+    # each segment's ordinals are remapped into ascending, disjoint ranges, so concatenation stays sorted
+    yield term, np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts])
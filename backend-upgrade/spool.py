@@ -0,0 +1,213 @@
+"""Spool-to-disk upload buffers.
+
+Small uploads stay in memory as bytes. Anything over SPOOL_THRESHOLD_MB is
+streamed chunk by chunk into a temp file and memory-mapped read-only. The
+PDF reader, the SHA-256 cache key and the extraction workers then share one
+file-backed view of the upload rather than several heap copies of it.
+
+This file is shared verbatim by backend/ and backend-upgrade/ (each deploys
+from its own directory); keep the copies in sync.
+"""
+import base64, binascii, io, json, mmap, os, re, tempfile
+from typing import AsyncIterator, Iterable, Optional, Tuple, Union
+
+SPOOL_THRESHOLD = int(float(os.getenv("SPOOL_THRESHOLD_MB", "4") or 4) * 1024 * 1024)
+CHUNK_SIZE = 1024 * 1024
+
+Buffer = Union[bytes, mmap.mmap]
+
+
+class SpooledBuffer:
+    """An upload held either as bytes or as a read-only mmap over a temp file."""
+
+    def __init__(self, buf: Buffer, path: Optional[str] = None, fh=None):
+        self.buf = buf
+        self.path = path
+        self._fh = fh
+
+    @property
+    def size(self) -> int:
+        return len(self.buf)
+
+    @property
+    def spooled(self) -> bool:
+        return self.path is not None
+
+    def stream(self):
+        """A seekable stream over the upload for PdfReader."""
+        if isinstance(self.buf, mmap.mmap):
+            self.buf.seek(0)
+            return self.buf
+        return io.BytesIO(self.buf)
+
+    def close(self) -> None:
+        if isinstance(self.buf, mmap.mmap):
+            self.buf.close()
+        self.buf = b""
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+        if self.path:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            self.path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __bool__(self) -> bool:
+        return self.size > 0
+
+
+class _Spooler:
+    """Accumulates chunks in memory until `threshold`, then switches to a temp file."""
+
+    def __init__(self, threshold: int):
+        self.threshold = threshold
+        self.mem = bytearray()
+        self.fh = None
+        self.path = None
+        self.total = 0
+
+    def write(self, chunk: bytes) -> None:
+        if not chunk:
+            return
+        self.total += len(chunk)
+        if self.fh is None:
+            self.mem += chunk
+            if len(self.mem) > self.threshold:
+                fd, self.path = tempfile.mkstemp(prefix="upload-", suffix=".pdf")
+                self.fh = os.fdopen(fd, "w+b")
+                self.fh.write(self.mem)
+                self.mem = bytearray()
+        else:
+            self.fh.write(chunk)
+
+    def finish(self) -> SpooledBuffer:
+        if self.fh is None:
+            return SpooledBuffer(bytes(self.mem))
+        self.fh.flush()
+        mm = mmap.mmap(self.fh.fileno(), 0, access=mmap.ACCESS_READ)
+        return SpooledBuffer(mm, self.path, self.fh)
+
+    def abort(self) -> None:
+        if self.fh is not None:
+            self.fh.close()
+            os.remove(self.path)
+
+
+def spool_chunks(chunks: Iterable[bytes], threshold: int = SPOOL_THRESHOLD,
+                 max_bytes: Optional[int] = None) -> SpooledBuffer:
+    sp = _Spooler(threshold)
+    try:
+        for chunk in chunks:
+            sp.write(chunk)
+            if max_bytes is not None and sp.total > max_bytes:
+                raise ValueError(f"upload exceeds {max_bytes} bytes")
+    except BaseException:
+        sp.abort()
+        raise
+    return sp.finish()
+
+
+def spool_stream(fp, threshold: int = SPOOL_THRESHOLD, max_bytes: Optional[int] = None) -> SpooledBuffer:
+    return spool_chunks(iter(lambda: fp.read(CHUNK_SIZE), b""), threshold, max_bytes)
+
+
+async def aspool_chunks(chunks: AsyncIterator[bytes], threshold: int = SPOOL_THRESHOLD,
+                        max_bytes: Optional[int] = None) -> SpooledBuffer:
+    sp = _Spooler(threshold)
+    try:
+        async for chunk in chunks:
+            sp.write(chunk)
+            if max_bytes is not None and sp.total > max_bytes:
+                raise ValueError(f"upload exceeds {max_bytes} bytes")
+    except BaseException:
+        sp.abort()
+        raise
+    return sp.finish()
+
+
+async def spool_upload(upload, threshold: int = SPOOL_THRESHOLD) -> SpooledBuffer:
+    """Spool an UploadFile-like object (anything with `async read(n)`)."""
+    async def chunks():
+        while True:
+            chunk = await upload.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+    return await aspool_chunks(chunks(), threshold)
+
+
+_FIELD_RX = '"{}"\\s*:\\s*"'
+
+
+def spool_json_base64(fp, field: str = "content", threshold: int = SPOOL_THRESHOLD) -> Tuple[Optional[SpooledBuffer], dict]:
+    """Stream a JSON body whose `field` holds base64 data.
+
+    The base64 value is decoded chunk by chunk into a SpooledBuffer, and
+    the rest of the object is parsed normally. Neither the base64 string
+    nor the whole decoded file is ever held as one Python object. Returns
+    (buffer or None, other fields).
+    """
+    key_rx = re.compile(_FIELD_RX.format(re.escape(field)).encode())
+    head = bytearray()
+    tail = bytearray()
+    sp = None
+    carry = b""
+    state = "head"
+    try:
+        for chunk in iter(lambda: fp.read(CHUNK_SIZE), b""):
+            if state == "head":
+                head += chunk
+                m = key_rx.search(head)
+                if not m:
+                    continue
+                chunk = bytes(head[m.end():])
+                del head[m.end() - 1:]   # keep `"field": ` and drop the opening quote
+                state = "value"
+                sp = _Spooler(threshold)
+            if state == "value":
+                end = chunk.find(b'"')
+                data, rest = (chunk, b"") if end < 0 else (chunk[:end], chunk[end + 1:])
+                data = carry + data
+                hold = b""
+                if end < 0 and data.endswith(b"\\"):  # escape split across chunks
+                    data, hold = data[:-1], b"\\"
+                # MIME-wrapped or PHP-style JSON: drop \n/\r escapes, unescape \/
+                data = data.replace(b"\\/", b"/").replace(b"\\n", b"").replace(b"\\r", b"")
+                data = b"".join(data.split())
+                if end < 0:
+                    keep = len(data) - len(data) % 4
+                    data, carry = data[:keep], data[keep:] + hold
+                sp.write(base64.b64decode(data))
+                if end >= 0:
+                    state = "tail"
+                    tail += rest
+            elif state == "tail":
+                tail += chunk
+    except (binascii.Error, ValueError):
+        if sp is not None:
+            sp.abort()
+        raise
+    if state == "head":
+        try:
+            return None, json.loads(bytes(head) or b"{}")
+        except ValueError:
+            return None, {}
+    if state == "value":  # unterminated string
+        sp.abort()
+        raise ValueError(f"unterminated '{field}' value")
+    try:
+        other = json.loads(bytes(head) + b'""' + bytes(tail))
+    except ValueError:
+        sp.abort()
+        raise
+    other.pop(field, None)
+    buf = sp.finish()
+    return (buf if buf else None), other
@@ -1,40 +1,210 @@
-from typing import Dict
-import textwrap, regex
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple, Union
+import hashlib, json, os, textwrap, regex
+from textdoc import Document
 
-def heuristic_summary(full_text: str) -> Dict[str, str]:
+# Signal tables are JSON: {"base_score": 50, "signals": [{"name", "pattern", "why"?, "score"?}, ...]}.
+# SIGNALS_CONFIG replaces the bundled signals.json; SIGNALS_DIR/<client>.json is used
+# when a request names a client.
+HERE = os.path.dirname(os.path.abspath(__file__))
+SIGNALS_CONFIG = os.getenv("SIGNALS_CONFIG", "") or os.path.join(HERE, "signals.json")
+SIGNALS_DIR = os.getenv("SIGNALS_DIR", "")
+CLIENT_RX = regex.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+SENTENCE_BREAK_RX = regex.compile(r"(?<=[.?!])\s+(?=[A-Z(])")
+EXECUTIVE_SENTENCES = 6
+
+
+def literal_anchors(pattern: str) -> Tuple[str, ...]:
+    """Case-folded literal prefix of each top-level alternative of `pattern`.
+
+    Every match of the pattern starts with one of these, so a document that
+    contains none of them cannot match. Returns () when some alternative has
+    no literal prefix (the signal is then always searched).
+    """
+    alts, depth, cur, i = [], 0, "", 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\":
+            cur += pattern[i:i + 2]
+            i += 2
+            continue
+        if c == "[":  # character class: copy through the closing bracket
+            j = pattern.find("]", i + 2)
+            j = len(pattern) if j < 0 else j + 1
+            cur += pattern[i:j]
+            i = j
+            continue
+        if c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+        elif c == "|" and depth == 0:
+            alts.append(cur)
+            cur = ""
+            i += 1
+            continue
+        cur += c
+        i += 1
+    alts.append(cur)
+
+    out = []
+    for alt in alts:
+        lit = ""
+        for c in alt:
+            if c in "?*{":
+                lit = lit[:-1]
+                break
+            if c == "+" or not (c.isalnum() or c in " -_'/,:;&"):
+                break
+            lit += c
+        if not lit:
+            return ()
+        out.append(lit.casefold())
+    return tuple(out)
+
+
+class SignalTable:
+    """Content signals compiled once and matched in a single sweep of the text.
+
+    hits() reports every signal that matches anywhere in the text. Each
+    signal's literal anchors are located with str.find on the case-folded
+    text and the signal's pattern is only tried (anchored) at those offsets,
+    in document order; a signal drops out at its first match or when its
+    anchors run out. Signals without anchors are found with one combined
+    alternation that resumes at each match offset with only the signals
+    still unseen, so overlapping patterns are all reported.
+    """
+
+    def __init__(self, signals: List[dict], base_score: int = 50):
+        self.signals = []
+        self._compiled = []
+        for s in signals:
+            if not s.get("pattern"):
+                raise ValueError(f"signal {s.get('name')!r} has no pattern")
+            self._compiled.append(regex.compile(s["pattern"], regex.I))  # fail on load, not on the first request
+            self.signals.append({
+                "name": s.get("name") or f"signal{len(self.signals)}",
+                "pattern": s["pattern"],
+                "why": s.get("why", ""),
+                "score": int(s.get("score", 0)),
+                "anchors": tuple(a.casefold() for a in s["anchors"]) if s.get("anchors") else literal_anchors(s["pattern"]),
+            })
+        self.base_score = int(base_score)
+        # identifies the table's content, e.g. to tell which table a stored summary was built with
+        self.fingerprint = hashlib.sha1(json.dumps(
+            [self.base_score] + [[s["name"], s["pattern"], s["why"], s["score"]] for s in self.signals]
+        ).encode("utf-8")).hexdigest()[:16]
+
+    @classmethod
+    def from_file(cls, path: str) -> "SignalTable":
+        with open(path, encoding="utf-8") as f:
+            cfg = json.load(f)
+        return cls(cfg["signals"], cfg.get("base_score", 50))
+
+    @lru_cache(maxsize=256)
+    def _rx(self, remaining: FrozenSet[int]):
+        alts = "|".join(f"(?P<s{i}>{self.signals[i]['pattern']})" for i in sorted(remaining))
+        return regex.compile(alts, regex.I)
+
+    def hits(self, text: str, folded: Optional[str] = None) -> Set[int]:
+        found: Set[int] = set()
+        folded = text.casefold() if folded is None else folded
+        if len(folded) != len(text):  # offsets would not line up; fall back to the alternation
+            return self._scan(text, frozenset(range(len(self.signals))))
+
+        def next_at(anchors, start):
+            at = [p for p in (folded.find(a, start) for a in anchors) if p >= 0]
+            return min(at) if at else -1
+
+        pending = {}
+        for i, s in enumerate(self.signals):
+            if s["anchors"]:
+                p = next_at(s["anchors"], 0)
+                if p >= 0:
+                    pending[i] = p
+        while pending:
+            i = min(pending, key=pending.get)
+            p = pending[i]
+            if self._compiled[i].match(text, p):
+                found.add(i)
+                del pending[i]
+                continue
+            p = next_at(self.signals[i]["anchors"], p + 1)
+            if p < 0:
+                del pending[i]
+            else:
+                pending[i] = p
+
+        bare = frozenset(i for i, s in enumerate(self.signals) if not s["anchors"])
+        return found | self._scan(text, bare) if bare else found
+
+    def _scan(self, text: str, remaining: FrozenSet[int]) -> Set[int]:
+        found: Set[int] = set()
+        pos = 0
+        while remaining:
+            m = self._rx(remaining).search(text, pos)
+            if not m:
+                break
+            i = int(m.lastgroup[1:])
+            found.add(i)
+            remaining = remaining - {i}
+            pos = m.start()
+        return found
+
+    def evaluate(self, text: Union[str, Document]) -> Dict[str, object]:
+        if isinstance(text, Document):
+            found = self.hits(text.text, text.folded)
+        else:
+            found = self.hits(text)
+        why = [s["why"] for i, s in enumerate(self.signals) if i in found and s["why"]]
+        score = self.base_score + sum(s["score"] for i, s in enumerate(self.signals) if i in found)
+        return {
+            "why": why,
+            "score": max(0, min(100, score)),
+            "signals": [self.signals[i]["name"] for i in sorted(found)],
+        }
+
+
+DEFAULT_SIGNALS = SignalTable.from_file(SIGNALS_CONFIG)
+
+@lru_cache(maxsize=64)
+def _client_table(client: str, mtime: float) -> SignalTable:
+    return SignalTable.from_file(os.path.join(SIGNALS_DIR, f"{client}.json"))
+
+def signal_table(client: Optional[str] = None) -> SignalTable:
+    """The table for `client` from SIGNALS_DIR, else the default; edits are picked up on mtime."""
+    if not client or not SIGNALS_DIR or not CLIENT_RX.match(client):
+        return DEFAULT_SIGNALS
+    path = os.path.join(SIGNALS_DIR, f"{client}.json")
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return DEFAULT_SIGNALS
+    return _client_table(client, mtime)
+
+def head_sentences(text: str, n: int = EXECUTIVE_SENTENCES) -> List[str]:
+    """First `n` sentences; same as SENTENCE_BREAK_RX.split(text)[:n] but stops early."""
+    out, start = [], 0
+    for m in SENTENCE_BREAK_RX.finditer(text):
+        out.append(text[start:m.start()])
+        if len(out) == n:
+            return out
+        start = m.end()
+    out.append(text[start:])
+    return out
+
+def heuristic_summary(full_text: Union[str, Document], signals: Optional[SignalTable] = None) -> Dict[str, str]:
+    text = full_text.text if isinstance(full_text, Document) else full_text
     # Take the most informative 5-7 sentences (very lightweight scoring)
-    sentences = regex.split(r"(?<=[.?!])\s+(?=[A-Z(])", full_text.strip())
-    head = " ".join(sentences[:6]).strip() if sentences else ""
-
-    why = []
-    if regex.search(r"standing offer|supply arrangement|multi-?year", full_text, regex.I):
-        why.append("Potential for multi-year revenue via standing offer/supply arrangement.")
-    if regex.search(r"option(?:s)? to extend|extension", full_text, regex.I):
-        why.append("Includes options to extend the term.")
-    if regex.search(r"mandatory|must", full_text, regex.I):
-        why.append("Contains strict mandatory requirements—screen carefully.")
-    if regex.search(r"indigenous|aboriginal|set-?aside", full_text, regex.I):
-        why.append("May include Indigenous procurement considerations.")
-    if regex.search(r"bond|security|insurance", full_text, regex.I):
-        why.append("Financial security/insurance requirements likely apply.")
-
-    # Naive fit score: presence of common Strategic Tender domains
-    score = 50
-    bumps = [
-        (r"services?", +10),
-        (r"maintenance|support|rentals?", +10),
-        (r"training|implementation", +5),
-        (r"mandatory", -5),
-        (r"experience\s+in", -5),
-        (r"security\s+clearance|reliability|criminal", -10),
-    ]
-    for pat, delta in bumps:
-        if regex.search(pat, full_text, regex.I):
-            score += delta
-    score = max(0, min(100, score))
+    sentences = head_sentences(text.strip())
+    head = " ".join(sentences).strip() if sentences else ""
+
+    # "why it matters" lines and a naive fit score from the signal table
+    result = (signals or DEFAULT_SIGNALS).evaluate(full_text)
 
     return {
         "executive": textwrap.shorten(head or "No summary extracted from the document.", width=800, placeholder="…"),
-        "why_it_matters": " ".join(why) or "Standard public solicitation; evaluate scope, dates, and mandatory items.",
-        "fit_score": {"score": score, "rationale": f"Heuristic score based on content signals; adjust with client context."}
+        "why_it_matters": " ".join(result["why"]) or "Standard public solicitation; evaluate scope, dates, and mandatory items.",
+        "fit_score": {"score": result["score"], "rationale": f"Heuristic score based on content signals; adjust with client context."}
     }
@@ -1,19 +1,45 @@
-import base64, io, re
-from flask import Flask, request, jsonify, make_response
+import base64, io, os, re
+from functools import lru_cache
+from flask import Flask, Response, request, jsonify, make_response
 from PyPDF2 import PdfReader
+from pdf_cache import cache_from_env, content_key
+from spool import SpooledBuffer, spool_json_base64, spool_stream
+from metrics import PROMETHEUS_CONTENT_TYPE, StageTimer, new_registry
 
 app = Flask(__name__)
 
+MAX_PAGES = 30
+# keyed by SHA-256 of the upload; namespaced because only the first MAX_PAGES pages are kept
+EXTRACT_CACHE = cache_from_env(f'pages{MAX_PAGES}')
+# quick mode: pages parsed at most before giving up on the remaining fields
+QUICK_PAGE_BUDGET = int(os.getenv('QUICK_PAGE_BUDGET', '5'))
+METRICS = new_registry('rfp_backend', EXTRACT_CACHE)
+
+# Cover-page fields for quick mode, tried on each page as it is extracted.
+FIELD_PATTERNS = {
+    'title': re.compile(r'^\s*((?:request for|invitation to tender|rfp|rfq|tender|standing offer|proposal)\b.*?)\s*$', re.I | re.M),
+    'buyer': re.compile(r'(?:buyer|purchasing|procurement|organization|department)\s*[:\-]\s*(.+)', re.I),
+    'solicitation_id': re.compile(r'(?:solicitation|tender|rfp|rfq|itt|reference)\s*(?:no\.?|#|id)?\s*[:\-]?\s*([A-Z0-9][A-Z0-9\-_/]{3,})', re.I),
+    'closing_date': re.compile(
+        r'(?:closing|due|submission)\s*(?:date|deadline)[^\S\r\n]*[:\-]?\s*'
+        r'((?:\d{4}[-/]\d{1,2}[-/]\d{1,2})|(?:\d{1,2}\s+\w+\s+\d{4})|(?:\w+\s+\d{1,2},\s*\d{4}))', re.I),
+}
+
 def cors(resp):
     resp.headers['Access-Control-Allow-Origin'] = '*'
     resp.headers['Access-Control-Allow-Headers'] = 'Content-Type'
     resp.headers['Access-Control-Allow-Methods'] = 'POST, OPTIONS, GET'
+    resp.headers['Access-Control-Expose-Headers'] = 'Server-Timing'
     return resp
 
 @app.route('/health', methods=['GET'])
 def health():
     return cors(jsonify(ok=True, service='summarize-rfp-v2', mode='multipart+json'))
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(METRICS.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
 @app.route('/summarize_rfp', methods=['OPTIONS'])
 def preflight():
     return cors(make_response('', 204))
@@ -22,66 +48,228 @@ def preflight():
 def summarize_rfp():
     try:
         raw = None
+        data = {}
         fname = 'document.pdf'
+        timer = StageTimer()
 
-        # 1) Try multipart/form-data (file upload)
-        if request.files:
-            f = request.files.get('file')
-            if f:
-                fname = getattr(f, 'filename', fname) or fname
-                raw = f.read()
-
-        # 2) Fallback to JSON {filename, content: base64}
-        if raw is None:
-            data = request.get_json(force=True, silent=True) or {}
-            b64 = data.get('content')
-            fname = data.get('filename') or fname
-            if b64:
-                raw = base64.b64decode(b64)
+        # Uploads over SPOOL_THRESHOLD_MB are streamed to a temp file and memory-mapped.
+        with timer.stage('upload'):
+            # 1) Try multipart/form-data (file upload)
+            if request.files:
+                f = request.files.get('file')
+                if f:
+                    fname = getattr(f, 'filename', fname) or fname
+                    raw = spool_stream(f.stream)
+
+            # 2) Fallback to JSON {filename, content: base64}, decoded as it streams in
+            if raw is None:
+                try:
+                    raw, data = spool_json_base64(request.stream, 'content')
+                except ValueError:
+                    raw, data = None, {}
+                fname = data.get('filename') or fname
 
         if not raw:
             return cors(jsonify(error='No file content received')), 400
 
-        text, pages = extract_text(raw)
-        html = render_html(fname, {
-            'overview': (text[:700] or 'No extractable text.'),
-            'buyer': take_lines(text, r'(Parks Canada|CanadaBuys|Owner|Agency|Department)'),
-            'key_dates': take_lines(text, r'(Closing|Deadline|Time|Date)'),
-            'deliverables': take_lines(text, r'(Deliverables?|Tasks|Services Required)'),
-            'mandatory': take_lines(text, r'(Mandatory|MUST|Requirements)'),
-            'evaluation': take_lines(text, r'(Evaluation|Basis of Selection|Rated Criteria)'),
-            'submission': take_lines(text, r'(Submission|How to submit|Bidding)'),
-            'risks': take_lines(text, r'(Security|Insurance|Liability|Risks?)'),
-        })
-        return cors(jsonify(summary_html=html, meta={'pages': pages, 'bytes': len(raw), 'mode': 'multipart+json'}))
+        opts = _options(data)
+        fields = None
+        with raw:
+            raw_bytes = raw.size
+            with timer.stage('parse'):
+                if opts['mode'] == 'quick':
+                    text, pages, parsed, fields = extract_quick(raw, opts['fields'], opts['max_pages'])
+                else:
+                    text, pages, parsed = load_text(raw)
+        with timer.stage('sections'):
+            sections = SECTION_LOCATOR.build(text)
+        with timer.stage('render'):
+            html = render_html(fname, {
+                'overview': (text[:700] or 'No extractable text.'),
+                **sections,
+            })
+        meta = {'pages': pages, 'pages_parsed': parsed, 'bytes': raw_bytes, 'mode': 'multipart+json',
+                'timings': timer.as_ms()}
+        body = {'summary_html': html, 'meta': meta}
+        if fields is not None:
+            meta['extract'] = 'quick'
+            body['fields'] = fields
+        with timer.stage('serialize'):
+            resp = jsonify(**body)
+        METRICS.record(timer, raw_bytes, parsed)
+        resp.headers['Server-Timing'] = timer.server_timing()
+        return cors(resp)
     except Exception as e:
         return cors(jsonify(error=str(e))), 500
 
-def extract_text(raw: bytes):
+def _extract_pages(raw):
+    reader = PdfReader(raw.stream() if isinstance(raw, SpooledBuffer) else io.BytesIO(raw))
+    pages = len(reader.pages)
+    out = []
+    for i in range(min(pages, MAX_PAGES)):
+        try:
+            out.append(reader.pages[i].extract_text() or '')
+        except Exception:
+            out.append('')
+    return out, pages
+
+def load_text(raw):
+    """Return (text, page_count, pages_parsed); pages_parsed is 0 on a cache hit."""
+    # raw: bytes, or a SpooledBuffer over a memory-mapped temp file
+    buf = raw.buf if isinstance(raw, SpooledBuffer) else raw
     try:
-        reader = PdfReader(io.BytesIO(raw))
-        pages = len(reader.pages)
-        out = []
-        for i in range(min(pages, 30)):
-            try:
-                out.append(reader.pages[i].extract_text() or '')
-            except Exception:
-                out.append('')
-        return '\n'.join(out), pages
+        entry, hit = EXTRACT_CACHE.get_or_extract(buf, lambda: _extract_pages(raw))
+        return '\n'.join(entry['pages']), entry['page_count'], 0 if hit else len(entry['pages'])
     except Exception:
         try:
-            return raw.decode('utf-8', errors='replace'), 1
+            return bytes(buf).decode('utf-8', errors='replace'), 1, 0
         except Exception:
-            return '', 1
+            return '', 1, 0
 
-def take_lines(text, pattern, n=8):
-    m = re.search(pattern, text, re.I)
-    if not m: return ''
-    start = m.start()
+def extract_text(raw):
+    text, pages, _parsed = load_text(raw)
+    return text, pages
+
+def _options(data):
+    # quick-look options from the query string, multipart form or JSON body
+    src = {**request.args.to_dict(), **request.form.to_dict(), **{k: v for k, v in data.items() if k != 'content'}}
+    fields = src.get('fields') or list(FIELD_PATTERNS)
+    if isinstance(fields, str):
+        fields = [f.strip() for f in fields.split(',') if f.strip()]
+    try:
+        budget = int(src.get('max_pages') or QUICK_PAGE_BUDGET)
+    except (TypeError, ValueError):
+        budget = QUICK_PAGE_BUDGET
+    return {
+        'mode': str(src.get('mode') or 'full').lower(),
+        'fields': [f for f in fields if f in FIELD_PATTERNS],
+        'max_pages': max(1, min(budget, MAX_PAGES)),
+    }
+
+def find_fields(text, wanted, found):
+    for name in wanted:
+        if name not in found:
+            m = FIELD_PATTERNS[name].search(text)
+            if m:
+                found[name] = m.group(1).strip()
+    return found
+
+def _iter_pages(raw, limit):
+    reader = PdfReader(raw.stream() if isinstance(raw, SpooledBuffer) else io.BytesIO(raw))
+    count = len(reader.pages)
+    def pages():
+        for i in range(min(count, limit)):
+            try:
+                yield reader.pages[i].extract_text() or ''
+            except Exception:
+                yield ''
+    return count, pages()
+
+def extract_quick(raw, wanted, budget):
+    """Extract pages lazily, stopping once every wanted field is found or `budget` pages are read.
+
+    Returns (text, page_count, pages_parsed, fields). A cached full
+    extraction is reused without parsing anything.
+    """
+    buf = raw.buf if isinstance(raw, SpooledBuffer) else raw
+    entry = EXTRACT_CACHE.get(content_key(buf))
+    parsed = 0
+    try:
+        if entry is not None:
+            count, pages = entry['page_count'], iter(entry['pages'][:budget])
+        else:
+            count, pages = _iter_pages(raw, budget)
+    except Exception:
+        text = bytes(buf).decode('utf-8', errors='replace')
+        return text, 1, 0, find_fields(text, wanted, {})
+    found, texts = {}, []
+    for t in pages:
+        texts.append(t)
+        if entry is None:
+            parsed += 1
+        find_fields(t, wanted, found)
+        if len(found) == len(wanted):
+            break
+    return '\n'.join(texts), count, parsed, {name: found.get(name, '') for name in wanted}
+
+# (key, keyword pattern) pairs rendered by render_html; add a section here
+# rather than calling take_lines again, so the text is still scanned once.
+SECTIONS = [
+    ('buyer', r'(Parks Canada|CanadaBuys|Owner|Agency|Department)'),
+    ('key_dates', r'(Closing|Deadline|Time|Date)'),
+    ('deliverables', r'(Deliverables?|Tasks|Services Required)'),
+    ('mandatory', r'(Mandatory|MUST|Requirements)'),
+    ('evaluation', r'(Evaluation|Basis of Selection|Rated Criteria)'),
+    ('submission', r'(Submission|How to submit|Bidding)'),
+    ('risks', r'(Security|Insurance|Liability|Risks?)'),
+]
+
+def _lead_chars(pattern):
+    # first letters of a plain keyword alternation like '(Foo|Bar baz)'; None unless every
+    # alternative starts with a literal letter or digit that is not optional or repeated
+    body = pattern[1:-1] if pattern.startswith('(') and pattern.endswith(')') else pattern
+    if any(c in body for c in '()[]\\'):
+        return None
+    lead = set()
+    for w in body.split('|'):
+        if not w or not w[0].isalnum() or w[1:2] in ('?', '*', '{'):
+            return None
+        lead |= {w[0].lower(), w[0].upper()}
+    return lead
+
+class SectionLocator:
+    """Finds the first offset of every section keyword in one pass over the text.
+
+    The sections are combined into a single alternation of named groups.
+    Each hit records one section, and the scan resumes at that same offset
+    with the remaining sections only. The text is therefore read once, and
+    the offsets match a separate re.search per section.
+    """
+    def __init__(self, sections):
+        self.sections = list(sections)
+        self.patterns = dict(self.sections)
+
+    @lru_cache(maxsize=256)
+    def _rx(self, names):
+        alt = '|'.join(f'(?P<{n}>{self.patterns[n]})' for n in names)
+        lead = set()
+        for n in names:
+            chars = _lead_chars(self.patterns[n])
+            if chars is None:
+                return re.compile(alt, re.I)
+            lead |= chars
+        # a leading character-class guard lets re skip positions no keyword can start at
+        return re.compile(f'(?=[{re.escape("".join(sorted(lead)))}])(?:{alt})', re.I)
+
+    def locate(self, text):
+        first = {}
+        remaining = tuple(n for n, _ in self.sections)
+        pos = 0
+        while remaining:
+            m = self._rx(remaining).search(text, pos)
+            if not m:
+                break
+            name = m.lastgroup
+            first[name] = pos = m.start()
+            remaining = tuple(n for n in remaining if n != name)
+        return first
+
+    def build(self, text, n=8):
+        first = self.locate(text)
+        return {name: lines_at(text, first[name], n) if name in first else '' for name, _ in self.sections}
+
+SECTION_LOCATOR = SectionLocator(SECTIONS)
+
+def lines_at(text, start, n=8):
     chunk = text[start:start+3000]
     lines = [ln.strip() for ln in chunk.splitlines() if ln.strip()]
     return '\n'.join(lines[:n])
 
+def take_lines(text, pattern, n=8):
+    m = re.search(pattern, text, re.I)
+    if not m: return ''
+    return lines_at(text, m.start(), n)
+
 def escape_html(s): 
     return (s or '').replace('&','&amp;').replace('<','&lt;').replace('>','&gt;').replace('"','&quot;')
 
@@ -0,0 +1,144 @@
+"""Per-stage request timing and a small Prometheus text-format registry.
+
+A StageTimer records how long each named stage of one request took
+(download, parse, fields, summarize, serialize...). Its results go out as
+a Server-Timing header and in the response meta. They are also added to
+process-wide histograms, which are served from /metrics alongside counters
+for bytes processed and pages parsed and the extraction cache hit ratio.
+
+This file is shared verbatim by backend/, backend-upgrade/ and
+cloudfn_summarizer/ (each deploys from its own directory); keep the copies
+in sync. Metrics are per process; scrape each worker or run one worker per
+container.
+"""
+import threading, time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class StageTimer:
+    def __init__(self):
+        self.stages: "OrderedDict[str, float]" = OrderedDict()  # seconds
+        self._t0 = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - t0)
+
+    def add(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def total(self) -> float:
+        return time.perf_counter() - self._t0
+
+    def as_ms(self) -> Dict[str, float]:
+        return {k: round(v * 1000, 2) for k, v in self.stages.items()}
+
+    def server_timing(self) -> str:
+        parts = [f"{k};dur={v * 1000:.2f}" for k, v in self.stages.items()]
+        parts.append(f"total;dur={self.total() * 1000:.2f}")
+        return ", ".join(parts)
+
+
+class Registry:
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._hist: Dict[Tuple[str, str], List[float]] = {}   # (name, stage) -> bucket counts + [sum, count]
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, Callable[[], float]] = {}
+        self._help: Dict[str, str] = {}
+
+    def describe(self, name: str, help_text: str) -> None:
+        self._help[name] = help_text
+
+    def observe(self, name: str, stage: str, seconds: float) -> None:
+        with self._lock:
+            h = self._hist.setdefault((name, stage), [0.0] * (len(BUCKETS) + 2))
+            for i, b in enumerate(BUCKETS):
+                if seconds <= b:
+                    h[i] += 1
+            h[-2] += seconds
+            h[-1] += 1
+
+    def inc(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def gauge(self, name: str, fn: Callable[[], float]) -> None:
+        self._gauges[name] = fn
+
+    def record(self, timer: StageTimer, bytes_processed: int = 0, pages_parsed: int = 0) -> None:
+        for stage, seconds in timer.stages.items():
+            self.observe("stage_seconds", stage, seconds)
+        self.observe("request_seconds", "total", timer.total())
+        self.inc("requests_total")
+        if bytes_processed:
+            self.inc("bytes_processed_total", bytes_processed)
+        if pages_parsed:
+            self.inc("pages_parsed_total", pages_parsed)
+
+    def render(self) -> str:
+        p = self.prefix
+        out: List[str] = []
+        with self._lock:
+            hist = {k: list(v) for k, v in self._hist.items()}
+            counters = dict(self._counters)
+        for name in sorted({n for n, _ in hist}):
+            full = f"{p}_{name}"
+            out.append(f"# HELP {full} {self._help.get(name, name.replace('_', ' '))}")
+            out.append(f"# TYPE {full} histogram")
+            for (n, stage), h in sorted(hist.items()):
+                if n != name:
+                    continue
+                label = f'stage="{stage}"'
+                for i, b in enumerate(BUCKETS):
+                    out.append(f'{full}_bucket{{{label},le="{b}"}} {int(h[i])}')
+                out.append(f'{full}_bucket{{{label},le="+Inf"}} {int(h[-1])}')
+                out.append(f"{full}_sum{{{label}}} {h[-2]:.6f}")
+                out.append(f"{full}_count{{{label}}} {int(h[-1])}")
+        for name, value in sorted(counters.items()):
+            full = f"{p}_{name}"
+            out.append(f"# HELP {full} {self._help.get(name, name.replace('_', ' '))}")
+            out.append(f"# TYPE {full} counter")
+            out.append(f"{full} {value:g}")
+        for name, fn in sorted(self._gauges.items()):
+            try:
+                value = float(fn())
+            except Exception:
+                continue
+            full = f"{p}_{name}"
+            out.append(f"# HELP {full} {self._help.get(name, name.replace('_', ' '))}")
+            out.append(f"# TYPE {full} gauge")
+            out.append(f"{full} {value:g}")
+        return "\n".join(out) + "\n"
+
+
+def cache_gauges(registry: Registry, cache) -> None:
+    """Expose an ExtractionCache's hit/miss counters and hit ratio."""
+    registry.gauge("extract_cache_hits", lambda: cache.stats()["hits"])
+    registry.gauge("extract_cache_misses", lambda: cache.stats()["misses"])
+    registry.gauge("extract_cache_hit_ratio", lambda: cache.stats()["hit_ratio"])
+
+
+def new_registry(prefix: str, cache=None) -> Registry:
+    r = Registry(prefix)
+    r.describe("stage_seconds", "Time spent in each request stage")
+    r.describe("request_seconds", "End-to-end handler time")
+    r.describe("requests_total", "Summarize requests handled")
+    r.describe("bytes_processed_total", "Upload bytes processed")
+    r.describe("pages_parsed_total", "PDF pages actually parsed (cache hits excluded)")
+    r.describe("extract_cache_hit_ratio", "Extraction cache hits / lookups")
+    if cache is not None:
+        cache_gauges(r, cache)
+    return r
+
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
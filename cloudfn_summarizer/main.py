@@ -1,40 +1,85 @@
-import re, json, io
-from typing import List
+import os, re, json, io
+from typing import List, Union
+import numpy as np
 from pypdf import PdfReader
 import functions_framework
+from pdf_cache import cache_from_env
+from metrics import PROMETHEUS_CONTENT_TYPE, StageTimer, new_registry
+from textdoc import Document
 
 STOPWORDS = set("""
 a an and are as at be by for from has have in is it its of on or that the to was were will with your you we our this those these not
 """.split())
 
-def extract_text(pdf_bytes: bytes):
+# 0 ranks highlights by raw summed word frequency; 1 divides by sentence
+# length in words (0.5 = square root) so long run-on sentences stop winning
+HIGHLIGHT_LENGTH_NORM = float(os.getenv("HIGHLIGHT_LENGTH_NORM", "0") or 0)
+
+# repeat uploads of the same bytes (keyed by SHA-256) skip PDF parsing entirely
+EXTRACT_CACHE = cache_from_env("pages")
+METRICS = new_registry("rfp_cloudfn", EXTRACT_CACHE)
+
+def _extract_pages(pdf_bytes: bytes):
   reader = PdfReader(io.BytesIO(pdf_bytes))
-  pages = len(reader.pages)
-  texts, first_page = [], ""
-  for i, p in enumerate(reader.pages):
+  texts = []
+  for p in reader.pages:
     try:
       t = p.extract_text() or ""
     except Exception:
       t = ""
     texts.append(t)
-    if i == 0:
-      first_page = t
+  return texts, len(texts)
+
+def extract_pages(pdf_bytes: bytes):
+  """Return (page_texts, page_count, cache_hit)."""
+  entry, hit = EXTRACT_CACHE.get_or_extract(pdf_bytes, lambda: _extract_pages(pdf_bytes))
+  return entry["pages"], entry["page_count"], hit
+
+def extract_text(pdf_bytes: bytes):
+  texts, pages, _hit = extract_pages(pdf_bytes)
+  first_page = texts[0] if texts else ""
   return "\n".join(texts), pages, first_page
 
-def top_sentences(text: str, limit: int = 6) -> List[str]:
-  sents = re.split(r'(?<=[\.\?!])\s+|\n{2,}', text)
-  sents = [s.strip() for s in sents if s.strip()]
-  freq = {}
-  for w in re.findall(r"[A-Za-z][A-Za-z\-']{1,}", text.lower()):
-    if w in STOPWORDS: continue
-    freq[w] = freq.get(w, 0) + 1
-  scored = []
-  for i, s in enumerate(sents):
-    sc = sum(freq.get(w.lower(), 0) for w in re.findall(r"[A-Za-z][A-Za-z\-']{1,}", s))
-    scored.append((sc, i, s))
-  scored.sort(reverse=True)
-  keep = sorted(scored[:limit], key=lambda x: x[1])
-  return [s for _,_,s in keep]
+def sentence_scores(doc: Document, length_norm: float = 0.0) -> np.ndarray:
+  """Score every sentence as S @ w: S is the sentence-by-term count matrix, w the document frequencies.
+
+  S is held in CSR form straight from the Document (indptr = bounds,
+  indices = token ids, every entry 1), and the product is a prefix sum over
+  w[ids] read at the row boundaries.
+  """
+  weight = np.fromiter((0 if w in STOPWORDS or len(w) < 2 or not w.isalpha() else c
+                        for w, c in zip(doc.terms, doc.tf)), dtype=np.int64, count=len(doc.terms))
+  indptr = np.asarray(doc.bounds, dtype=np.int64)
+  indices = np.asarray(doc.ids, dtype=np.int64)
+  csum = np.zeros(len(indices) + 1, dtype=np.int64)
+  np.cumsum(weight[indices], out=csum[1:])
+  scores = csum[indptr[1:]] - csum[indptr[:-1]]
+  if length_norm:
+    lengths = np.maximum(np.diff(indptr), 1).astype(np.float64)
+    return scores / lengths ** length_norm
+  return scores
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+  """Indices of the k best scores in document order; ties go to the later sentence."""
+  n = len(scores)
+  if n <= k:
+    return np.arange(n)
+  if k <= 0:
+    return np.arange(0)
+  thr = np.partition(scores, n - k)[n - k]
+  above = np.flatnonzero(scores > thr)
+  ties = np.flatnonzero(scores == thr)
+  keep = np.concatenate([above, ties[len(ties) - (k - len(above)):]])
+  keep.sort()
+  return keep
+
+def top_sentences(text: Union[str, Document], limit: int = 6, length_norm: float = None) -> List[str]:
+  # a sentence scores the document frequency of each word it contains
+  doc = Document.of(text)
+  if not doc.sentences:
+    return []
+  scores = sentence_scores(doc, HIGHLIGHT_LENGTH_NORM if length_norm is None else length_norm)
+  return [doc.sentence(int(i)) for i in top_k(scores, limit)]
 
 def find_all(pat: re.Pattern, text: str, limit=5):
   out = []
@@ -53,58 +98,76 @@ def summarize_http(request):
       "Access-Control-Max-Age": "86400",
     })
 
-  headers = {"Access-Control-Allow-Origin": "*", "Content-Type": "application/json"}
+  if request.method == "GET" and request.path.rstrip("/").endswith("/metrics"):
+    return (METRICS.render(), 200, {"Content-Type": PROMETHEUS_CONTENT_TYPE})
 
-  if "multipart/form-data" in (request.headers.get("Content-Type") or ""):
-    f = request.files.get("file") or request.files.get("pdf")
-    if not f:
-      return (json.dumps({"error":"no 'file' field in form-data"}), 400, headers)
-    data, filename = f.read(), f.filename
-  else:
-    data, filename = (request.get_data() or b""), "upload.bin"
+  headers = {"Access-Control-Allow-Origin": "*", "Content-Type": "application/json",
+             "Access-Control-Expose-Headers": "Server-Timing"}
+  timer = StageTimer()
+
+  with timer.stage("upload"):
+    if "multipart/form-data" in (request.headers.get("Content-Type") or ""):
+      f = request.files.get("file") or request.files.get("pdf")
+      if not f:
+        return (json.dumps({"error":"no 'file' field in form-data"}), 400, headers)
+      data, filename = f.read(), f.filename
+    else:
+      data, filename = (request.get_data() or b""), "upload.bin"
 
   if not data:
     return (json.dumps({"error":"empty upload"}), 400, headers)
 
   try:
-    text, pages, first_page = extract_text(data)
+    with timer.stage("parse"):
+      texts, pages, hit = extract_pages(data)
+      text = "\n".join(texts)
+      first_page = texts[0] if texts else ""
   except Exception as e:
     return (json.dumps({"error":"failed to read PDF (maybe scanned?)", "detail": str(e)}), 400, headers)
+  parsed = 0 if hit else len(texts)
+
+  with timer.stage("fields"):
+    compact = re.sub(r"\s+", " ", text).strip()
+
+    date_pats = [
+      re.compile(r"(?:Closing|Close|Due|Deadline)[^\n]{0,40}?:\s*(\w{3,9}\s+\d{1,2},\s+\d{4})", re.I),
+      re.compile(r"(?:Closing|Close|Due|Deadline)[^\n]{0,40}?:\s*(\d{4}-\d{2}-\d{2})", re.I),
+      re.compile(r"(?:Closing|Close|Due|Deadline)[^\n]{0,40}?:\s*(\d{1,2}/\d{1,2}/\d{2,4})", re.I),
+    ]
+    closing_date = None
+    for pat in date_pats:
+      m = pat.search(text)
+      if m: closing_date = m.group(1); break
+
+    email_pat = re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}")
+    phone_pat = re.compile(r"(?:\+?\d{1,2}\s*)?(?:\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4})")
+    money_pat = re.compile(r"\$\s?\d{1,3}(?:[,\s]\d{3})*(?:\.\d+)?")
+
+    org_guess = None
+    for kw in ["Government of", "City of", "Province of", "County of", "Town of", "Canada", "CanadaBuys"]:
+      i = text.find(kw)
+      if i != -1:
+        org_guess = text[i:i+120].splitlines()[0].strip()
+        break
 
-  compact = re.sub(r"\s+", " ", text).strip()
-
-  date_pats = [
-    re.compile(r"(?:Closing|Close|Due|Deadline)[^\n]{0,40}?:\s*(\w{3,9}\s+\d{1,2},\s+\d{4})", re.I),
-    re.compile(r"(?:Closing|Close|Due|Deadline)[^\n]{0,40}?:\s*(\d{4}-\d{2}-\d{2})", re.I),
-    re.compile(r"(?:Closing|Close|Due|Deadline)[^\n]{0,40}?:\s*(\d{1,2}/\d{1,2}/\d{2,4})", re.I),
-  ]
-  closing_date = None
-  for pat in date_pats:
-    m = pat.search(text)
-    if m: closing_date = m.group(1); break
-
-  email_pat = re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}")
-  phone_pat = re.compile(r"(?:\+?\d{1,2}\s*)?(?:\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4})")
-  money_pat = re.compile(r"\$\s?\d{1,3}(?:[,\s]\d{3})*(?:\.\d+)?")
-
-  org_guess = None
-  for kw in ["Government of", "City of", "Province of", "County of", "Town of", "Canada", "CanadaBuys"]:
-    i = text.find(kw)
-    if i != -1:
-      org_guess = text[i:i+120].splitlines()[0].strip()
-      break
-
-  resp = {
-    "ok": True,
-    "filename": filename,
-    "pages": pages,
-    "word_count": len(compact.split()),
-    "closing_date_guess": closing_date,
-    "contact_emails": find_all(email_pat, text, 5),
-    "contact_phones": find_all(phone_pat, text, 5),
-    "budget_mentions": find_all(money_pat, text, 5),
-    "buyer_guess": org_guess,
-    "title_guess": next((ln.strip() for ln in first_page.splitlines() if ln.strip() and len(ln.strip()) < 140), None),
-    "highlights": top_sentences(text, 6),
-  }
-  return (json.dumps(resp, indent=2), 200, headers)
+    resp = {
+      "ok": True,
+      "filename": filename,
+      "pages": pages,
+      "pages_parsed": parsed,
+      "word_count": len(compact.split()),
+      "closing_date_guess": closing_date,
+      "contact_emails": find_all(email_pat, text, 5),
+      "contact_phones": find_all(phone_pat, text, 5),
+      "budget_mentions": find_all(money_pat, text, 5),
+      "buyer_guess": org_guess,
+      "title_guess": next((ln.strip() for ln in first_page.splitlines() if ln.strip() and len(ln.strip()) < 140), None),
+    }
+  with timer.stage("highlights"):
+    resp["highlights"] = top_sentences(text, 6)
+  resp["timings"] = timer.as_ms()
+  with timer.stage("serialize"):
+    body = json.dumps(resp, indent=2)
+  METRICS.record(timer, len(data), parsed)
+  headers["Server-Timing"] = timer.server_timing()
+  return (body, 200, headers)
@@ -0,0 +1,253 @@
+"""Persistent cache for LLM completions.
+
+Entries are keyed by the model name, a hash of the system prompt, a hash of
+the input messages and the sampling parameters, so a repeat of the same
+call (same document chunk, same prompt, same temperature/max_tokens) is
+answered from an in-process LRU or the on-disk tier without calling the
+model. Entries expire after COMPLETION_CACHE_TTL seconds; the disk tier is
+trimmed to COMPLETION_CACHE_MAX_MB, least recently used first.
+
+This file is shared verbatim by gcp_functions/summarize_rfp/ and
+gcp_functions/summarize-rfp/ (each deploys from its own directory); keep
+the copies in sync.
+
+Env:
+- COMPLETION_CACHE_DIR: disk tier location (unset or empty disables it). Off by default: on
+  Cloud Functions /tmp is an in-memory filesystem counted against the instance's memory
+  limit, so point this at a real disk or size COMPLETION_CACHE_MAX_MB well under that limit
+- COMPLETION_CACHE_TTL: seconds an entry stays valid (default 604800 = 7 days)
+- COMPLETION_CACHE_MAX_MB: disk tier size budget (default 256)
+- COMPLETION_CACHE_ENTRIES: in-memory LRU size (default 256, 0 disables)
+"""
+import asyncio, hashlib, json, os, tempfile, threading, time, zlib
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+Messages = List[Dict[str, str]]
+
+
+def _sha(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def completion_key(model: str, messages: Messages, params: Dict[str, object]) -> str:
+    system = "\n".join(m["content"] for m in messages if m.get("role") == "system")
+    rest = json.dumps([[m.get("role"), m["content"]] for m in messages if m.get("role") != "system"], ensure_ascii=False)
+    return _sha(json.dumps({
+        "model": model,
+        "system": _sha(system),
+        "input": _sha(rest),
+        "params": params,
+    }, sort_keys=True))
+
+
+class CompletionCache:
+    def __init__(self, disk_dir: Optional[str] = None, ttl: float = 7 * 86400,
+                 disk_max_bytes: int = 256 * 1024 * 1024, max_entries: int = 256):
+        self.disk_dir = disk_dir
+        self.ttl = ttl
+        self.disk_max_bytes = disk_max_bytes
+        self.max_entries = max_entries
+        self._mem: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._disk_bytes = 0
+        if self.disk_dir:
+            try:
+                os.makedirs(self.disk_dir, exist_ok=True)
+                self._disk_bytes = sum(size for _, size, _ in self._disk_files())
+            except OSError:
+                self.disk_dir = None
+
+    def _fresh(self, entry: dict) -> bool:
+        return time.time() - entry.get("created", 0) <= self.ttl
+
+    # -- memory tier -------------------------------------------------------
+    def _mem_get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None:
+                self._mem.move_to_end(key)
+            return entry
+
+    def _mem_put(self, key: str, entry: dict) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._mem[key] = entry
+            self._mem.move_to_end(key)
+            while len(self._mem) > self.max_entries:
+                self._mem.popitem(last=False)
+
+    # -- disk tier ---------------------------------------------------------
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], key + ".json.z")
+
+    def _disk_files(self) -> List[Tuple[str, int, float]]:
+        out = []
+        for root, _dirs, files in os.walk(self.disk_dir):
+            for fn in files:
+                if not fn.endswith(".json.z"):
+                    continue
+                p = os.path.join(root, fn)
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    continue
+                out.append((p, st.st_size, st.st_mtime))
+        return out
+
+    def _disk_get(self, key: str) -> Optional[dict]:
+        if not self.disk_dir:
+            return None
+        p = self._path(key)
+        try:
+            with open(p, "rb") as f:
+                entry = json.loads(zlib.decompress(f.read()).decode("utf-8"))
+        except (OSError, ValueError, zlib.error):
+            return None
+        if not self._fresh(entry):
+            self._disk_remove(p)
+            return None
+        try:
+            os.utime(p)  # mtime doubles as last-access for eviction
+        except OSError:
+            pass
+        return entry
+
+    def _disk_put(self, key: str, entry: dict) -> None:
+        if not self.disk_dir:
+            return
+        p = self._path(key)
+        blob = zlib.compress(json.dumps(entry, ensure_ascii=False).encode("utf-8"), 6)
+        try:
+            os.makedirs(os.path.dirname(p), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(p), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(blob)
+            os.replace(tmp, p)
+        except OSError:
+            return
+        with self._lock:
+            self._disk_bytes += len(blob)
+            over = self._disk_bytes > self.disk_max_bytes
+        if over:
+            self._evict_disk()
+
+    def _disk_remove(self, p: str) -> None:
+        try:
+            size = os.path.getsize(p)
+            os.remove(p)
+        except OSError:
+            return
+        with self._lock:
+            self._disk_bytes = max(0, self._disk_bytes - size)
+
+    def _evict_disk(self) -> None:
+        # expired entries first, then least recently used down to 90% of the budget
+        now = time.time()
+        files = sorted(self._disk_files(), key=lambda x: x[2])
+        total = sum(size for _, size, _ in files)
+        target = int(self.disk_max_bytes * 0.9)
+        for p, size, mtime in files:
+            if total <= target and now - mtime <= self.ttl:
+                continue
+            try:
+                os.remove(p)
+                total -= size
+            except OSError:
+                pass
+        with self._lock:
+            self._disk_bytes = total
+
+    # -- public API --------------------------------------------------------
+    def get(self, key: str) -> Optional[str]:
+        entry = self._mem_get(key)
+        if entry is not None and not self._fresh(entry):
+            with self._lock:
+                self._mem.pop(key, None)
+            entry = None
+        if entry is None:
+            entry = self._disk_get(key)
+            if entry is not None:
+                self._mem_put(key, entry)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entry["content"] if entry is not None else None
+
+    def put(self, key: str, content: str, model: str = "") -> None:
+        entry = {"content": content, "model": model, "created": time.time()}
+        self._mem_put(key, entry)
+        self._disk_put(key, entry)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits / total) if total else 0.0,
+                "entries": len(self._mem),
+                "disk_bytes": self._disk_bytes,
+            }
+
+
+class CachedCompletion:
+    """One request's view of a model call through the cache.
+
+    `call(messages, max_tokens) -> str` is the uncached model call; use
+    .complete (sync) or .acomplete (async) in its place. hits/misses count
+    this request only, and .status() is "hit", "miss" or "partial".
+    """
+
+    def __init__(self, cache: CompletionCache, call: Callable, model: str, **params):
+        self.cache = cache
+        self.call = call
+        self.model = model
+        self.params = params
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _lookup(self, messages: Messages, max_tokens: int) -> Tuple[str, Optional[str]]:
+        key = completion_key(self.model, messages, dict(self.params, max_tokens=max_tokens))
+        content = self.cache.get(key)
+        with self._lock:
+            if content is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return key, content
+
+    def complete(self, messages: Messages, max_tokens: int) -> str:
+        key, content = self._lookup(messages, max_tokens)
+        if content is None:
+            content = self.call(messages, max_tokens)
+            self.cache.put(key, content, self.model)
+        return content
+
+    async def acomplete(self, messages: Messages, max_tokens: int) -> str:
+        key, content = self._lookup(messages, max_tokens)
+        if content is None:
+            content = self.call(messages, max_tokens)
+            if asyncio.iscoroutine(content):
+                content = await content
+            self.cache.put(key, content, self.model)
+        return content
+
+    def status(self) -> str:
+        if self.hits and not self.misses:
+            return "hit"
+        return "partial" if self.hits else "miss"
+
+
+def cache_from_env() -> CompletionCache:
+    return CompletionCache(
+        disk_dir=os.getenv("COMPLETION_CACHE_DIR", "").strip() or None,
+        ttl=float(os.getenv("COMPLETION_CACHE_TTL", "604800") or 604800),
+        disk_max_bytes=int(float(os.getenv("COMPLETION_CACHE_MAX_MB", "256") or 256) * 1024 * 1024),
+        max_entries=int(os.getenv("COMPLETION_CACHE_ENTRIES", "256") or 0),
+    )
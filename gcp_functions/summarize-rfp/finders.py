@@ -0,0 +1,46 @@
+"""Field and section finders for tender text.
+
+The regexes behind extract_basic_fields (closing date, solicitation id,
+buyer, contact, title), the section headings it recognises and the keyword
+ranking. They have no PDF dependencies, so the LLM functions use them too
+to pick which passages to send (salience.py).
+
+This file is shared verbatim by backend-upgrade/, gcp_functions/summarize_rfp/
+and gcp_functions/summarize-rfp/ (each deploys from its own directory);
+keep the copies in sync.
+"""
+import re, regex
+from typing import List, Union
+from textdoc import Document
+
+DATE_RX = regex.compile(
+    r"(closing|due|submission)\s*(date|deadline)[^\S\r\n]*[:\-]?\s*"
+    r"(?P<date>(?:\d{4}[-/]\d{1,2}[-/]\d{1,2})|(?:\d{1,2}\s+\w+\s+\d{4})|(?:\w+\s+\d{1,2},\s*\d{4}))",
+    regex.IGNORECASE
+)
+ID_RX = regex.compile(r"(solicitation|tender|rfp|rfq|itt|reference)\s*(no\.?|#|id)?\s*[:\-]?\s*(?P<id>[A-Z0-9\-_/]{4,})", regex.IGNORECASE)
+BUYER_RX = regex.compile(r"(buyer|purchasing|procurement|organization|department)\s*[:\-]\s*(?P<buyer>.+)", regex.IGNORECASE)
+EMAIL_RX = re.compile(r"[A-Z0-9._%+-]+@[A-Z0-9.-]+\.[A-Z]{2,}", re.I)
+PHONE_RX = re.compile(r"(\+?\d[\d\-\s().]{7,}\d)")
+CURRENCY_RX = re.compile(r"\b(CAD|USD|C\$|\$)\b")
+MONEY_RX = re.compile(r"(?<!\w)(\d{1,3}(?:,\d{3})*(?:\.\d{2})?)")
+TITLE_RX = regex.compile(r"(?m)^\s*(request for.*|rfp.*|rfq.*|tender.*|standing offer.*|proposal.*)$", regex.IGNORECASE)
+
+KEYWORD_STOPWORDS = frozenset("the and for with this that from are was were will would shall into upon about your have not you our any all per his her its may can as is on to of in by or an be it a".split())
+
+def top_keywords(text: Union[str, Document], k: int = 12) -> List[str]:
+    # alphabetic terms of 3+ letters, read off the document's term-frequency table
+    doc = Document.of(text)
+    freq = [(t, c) for t, c in zip(doc.terms, doc.tf)
+            if len(t) >= 3 and t.isalpha() and t not in KEYWORD_STOPWORDS]
+    return [w for w,_ in sorted(freq, key=lambda x: (-x[1], x[0]))[:k]]
+
+# Section headings recognised by extract_basic_fields. A section runs from a
+# line starting with one of these names to the next line that starts with a
+# non-space character; only indented bullets inside it are collected.
+SECTION_PATTERNS = {
+    "deliverables": [r"deliverables?", r"scope of work", r"tasks?"],
+    "mandatory": [r"mandatory requirements?", r"minimum requirements?", r"must"],
+    "rated": [r"rated criteria", r"evaluation criteria", r"point-rated"],
+    "submission": [r"submission instructions?", r"how to submit", r"proposal submission", r"closing location"],
+}
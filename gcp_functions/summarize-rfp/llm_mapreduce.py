@@ -0,0 +1,142 @@
+"""Chunked map-reduce summarization for documents longer than one prompt.
+
+The text is split into chunks of about MAP_CHUNK_TOKENS (paragraph, then
+sentence boundaries; 4 chars/token as elsewhere). Each chunk is summarized
+into notes concurrently, with at most LLM_MAX_INFLIGHT model calls in
+flight. Notes that still do not fit one prompt are collapsed in groups,
+and a final call with the function's own system prompt merges them into
+the summary. A document that fits one chunk costs exactly one call.
+
+`complete(messages, max_tokens) -> str` is supplied by the caller (sync or
+async), so the same code runs against OpenAI or a local stub server.
+
+This file is shared verbatim by gcp_functions/summarize_rfp/ and
+gcp_functions/summarize-rfp/ (each deploys from its own directory); keep
+the copies in sync.
+"""
+import asyncio, os, re
+from typing import Awaitable, Callable, Dict, List, Union
+
+CHARS_PER_TOKEN = 4
+MAP_CHUNK_TOKENS = int(os.getenv("MAP_CHUNK_TOKENS", "3000") or 3000)
+LLM_MAX_INFLIGHT = int(os.getenv("LLM_MAX_INFLIGHT", "4") or 4)
+MAP_MAX_TOKENS = int(os.getenv("MAP_MAX_TOKENS", "400") or 400)
+
+MAP_PROMPT = """You are reading part {part} of {parts} of a Request for Proposal (RFP).
+Write short bullet notes covering only what this part says about: the
+procurement authority, the objective, deliverables, mandatory requirements,
+evaluation criteria, key dates, and how to submit. Skip boilerplate. If the
+part has nothing relevant, answer "(nothing relevant)"."""
+
+COLLAPSE_PROMPT = """Merge these bullet notes from consecutive parts of one RFP into a
+single set of bullet notes. Keep every date, amount, requirement and
+contact; drop duplicates."""
+
+Messages = List[Dict[str, str]]
+Complete = Callable[[Messages, int], Union[str, Awaitable[str]]]
+
+PARAGRAPH_RX = re.compile(r"\n\s*\n")
+SENTENCE_RX = re.compile(r"(?<=[.?!])\s+")
+
+
+def approx_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def _pieces(para: str, budget: int) -> List[str]:
+    # a paragraph larger than one chunk is cut at sentences, then hard-cut
+    if len(para) <= budget:
+        return [para]
+    out: List[str] = []
+    for sent in SENTENCE_RX.split(para):
+        out.extend(sent[i:i + budget] for i in range(0, len(sent), budget))
+    return out
+
+def split_chunks(text: str, chunk_tokens: int = MAP_CHUNK_TOKENS) -> List[str]:
+    """Greedy-pack paragraphs into chunks of at most `chunk_tokens`."""
+    budget = max(1, chunk_tokens) * CHARS_PER_TOKEN
+    chunks: List[str] = []
+    cur: List[str] = []
+    size = 0
+    for para in PARAGRAPH_RX.split(text):
+        para = para.strip()
+        if not para:
+            continue
+        for piece in _pieces(para, budget):
+            if cur and size + 2 + len(piece) > budget:
+                chunks.append("\n\n".join(cur))
+                cur, size = [], 0
+            size += (2 if cur else 0) + len(piece)
+            cur.append(piece)
+    if cur:
+        chunks.append("\n\n".join(cur))
+    return chunks
+
+def _group(notes: List[str], budget: int) -> List[List[str]]:
+    # consecutive notes up to `budget` chars, at least two per group so every round shrinks
+    groups: List[List[str]] = []
+    cur: List[str] = []
+    size = 0
+    for n in notes:
+        if len(cur) >= 2 and size + len(n) > budget:
+            groups.append(cur)
+            cur, size = [], 0
+        cur.append(n)
+        size += len(n)
+    if cur:
+        if len(cur) == 1 and groups:
+            groups[-1].append(cur[0])
+        else:
+            groups.append(cur)
+    return groups
+
+def _numbered(notes: List[str]) -> str:
+    return "\n\n".join(f"[Part {i + 1}]\n{n}" for i, n in enumerate(notes))
+
+
+async def map_reduce(text: str, complete: Complete, system_prompt: str,
+                     chunk_tokens: int = MAP_CHUNK_TOKENS,
+                     max_inflight: int = LLM_MAX_INFLIGHT,
+                     map_max_tokens: int = MAP_MAX_TOKENS,
+                     final_max_tokens: int = 1000) -> Dict[str, object]:
+    """Summarize `text` of any length; returns the summary plus chunk/call counts."""
+    sem = asyncio.Semaphore(max(1, max_inflight))
+    calls = 0
+
+    async def call(messages: Messages, max_tokens: int) -> str:
+        nonlocal calls
+        async with sem:
+            calls += 1
+            if asyncio.iscoroutinefunction(complete):
+                out = await complete(messages, max_tokens)
+            else:
+                out = await asyncio.to_thread(complete, messages, max_tokens)
+        return (out or "").strip()
+
+    chunks = split_chunks(text, chunk_tokens)
+    if len(chunks) <= 1:
+        summary = await call([{"role": "system", "content": system_prompt},
+                              {"role": "user", "content": chunks[0] if chunks else ""}], final_max_tokens)
+        return {"summary": summary, "chunks": len(chunks), "calls": calls, "rounds": 1}
+
+    # map: notes for every chunk, concurrently
+    n = len(chunks)
+    notes = await asyncio.gather(*(
+        call([{"role": "system", "content": MAP_PROMPT.format(part=i + 1, parts=n)},
+              {"role": "user", "content": c}], map_max_tokens)
+        for i, c in enumerate(chunks)))
+    rounds = 1
+
+    # collapse: merge neighbouring notes until they fit one prompt
+    budget = max(1, chunk_tokens) * CHARS_PER_TOKEN
+    while len(notes) > 1 and len(_numbered(notes)) > budget:
+        notes = await asyncio.gather(*(
+            call([{"role": "system", "content": COLLAPSE_PROMPT},
+                  {"role": "user", "content": _numbered(g)}], map_max_tokens)
+            for g in _group(notes, budget)))
+        rounds += 1
+
+    # reduce: the caller's own prompt over the notes, in document order
+    summary = await call([{"role": "system", "content": system_prompt},
+                          {"role": "user", "content": "Notes taken from each part of the RFP, in order:\n\n" + _numbered(notes)}],
+                         final_max_tokens)
+    return {"summary": summary, "chunks": n, "calls": calls, "rounds": rounds + 1}
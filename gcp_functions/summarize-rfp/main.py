@@ -1,12 +1,27 @@
 import functions_framework
+import asyncio
 import base64
 import os
 import openai
 
 from flask import abort
+from llm_mapreduce import map_reduce
+from completion_cache import CachedCompletion, cache_from_env
+from salience import approx_tokens, select_context
 
 openai.api_key = os.environ.get("OPENAI_API_KEY")
 
+# "mapreduce" reads the whole document in chunks; "select" makes one call on
+# the highest-value passages within CONTEXT_TOKENS; "truncate" keeps the
+# single call on the first 3000 tokens
+SUMMARY_MODE = os.environ.get("SUMMARY_MODE", "mapreduce")
+CONTEXT_TOKENS = int(os.environ.get("CONTEXT_TOKENS", "3000") or 3000)
+MODEL = "gpt-4"
+TEMPERATURE = 0.3
+
+# repeat calls (same model, prompt, input and sampling parameters) skip the model
+COMPLETION_CACHE = cache_from_env()
+
 system_prompt = """You are a helpful assistant that summarizes a Request 
 for Proposal (RFP) for a Canadian public sector audience.
 
@@ -29,24 +44,40 @@ def summarize_rfp(request):
         file_bytes = base64.b64decode(file_content_b64)
         input_text = file_bytes.decode("utf-8", errors="ignore")
 
-        prompt = f"{system_prompt}\n\n{text_truncate(input_text)}"
+        cached = CachedCompletion(COMPLETION_CACHE, call_model, MODEL, temperature=TEMPERATURE)
+        mode = request_json.get("mode", SUMMARY_MODE)
+        if mode == "mapreduce":
+            # chunk calls run on worker threads, LLM_MAX_INFLIGHT at a time
+            result = asyncio.run(map_reduce(input_text, cached.complete, system_prompt, final_max_tokens=1000))
+            full = approx_tokens(input_text)
+            return {"summary": result["summary"], "chunks": result["chunks"],
+                    "llm_calls": cached.misses, "cache": cached.status(),
+                    "context": {"tokens_full": full, "tokens_sent": full, "selected": False}}
 
-        response = openai.ChatCompletion.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": input_text}
-            ],
-            max_tokens=1000,
-            temperature=0.3,
-        )
+        if mode == "select":
+            prompt_text, context = select_context(input_text, CONTEXT_TOKENS)
+        else:
+            prompt_text = text_truncate(input_text)
+            context = {"tokens_full": approx_tokens(input_text), "tokens_sent": approx_tokens(prompt_text), "selected": False}
 
-        summary = response["choices"][0]["message"]["content"]
-        return {"summary": summary}
+        summary = cached.complete([
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt_text}
+        ], 1000)
+        return {"summary": summary, "llm_calls": cached.misses, "cache": cached.status(), "context": context}
 
     except Exception as e:
         return {"error": str(e)}, 500
 
+def call_model(messages, max_tokens):
+    response = openai.ChatCompletion.create(
+        model=MODEL,
+        messages=messages,
+        max_tokens=max_tokens,
+        temperature=TEMPERATURE,
+    )
+    return response["choices"][0]["message"]["content"]
+
 def text_truncate(text, max_tokens=3000):
     # Approximate token count using 4 chars/token heuristic
     max_chars = max_tokens * 4
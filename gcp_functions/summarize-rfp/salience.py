@@ -0,0 +1,151 @@
+"""Pick the passages of a tender worth sending to the model.
+
+select_context() splits the text into passages (blocks between blank
+lines, merged up to about PASSAGE_CHARS), drops lines that repeat on many
+pages (running headers and footers) and scores each passage with the
+finders behind backend-upgrade/extract.py (finders.py):
+- a heading from SECTION_PATTERNS (mandatory, rated, submission,
+  deliverables), and with a decaying share the passages under it;
+- hits of the field finders (closing date, solicitation id, buyer,
+  e-mail, title);
+- how dense the document's top keywords are in it.
+Mostly-French passages (the second half of bilingual cover pages) are
+damped. The best passages are packed into the token budget and returned in
+document order, with "[...]" where text was skipped.
+
+This file is shared verbatim by gcp_functions/summarize_rfp/ and
+gcp_functions/summarize-rfp/ (each deploys from its own directory); keep
+the copies in sync. It needs finders.py and textdoc.py next to it.
+"""
+import regex
+from collections import Counter
+from typing import Dict, List, Tuple
+from finders import BUYER_RX, DATE_RX, EMAIL_RX, ID_RX, SECTION_PATTERNS, TITLE_RX, top_keywords
+from textdoc import TOKEN_RX, Document
+
+CHARS_PER_TOKEN = 4
+PASSAGE_CHARS = 900
+REPEATED_LINE_MIN = 3   # a line seen this often is a page header/footer
+
+SECTION_WEIGHTS = {"mandatory": 6.0, "rated": 5.0, "submission": 5.0, "deliverables": 4.0}
+SECTION_CARRY = 0.6     # share of a heading's weight given to the passage after it
+SECTION_DECAY = 0.8     # and the factor for each passage after that
+FIELD_WEIGHT = 3.0
+KEYWORD_WEIGHT = 12.0
+FRENCH_DAMPING = 0.15
+
+# optional "4.2", "A.", "(b)" numbering before a heading
+HEADING_RX = regex.compile(
+    r"^\s*(?:\(?(?:\d+|[a-z])(?:\.\d+)*[.)]?\s+)?(?:"
+    + "|".join(f"(?P<{name}>{'|'.join(pats)})" for name, pats in SECTION_PATTERNS.items())
+    + r")\b",
+    regex.IGNORECASE | regex.MULTILINE,
+)
+# (literal every match contains, finder): the regex only runs when one is present
+FIELD_FINDERS = (
+    (("closing", "due", "submission"), DATE_RX),
+    (("solicitation", "tender", "rfp", "rfq", "itt", "reference"), ID_RX),
+    (("buyer", "purchasing", "procurement", "organization", "department"), BUYER_RX),
+    (("@",), EMAIL_RX),
+    (("request for", "rfp", "rfq", "tender", "standing offer", "proposal"), TITLE_RX),
+)
+
+FRENCH = frozenset("le la les des du de et au aux une un dans sur par pour est sont ou ce cette qui que avec être présente soumission soumissions".split())
+ENGLISH = frozenset("the and of to for in is are be by with this that or on as any all shall will".split())
+
+
+def approx_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def _passages(text: str) -> List[str]:
+    lines = text.splitlines()
+    counts = Counter(ln.strip() for ln in lines if ln.strip())
+    blocks: List[List[str]] = [[]]
+    for ln in lines:
+        s = ln.strip()
+        if not s:
+            if blocks[-1]:
+                blocks.append([])
+            continue
+        if counts[s] >= REPEATED_LINE_MIN and len(s) < 120:
+            continue
+        blocks[-1].append(ln.rstrip())
+
+    out: List[str] = []
+    cur = ""
+    for b in blocks:
+        if not b:
+            continue
+        block = "\n".join(b)
+        while len(block) > PASSAGE_CHARS:
+            cut = block.rfind("\n", 0, PASSAGE_CHARS)
+            cut = cut if cut > 0 else PASSAGE_CHARS
+            if cur:
+                out.append(cur)
+                cur = ""
+            out.append(block[:cut])
+            block = block[cut:].lstrip("\n")
+        if cur and len(cur) + 2 + len(block) > PASSAGE_CHARS:
+            out.append(cur)
+            cur = ""
+        cur = f"{cur}\n\n{block}" if cur else block
+    if cur:
+        out.append(cur)
+    return out
+
+def _score(passages: List[str], keywords: set) -> List[Tuple[float, List[str]]]:
+    scored = []
+    carry = 0.0
+    for p in passages:
+        sections = sorted({m.lastgroup for m in HEADING_RX.finditer(p)})
+        head = max((SECTION_WEIGHTS[s] for s in sections), default=0.0)
+        score = head + carry
+        carry = head * SECTION_CARRY if head else carry * SECTION_DECAY
+
+        low = p.lower()
+        score += FIELD_WEIGHT * sum(1 for triggers, rx in FIELD_FINDERS
+                                    if any(t in low for t in triggers) and rx.search(p))
+        words = TOKEN_RX.findall(low)
+        if words:
+            score += KEYWORD_WEIGHT * sum(1 for w in words if w in keywords) / len(words)
+            fr = sum(1 for w in words if w in FRENCH)
+            if fr > 2 * sum(1 for w in words if w in ENGLISH):
+                score *= FRENCH_DAMPING
+        scored.append((score, sections))
+    return scored
+
+def select_context(text: str, budget_tokens: int) -> Tuple[str, Dict[str, object]]:
+    """Return (context, stats): the highest-value passages of `text` within `budget_tokens`."""
+    full = approx_tokens(text)
+    if full <= budget_tokens:
+        return text, {"tokens_full": full, "tokens_sent": full, "passages": 0, "passages_sent": 0,
+                      "selected": False, "sections": []}
+
+    passages = _passages(text)
+    keywords = set(top_keywords(Document(text), 20))
+    scored = _score(passages, keywords)
+
+    budget = budget_tokens * CHARS_PER_TOKEN
+    used = 0
+    chosen = []
+    for i in sorted(range(len(passages)), key=lambda i: (-scored[i][0], i)):
+        cost = len(passages[i]) + 9  # "\n\n" join plus room for a "[...]" marker
+        if used + cost <= budget:
+            chosen.append(i)
+            used += cost
+    chosen.sort()
+
+    parts: List[str] = []
+    for n, i in enumerate(chosen):
+        if n and i != chosen[n - 1] + 1:
+            parts.append("[...]")
+        parts.append(passages[i])
+    context = "\n\n".join(parts)
+    return context, {
+        "tokens_full": full,
+        "tokens_sent": approx_tokens(context),
+        "passages": len(passages),
+        "passages_sent": len(chosen),
+        "selected": True,
+        "sections": sorted({s for i in chosen for s in scored[i][1]}),
+    }
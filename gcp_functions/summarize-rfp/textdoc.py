@@ -0,0 +1,80 @@
+"""Tokenize-once view of a document shared by the text analyzers.
+
+Document splits the text into sentence spans and word tokens in one pass and
+keeps a term-frequency table. Tokens are interned as integer ids into a
+lowercased vocabulary and every sentence knows its slice of the token
+stream, so top_keywords, top_sentences and heuristic_summary read the same
+tokens instead of each running its own regexes over the full text.
+
+This file is shared verbatim by backend-upgrade/, cloudfn_summarizer/,
+gcp_functions/summarize_rfp/ and gcp_functions/summarize-rfp/ (each deploys
+from its own directory); keep the copies in sync.
+"""
+import re
+from collections import Counter
+from functools import cached_property
+from typing import Dict, List, Tuple, Union
+
+TOKEN_RX = re.compile(r"\w+")
+# same breaks as re.split(r"(?<=[.?!])\s+|\n{2,}", ...) without the slow
+# lookbehind; the punctuation that starts a match stays in its sentence
+SENTENCE_BREAK_RX = re.compile(r"[.?!]\s+|\n\n+")
+
+
+class Document:
+    def __init__(self, text: str):
+        self.text = text
+        self.sentences: List[Tuple[int, int]] = []   # stripped (start, end) offsets into text
+        self.bounds: List[int] = [0]                  # sentence i owns ids[bounds[i]:bounds[i + 1]]
+        tokens: List[str] = []
+        start = 0
+        for m in SENTENCE_BREAK_RX.finditer(text):
+            end = m.start()
+            self._add_sentence(start, end + (text[end] != "\n"), tokens)
+            start = m.end()
+        self._add_sentence(start, len(text), tokens)
+
+        # intern: one id per lowercased term, counted once per distinct raw form
+        raw = Counter(tokens)
+        self.vocab: Dict[str, int] = {}
+        raw_id: Dict[str, int] = {}
+        for t in raw:
+            raw_id[t] = self.vocab.setdefault(t.lower(), len(self.vocab))
+        self.terms: List[str] = list(self.vocab)
+        self.tf: List[int] = [0] * len(self.terms)
+        for t, c in raw.items():
+            self.tf[raw_id[t]] += c
+        self.ids: List[int] = list(map(raw_id.__getitem__, tokens))
+
+    def _add_sentence(self, start: int, end: int, tokens: List[str]) -> None:
+        piece = self.text[start:end]
+        stripped = piece.strip()
+        if not stripped:
+            return
+        start += len(piece) - len(piece.lstrip())
+        end = start + len(stripped)
+        tokens.extend(TOKEN_RX.findall(self.text, start, end))
+        self.sentences.append((start, end))
+        self.bounds.append(len(tokens))
+
+    @classmethod
+    def of(cls, text: Union[str, "Document"]) -> "Document":
+        return text if isinstance(text, Document) else cls(text)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def sentence(self, i: int) -> str:
+        start, end = self.sentences[i]
+        return self.text[start:end]
+
+    def sentence_ids(self, i: int) -> List[int]:
+        return self.ids[self.bounds[i]:self.bounds[i + 1]]
+
+    def freq(self) -> Dict[str, int]:
+        return dict(zip(self.terms, self.tf))
+
+    @cached_property
+    def folded(self) -> str:
+        """Case-folded text, for literal prefilters (see summarize.SignalTable)."""
+        return self.text.casefold()
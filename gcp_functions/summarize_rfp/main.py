@@ -1,11 +1,16 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+from typing import Any, Dict, Optional
 import base64
 import io
 from pdfminer.high_level import extract_text
 import openai
 import os
+from llm_mapreduce import map_reduce
+from completion_cache import CachedCompletion, cache_from_env as completion_cache_from_env
+from pdf_cache import cache_from_env
+from salience import approx_tokens, select_context
 
 # Set up FastAPI app
 app = FastAPI()
@@ -22,14 +27,47 @@ app.add_middleware(
 # Read OpenAI API key from environment variable
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
+# "mapreduce" reads the whole document in chunks; "select" makes one call on
+# the highest-value passages within CONTEXT_TOKENS; "truncate" keeps the old
+# single call on the first 7000 characters
+SUMMARY_MODE = os.getenv("SUMMARY_MODE", "mapreduce")
+CONTEXT_TOKENS = int(os.getenv("CONTEXT_TOKENS", "1750") or 1750)
+MODEL = "gpt-3.5-turbo"
+SYSTEM_PROMPT = "You are an expert in government procurement. Summarize this RFP document clearly and concisely."
+TEMPERATURE = 0.4
+
+# repeat uploads skip pdfminer (keyed by the PDF bytes) and the model
+# (keyed by model, prompt, input and sampling parameters)
+EXTRACT_CACHE = cache_from_env("text")
+COMPLETION_CACHE = completion_cache_from_env()
+
 # Define request model
 class SummarizeRequest(BaseModel):
     filename: str
     content: str  # base64-encoded file content
+    mode: Optional[str] = None  # overrides SUMMARY_MODE
 
 # Define response model
 class SummarizeResponse(BaseModel):
     summary: str
+    chunks: int = 1      # parts the document was summarized in
+    llm_calls: int = 0   # model calls actually made (cache hits excluded)
+    cache: str = "miss"  # "hit", "miss" or "partial"
+    context: Optional[Dict[str, Any]] = None  # tokens sent vs. the full document
+
+async def call_model(messages, max_tokens):
+    response = await openai.ChatCompletion.acreate(
+        model=MODEL,
+        messages=messages,
+        temperature=TEMPERATURE,
+        max_tokens=max_tokens,
+    )
+    return response.choices[0].message.content
+
+def _extract(data: bytes):
+    # pdfminer separates pages with form feeds; the cache stores them per page
+    pages = extract_text(io.BytesIO(data)).split("\x0c")
+    return pages, len(pages)
 
 @app.post("/", response_model=SummarizeResponse)
 async def summarize_rfp(request: SummarizeRequest):
@@ -38,29 +76,37 @@ async def summarize_rfp(request: SummarizeRequest):
         decoded_bytes = base64.b64decode(request.content)
 
         # Extract text from PDF
-        pdf_stream = io.BytesIO(decoded_bytes)
-        extracted_text = extract_text(pdf_stream)
+        entry, _hit = EXTRACT_CACHE.get_or_extract(decoded_bytes, lambda: _extract(decoded_bytes))
+        extracted_text = "\x0c".join(entry["pages"])
 
         if not extracted_text.strip():
             return {"summary": "❌ No extractable text found in the document."}
 
-        # Truncate if too long (OpenAI token limit)
-        max_chars = 7000
-        truncated_text = extracted_text[:max_chars]
+        cached = CachedCompletion(COMPLETION_CACHE, call_model, MODEL, temperature=TEMPERATURE)
+        mode = request.mode or SUMMARY_MODE
+        if mode == "mapreduce":
+            # chunk summaries run concurrently, then one call merges them
+            result = await map_reduce(extracted_text, cached.acomplete, SYSTEM_PROMPT, final_max_tokens=500)
+            full = approx_tokens(extracted_text)
+            return {"summary": result["summary"], "chunks": result["chunks"],
+                    "llm_calls": cached.misses, "cache": cached.status(),
+                    "context": {"tokens_full": full, "tokens_sent": full, "selected": False}}
+
+        if mode == "select":
+            # sections, key facts and keyword-dense passages instead of the cover pages
+            prompt_text, context = select_context(extracted_text, CONTEXT_TOKENS)
+        else:
+            # Truncate if too long (OpenAI token limit)
+            max_chars = 7000
+            prompt_text = extracted_text[:max_chars]
+            context = {"tokens_full": approx_tokens(extracted_text), "tokens_sent": approx_tokens(prompt_text), "selected": False}
 
         # Send to OpenAI for summarization
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are an expert in government procurement. Summarize this RFP document clearly and concisely."},
-                {"role": "user", "content": truncated_text}
-            ],
-            temperature=0.4,
-            max_tokens=500,
-        )
-
-        summary = response.choices[0].message.content.strip()
-        return {"summary": summary}
+        summary = await cached.acomplete([
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt_text}
+        ], 500)
+        return {"summary": summary.strip(), "llm_calls": cached.misses, "cache": cached.status(), "context": context}
 
     except Exception as e:
         return {"summary": f"❌ Error processing file: {str(e)}"}
@@ -1,20 +1,79 @@
-import os, json, urllib.request, urllib.error
+import os, json, threading, time
 import functions_framework
-from flask import Request, make_response
+import requests
+from flask import Request, Response, make_response
+from google.auth import jwt
 from google.auth.transport.requests import Request as GReq
 from google.oauth2 import id_token
+from requests.adapters import HTTPAdapter
 
 TARGET_URL = os.environ["TARGET_URL"]
 APP_SECRET = os.environ["APP_SECRET"]
 CORS_ORIGIN = os.environ.get("CORS_ORIGIN", "*")
+TOKEN_REFRESH_MARGIN = float(os.environ.get("TOKEN_REFRESH_MARGIN", "300") or 300)  # seconds before exp
+PROXY_POOL = int(os.environ.get("PROXY_POOL", "10") or 10)
+PROXY_CHUNK = 64 * 1024
+# upstream response headers passed through to the caller
+FORWARD_HEADERS = ("Content-Type", "Content-Length", "Content-Encoding", "Cache-Control", "ETag", "Server-Timing")
+
+# one keep-alive pool to TARGET_URL (and the metadata server) per instance
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=PROXY_POOL))
+SESSION.mount("http://", HTTPAdapter(pool_connections=2, pool_maxsize=PROXY_POOL))
+
+
+class _TokenCache:
+    """ID token for TARGET_URL, minted again only when it is near expiry (or rejected)."""
+
+    def __init__(self, audience: str):
+        self.audience = audience
+        self._token = None
+        self._exp = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> str:
+        with self._lock:
+            if self._token is None or time.time() > self._exp - TOKEN_REFRESH_MARGIN:
+                tok = id_token.fetch_id_token(GReq(SESSION), self.audience)
+                self._exp = float(jwt.decode(tok, verify=False).get("exp") or time.time() + 3600)
+                self._token = tok
+            return self._token
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._token = None
+
+TOKENS = _TokenCache(TARGET_URL)
+
+
+class _Body:
+    """The caller's request stream with a known length, so it is forwarded as-is (no chunked encoding)."""
+
+    def __init__(self, stream, length: int):
+        self._stream = stream
+        self._len = length
+
+    def __len__(self):
+        return self._len
+
+    def read(self, n=-1):
+        return self._stream.read(n)
 
 def _cors(resp):
     resp.headers["Access-Control-Allow-Origin"] = CORS_ORIGIN
     resp.headers["Access-Control-Allow-Methods"] = "POST, OPTIONS"
     resp.headers["Access-Control-Allow-Headers"] = "Content-Type, X-App-Secret"
-    resp.headers["Vary"] = "Origin"
+    resp.headers["Vary"] = "Origin, Accept-Encoding"
     return resp
 
+def _relay(upstream):
+    # raw bytes, still compressed if the upstream compressed them; the pooled connection is released at the end
+    try:
+        for chunk in upstream.raw.stream(PROXY_CHUNK, decode_content=False):
+            yield chunk
+    finally:
+        upstream.close()
+
 @functions_framework.http
 def invoke(req: Request):
     if req.method == "OPTIONS":
@@ -23,26 +82,21 @@ def invoke(req: Request):
     if req.headers.get("X-App-Secret") != APP_SECRET:
         return _cors(make_response((json.dumps({"ok": False, "error": "unauthorized"}), 401, {"Content-Type": "application/json"})))
 
-    try:
-        payload = req.get_json(force=True, silent=False)
-    except Exception:
-        return _cors(make_response((json.dumps({"ok": False, "error": "invalid json"}), 400, {"Content-Type": "application/json"})))
-
-    # Mint ID token (aud = TARGET_URL)
-    tok = id_token.fetch_id_token(GReq(), TARGET_URL)
-
-    data = json.dumps(payload).encode("utf-8")
-    fwd = urllib.request.Request(
-        TARGET_URL, data=data, method="POST",
-        headers={"Authorization": f"Bearer {tok}", "Content-Type": "application/json"}
-    )
+    # the body is not parsed: it streams through to TARGET_URL and the upstream validates it
+    length = req.content_length
+    body = _Body(req.stream, length) if length is not None else req.get_data()
+    headers = {"Authorization": f"Bearer {TOKENS.get()}",
+               "Content-Type": req.headers.get("Content-Type") or "application/json",
+               # the body is relayed undecoded, so only encodings the caller accepts may come back
+               "Accept-Encoding": req.headers.get("Accept-Encoding") or "identity"}
 
     try:
-        with urllib.request.urlopen(fwd, timeout=60) as r:
-            body = r.read()
-            resp = make_response((body, r.status, {"Content-Type": r.headers.get("Content-Type", "application/json")}))
-            return _cors(resp)
-    except urllib.error.HTTPError as e:
-        err = e.read()
-        resp = make_response((err, e.code, {"Content-Type": "application/json"}))
-        return _cors(resp)
+        upstream = SESSION.post(TARGET_URL, data=body, headers=headers, stream=True, timeout=(10, 60))
+    except requests.RequestException as e:
+        return _cors(make_response((json.dumps({"ok": False, "error": "upstream unavailable", "detail": str(e)}), 502, {"Content-Type": "application/json"})))
+    if upstream.status_code == 401:
+        TOKENS.invalidate()
+
+    out = {h: upstream.headers[h] for h in FORWARD_HEADERS if h in upstream.headers}
+    out.setdefault("Content-Type", "application/json")
+    return _cors(Response(_relay(upstream), status=upstream.status_code, headers=out, direct_passthrough=True))
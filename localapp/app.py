@@ -1,13 +1,14 @@
-import os, json, base64, traceback
+import os, json, hashlib, threading, traceback
+from collections import OrderedDict
 from datetime import datetime
-from flask import Flask, render_template, request, redirect, url_for, flash
+from flask import Flask, Response, render_template, request, redirect, url_for, flash, stream_template
 from markdown import markdown as md_to_html
 from markupsafe import Markup
-import requests
+from backend_client import BackendClient, IdTokenCache
+from jobs import Job, JobFailed, queue_from_env
 
 try:
     from google.oauth2 import service_account
-    from google.auth.transport.requests import Request as GARequest
 except Exception:
     service_account = None
 
@@ -20,6 +21,9 @@ BACKEND_AUTH = os.getenv("BACKEND_AUTH", "none").strip().lower()
 BACKEND_AUDIENCE = os.getenv("BACKEND_AUDIENCE", "").strip()
 GCP_SA_KEY = os.getenv("GCP_SA_KEY", "")
 GCP_SA_KEY_FILE = os.getenv("GCP_SA_KEY_FILE", "")
+BACKEND_UPLOAD = os.getenv("BACKEND_UPLOAD", "auto").strip().lower()  # auto | multipart | json
+JOBS = queue_from_env()
+RENDER_VERSION = b"1"  # bump when the renderer or result.html changes, so old ETags stop matching
 
 def _md(s: str) -> str:
     return md_to_html(s or "", extensions=["tables","fenced_code","sane_lists"])
@@ -27,7 +31,7 @@ def _md(s: str) -> str:
 def _esc(x): return Markup.escape(str(x))
 
 def _kv_grid(pairs):
-    cells = []
+    yield "<div class='st-meta-grid'>"
     for k, v in pairs:
         if v is None or v == "" or v == []:
             val = "<span class='st-muted'>—</span>"
@@ -35,13 +39,13 @@ def _kv_grid(pairs):
             val = "<ul>" + "".join(f"<li>{_esc(i)}</li>" for i in v) + "</ul>"
         else:
             val = _esc(v)
-        cells.append(f"""
+        yield f"""
           <div class="st-meta">
             <div class="st-meta-key">{_esc(k)}</div>
             <div class="st-meta-val">{val}</div>
           </div>
-        """)
-    return "<div class='st-meta-grid'>" + "".join(cells) + "</div>"
+        """
+    yield "</div>"
 
 def _try_render_heavy_json(d: dict):
     title = d.get("title") or d.get("buyer") or d.get("project") or d.get("name")
@@ -67,54 +71,143 @@ def _try_render_heavy_json(d: dict):
         ("Budget Mentions", budget),
     ])
 
-    if isinstance(highlights, list):
-        hl_html = "<ul>" + "".join(f"<li>{_esc(h)}</li>" for h in highlights) + "</ul>"
-    elif isinstance(highlights, str):
-        hl_html = _md(highlights)
-    else:
-        hl_html = ""
-
-    return f"""
+    def render():
+        yield f"""
       <div class="st-heavy">
         <h2 class="st-h2">{_esc(title or "RFP")}</h2>
-        {grid}
-        {"<h3 class='st-h3'>Highlights</h3>"+hl_html if hl_html else ""}
+        """
+        yield from grid
+        yield "\n        "
+        if isinstance(highlights, list):
+            yield "<h3 class='st-h3'>Highlights</h3><ul>"
+            for h in highlights:
+                yield f"<li>{_esc(h)}</li>"
+            yield "</ul>"
+        elif isinstance(highlights, str):
+            hl_html = _md(highlights)
+            if hl_html:
+                yield "<h3 class='st-h3'>Highlights</h3>" + hl_html
+        yield """
       </div>
     """
+    return render()
+
+def _iter_json(v, chunk: int = 16 * 1024):
+    # explicit stack instead of recursion, so deep payloads cost no generator
+    # chains; it holds containers still to expand and finished html strings
+    # (leaves are escaped as they are pushed). Output leaves in ~chunk pieces.
+    out, size = [], 0
+    rows = {}  # row opening html per key; payload keys repeat a lot
+    stack = [v if isinstance(v, (dict, list)) else _esc(v)]
+    while stack:
+        x = stack.pop()
+        if isinstance(x, dict):
+            piece = "<div class='st-grid'>"
+            stack.append("</div>")
+            for k, y in reversed(list(x.items())):
+                row = rows.get(k)
+                if row is None:
+                    row = rows[k] = f"<div class='st-row'><div class='st-key'>{_esc(k)}</div><div class='st-val'>"
+                stack += ("</div></div>", y if isinstance(y, (dict, list)) else _esc(y), row)
+        elif isinstance(x, list):
+            piece = "<ul>"
+            stack.append("</ul>")
+            for y in reversed(x):
+                stack += ("</li>", y if isinstance(y, (dict, list)) else _esc(y), "<li>")
+        else:
+            piece = x
+        out.append(piece)
+        size += len(piece)
+        if size >= chunk:
+            yield "".join(out)
+            out, size = [], 0
+    if out:
+        yield "".join(out)
 
-def _as_html_from_json(d: dict) -> str:
+def _as_html_from_json(d: dict):
     special = _try_render_heavy_json(d)
-    if special: return special
-    def render(v):
-        if isinstance(v, dict):
-            inner = "".join(f"<div class='st-row'><div class='st-key'>{_esc(k)}</div><div class='st-val'>{render(x)}</div></div>" for k,x in v.items())
-            return f"<div class='st-grid'>{inner}</div>"
-        if isinstance(v, list):
-            return "<ul>" + "".join(f"<li>{render(x)}</li>" for x in v) + "</ul>"
-        return _esc(v)
-    return "<section class='st-card'>" + render(d) + "</section>"
+    if special:
+        yield from special
+        return
+    yield "<section class='st-card'>"
+    yield from _iter_json(d)
+    yield "</section>"
 
 def _render_summary_to_html(raw):
+    """Yield the result page body in fragments as it walks the backend payload."""
     if isinstance(raw, dict):
-        return _as_html_from_json(raw)
+        yield from _as_html_from_json(raw)
+        return
     if isinstance(raw, (bytes, bytearray)):
         raw = raw.decode("utf-8", "ignore")
     if isinstance(raw, str):
         try:
             obj = json.loads(raw)
             if isinstance(obj, (dict, list)):
-                return _as_html_from_json(obj if isinstance(obj, dict) else {"data": obj})
+                yield from _as_html_from_json(obj if isinstance(obj, dict) else {"data": obj})
+                return
         except Exception:
             pass
-        return _md(raw)
-    return f"<pre>{_esc(raw)}</pre>"
+        yield _md(raw)
+        return
+    yield f"<pre>{_esc(raw)}</pre>"
+
+def _payload_etag(raw) -> str:
+    if isinstance(raw, (bytes, bytearray)):
+        blob = bytes(raw)
+    elif isinstance(raw, str):
+        blob = raw.encode("utf-8")
+    else:
+        blob = json.dumps(raw, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(RENDER_VERSION + b"\0" + blob).hexdigest()[:32]
+
+def _render_stream(etag: str, raw, chunk: int = 16 * 1024):
+    # fragments are batched into ~16 KB writes; the page is cached once it has been sent in full
+    parts, buf, size = [], [], 0
+    for frag in _render_summary_to_html(raw):
+        buf.append(frag)
+        size += len(frag)
+        if size >= chunk:
+            parts.append("".join(buf))
+            buf, size = [], 0
+            yield parts[-1]
+    if buf:
+        parts.append("".join(buf))
+        yield parts[-1]
+    RENDERED.put(etag, "".join(parts))
+
+class _RenderCache:
+    """Rendered result bodies by payload ETag, least recently used dropped first."""
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            html = self._items.get(key)
+            if html is not None:
+                self._items.move_to_end(key)
+            return html
+
+    def put(self, key, html):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._items[key] = html
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+RENDERED = _RenderCache(int(os.getenv("LOCALAPP_RENDER_CACHE", "64") or 0))
 
 def _error_panel(title: str, detail: str):
     md = f"## {title}\n\n```\n{detail.strip()}\n```"
     return _md(md)
 
-def _id_token_via_sa(audience: str) -> str:
-    if not audience:
+def _sa_credentials():
+    # called once, on the first authenticated upload; IdTokenCache refreshes the token
+    if not BACKEND_AUDIENCE:
         raise RuntimeError("BACKEND_AUDIENCE is required for authenticated calls.")
     info = None
     if GCP_SA_KEY:
@@ -126,45 +219,58 @@ def _id_token_via_sa(audience: str) -> str:
         raise RuntimeError("Service account not provided. Set GCP_SA_KEY or GCP_SA_KEY_FILE.")
     if service_account is None:
         raise RuntimeError("google-auth not installed")
-    creds = service_account.IDTokenCredentials.from_service_account_info(info, target_audience=audience)
-    creds.refresh(GARequest())
-    return creds.token
+    return service_account.IDTokenCredentials.from_service_account_info(info, target_audience=BACKEND_AUDIENCE)
+
+BACKEND = BackendClient(BACKEND_URL, upload=BACKEND_UPLOAD, pool=JOBS.workers)
+if BACKEND_AUTH == "sa":
+    BACKEND.tokens = IdTokenCache(_sa_credentials, BACKEND.session)
+
+class BackendError(Exception):
+    def __init__(self, status: int, text: str):
+        super().__init__(f"backend returned {status}")
+        self.html = _error_panel(f"Backend error {status}", text)
 
-def summarize_pdf(file_bytes: bytes, filename: str):
-    # If BACKEND_URL isn't set, return a demo markdown so UI always works.
+def _demo_summary(filename: str) -> str:
+    return (
+        f"# {filename}\n\n"
+        "- **ID:** (demo)\n"
+        "- **Method:** RFP\n"
+        "- **Category:** —\n"
+        "- **Industry tags:** services\n"
+        "- **Closing date:** —\n"
+        "- **Fit score:** 60\n"
+    )
+
+def call_backend(file_bytes: bytes, filename: str, progress=None):
+    """POST the PDF to BACKEND_URL; raises BackendError on an HTTP error status."""
+    resp = BACKEND.post_pdf(file_bytes, filename, {"format": "heavy"}, progress)
+    ct = (resp.headers.get("Content-Type") or "").lower()
+    if resp.status_code >= 400:
+        raise BackendError(resp.status_code, resp.text)
+    if "application/json" in ct:
+        try:
+            return resp.json()
+        except Exception:
+            return resp.text
+    return resp.text
+
+def _summarize_job(job: Job, file_bytes: bytes, filename: str) -> dict:
+    # runs on a JOBS worker thread; stages are streamed to /jobs/<id>/events.
+    # The payload is rendered when the result page is first viewed.
     if not BACKEND_URL:
-        return (
-            f"# {filename}\n\n"
-            "- **ID:** (demo)\n"
-            "- **Method:** RFP\n"
-            "- **Category:** —\n"
-            "- **Industry tags:** services\n"
-            "- **Closing date:** —\n"
-            "- **Fit score:** 60\n"
-        )
-    try:
-        payload = {
-            "filename": filename,
-            "pdf_base64": base64.b64encode(file_bytes).decode("ascii"),
-            "options": {"format": "heavy"},
-        }
-        headers = {"Content-Type": "application/json"}
-        if BACKEND_AUTH == "sa":
-            token = _id_token_via_sa(BACKEND_AUDIENCE)
-            headers["Authorization"] = f"Bearer {token}"
-
-        resp = requests.post(BACKEND_URL, data=json.dumps(payload), headers=headers, timeout=180)
-        ct = (resp.headers.get("Content-Type") or "").lower()
-        if resp.status_code >= 400:
-            return _error_panel(f"Backend error {resp.status_code}", resp.text)
-        if "application/json" in ct:
-            try:
-                return resp.json()
-            except Exception:
-                return resp.text
-        return resp.text
-    except Exception:
-        return _error_panel("Local error while calling backend", traceback.format_exc())
+        raw = _demo_summary(filename)  # demo markdown so the UI works without a backend
+    else:
+        def progress(stage, detail="", **extra):
+            job.update(stage, detail, **extra)
+            if stage == "uploading" and extra.get("percent") == 100:
+                job.update("summarizing", "backend is extracting text and summarizing")
+        try:
+            raw = call_backend(file_bytes, filename, progress)
+        except BackendError as e:
+            raise JobFailed(e.html)
+        except Exception:
+            raise JobFailed(_error_panel("Local error while calling backend", traceback.format_exc()))
+    return {"raw": raw, "etag": _payload_etag(raw)}
 
 @app.get("/")
 def index():
@@ -180,17 +286,55 @@ def upload():
         flash("Please choose a file.")
         return redirect(url_for("index"))
     data = f.read()
+    filename = f.filename
+    job = JOBS.submit(filename, lambda job: _summarize_job(job, data, filename))
+    if request.accept_mimetypes.best == "application/json":
+        return {"job": job.id, "stage": job.stage,
+                "url": url_for("job_page", job_id=job.id),
+                "events": url_for("job_events", job_id=job.id)}, 202
+    return redirect(url_for("job_page", job_id=job.id), code=303)
+
+@app.get("/jobs/<job_id>")
+def job_page(job_id):
+    job = JOBS.get(job_id)
+    if job is None:
+        flash("That job is no longer available; please upload the file again.")
+        return redirect(url_for("index"))
+    if job.stage == "error":
+        return render_template("result.html", html=Markup(job.result or ""))
+    if job.done:
+        return _result_page(job.result)
+    return render_template("job.html", job=job)
+
+def _result_page(result: dict):
+    etag = result["etag"]
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+    else:
+        html = RENDERED.get(etag)
+        if html is not None:
+            resp = Response(render_template("result.html", html=Markup(html)))
+        else:
+            resp = Response(stream_template("result.html", fragments=_render_stream(etag, result["raw"])))
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
+
+@app.get("/jobs/<job_id>/events")
+def job_events(job_id):
+    job = JOBS.get(job_id)
+    if job is None:
+        return {"error": "unknown job"}, 404
     try:
-        raw = summarize_pdf(data, f.filename)
-        html = _render_summary_to_html(raw)
-        return render_template("result.html", html=Markup(html))
-    except Exception:
-        html = _md("## Unhandled error\n\n```\n"+traceback.format_exc()+"\n```")
-        return render_template("result.html", html=Markup(html)), 500
+        start = int(request.headers.get("Last-Event-ID", "-1")) + 1
+    except ValueError:
+        start = 0
+    return Response(JOBS.stream(job, max(0, start)), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @app.get("/health")
 def health():
     return {"ok": True, "time": datetime.utcnow().isoformat(), "backend_url": BACKEND_URL, "auth": BACKEND_AUTH}
 
 if __name__ == "__main__":
-    app.run(host="127.0.0.1", port=8888)
+    app.run(host="127.0.0.1", port=8888, threaded=True)
@@ -0,0 +1,180 @@
+"""Reusable client for the summarizer backend.
+
+- one requests.Session with a keep-alive connection pool, so uploads after
+  the first skip the TCP/TLS handshake;
+- an ID-token cache for service-account auth: the key is read once and the
+  token is refreshed only when it is within REFRESH_MARGIN of expiry (or
+  the backend answers 401), not on every upload;
+- the PDF is sent as a streamed multipart/form-data body read straight from
+  the upload's bytes, instead of base64 inside a JSON string (a third
+  larger, and several in-memory copies).
+
+BACKEND_UPLOAD picks the body format: "multipart", "json" (the legacy
+{"filename", "pdf_base64", "options"} body) or "auto" (default): multipart
+first, falling back to json once if the backend rejects it with 400/415/422
+and remembering whichever worked.
+"""
+import base64, json, threading, uuid
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+REFRESH_MARGIN = 300  # seconds before expiry at which a cached ID token is renewed
+Progress = Callable[..., None]
+
+
+class StreamBody:
+    """Request body read from a list of byte chunks, reporting progress every 5%.
+
+    It has a length, so requests sends Content-Length rather than chunked
+    encoding, and read() slices memoryviews so the upload is never copied whole.
+    """
+
+    def __init__(self, parts: List[Union[bytes, memoryview]], progress: Optional[Progress] = None):
+        self._parts = [memoryview(p) for p in parts if len(p)]
+        self._len = sum(len(p) for p in self._parts)
+        self._i = 0
+        self._off = 0
+        self._sent = 0
+        self._progress = progress
+        self._next = 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    def read(self, n: int = -1) -> bytes:
+        out = []
+        want = self._len - self._sent if n is None or n < 0 else n
+        while want > 0 and self._i < len(self._parts):
+            part = self._parts[self._i]
+            take = part[self._off:self._off + want]
+            out.append(take)
+            want -= len(take)
+            self._off += len(take)
+            if self._off >= len(part):
+                self._i += 1
+                self._off = 0
+        chunk = b"".join(out)
+        self._sent += len(chunk)
+        if self._progress:
+            pct = self._sent * 100 // max(1, self._len)
+            if pct >= self._next:
+                self._progress("uploading", f"{pct}% sent to backend", percent=pct)
+                self._next = min(pct + 5, 100) if pct < 100 else 101
+        return chunk
+
+
+def _quote(s: str) -> str:
+    return s.replace("\\", "\\\\").replace('"', "%22").replace("\r", " ").replace("\n", " ")
+
+def multipart_body(fields: Dict[str, str], filename: str, data: bytes,
+                   progress: Optional[Progress] = None) -> StreamBody:
+    boundary = uuid.uuid4().hex
+    head = "".join(f'--{boundary}\r\nContent-Disposition: form-data; name="{_quote(k)}"\r\n\r\n{v}\r\n'
+                   for k, v in fields.items())
+    head += (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{_quote(filename)}"\r\n'
+             "Content-Type: application/pdf\r\n\r\n")
+    body = StreamBody([head.encode("utf-8"), data, f"\r\n--{boundary}--\r\n".encode("ascii")], progress)
+    body.content_type = f"multipart/form-data; boundary={boundary}"
+    return body
+
+def json_body(fields: Dict[str, object], filename: str, data: bytes,
+              progress: Optional[Progress] = None) -> StreamBody:
+    payload = json.dumps({"filename": filename, "pdf_base64": base64.b64encode(data).decode("ascii"), **fields})
+    body = StreamBody([payload.encode("utf-8")], progress)
+    body.content_type = "application/json"
+    return body
+
+
+class IdTokenCache:
+    """ID token from google-auth credentials, refreshed shortly before it expires.
+
+    `load()` returns IDTokenCredentials (it runs once, on first use, so a
+    missing key surfaces on the first upload rather than at import).
+    """
+
+    def __init__(self, load: Callable[[], object], session: Optional[requests.Session] = None,
+                 request=None, margin: float = REFRESH_MARGIN):
+        self._load = load
+        self._session = session
+        self._request = request
+        self.margin = margin
+        self._creds = None
+        self._lock = threading.Lock()
+        self.refreshes = 0
+
+    def _seconds_left(self) -> float:
+        expiry = getattr(self._creds, "expiry", None)
+        if not getattr(self._creds, "token", None) or expiry is None:
+            return 0.0
+        now = datetime.now(timezone.utc) if expiry.tzinfo else datetime.now(timezone.utc).replace(tzinfo=None)
+        return (expiry - now).total_seconds()
+
+    def token(self) -> str:
+        with self._lock:
+            if self._creds is None:
+                self._creds = self._load()
+            if self._seconds_left() < self.margin:
+                if self._request is None:
+                    from google.auth.transport.requests import Request as GARequest
+                    self._request = GARequest(self._session)
+                self._creds.refresh(self._request)
+                self.refreshes += 1
+            return self._creds.token
+
+    def invalidate(self) -> None:
+        with self._lock:
+            if self._creds is not None:
+                self._creds.token = None
+
+
+class BackendClient:
+    def __init__(self, url: str, upload: str = "auto", tokens: Optional[IdTokenCache] = None,
+                 pool: int = 4, timeout: float = 180):
+        self.url = url
+        self.upload = upload if upload in ("auto", "multipart", "json") else "auto"
+        self.tokens = tokens
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._learned: Optional[str] = None
+
+    def _post(self, mode: str, data: bytes, filename: str, options: Dict[str, object],
+              progress: Optional[Progress]) -> requests.Response:
+        build = multipart_body if mode == "multipart" else json_body
+        fields = {"options": json.dumps(options)} if mode == "multipart" else {"options": options}
+        for attempt in (0, 1):
+            body = build(fields, filename, data, progress)
+            headers = {"Content-Type": body.content_type}
+            if self.tokens is not None:
+                headers["Authorization"] = f"Bearer {self.tokens.token()}"
+            try:
+                resp = self.session.post(self.url, data=body, headers=headers, timeout=self.timeout)
+            except requests.ConnectionError:
+                if attempt:
+                    raise
+                continue  # a pooled connection the server already closed
+            if resp.status_code == 401 and self.tokens is not None and not attempt:
+                self.tokens.invalidate()
+                continue
+            return resp
+        return resp
+
+    def post_pdf(self, data: bytes, filename: str, options: Optional[Dict[str, object]] = None,
+                 progress: Optional[Progress] = None) -> requests.Response:
+        options = options or {}
+        mode = self.upload if self.upload != "auto" else (self._learned or "multipart")
+        resp = self._post(mode, data, filename, options, progress)
+        if self.upload == "auto" and self._learned is None:
+            if mode == "multipart" and resp.status_code in (400, 415, 422):
+                retry = self._post("json", data, filename, options, progress)
+                if retry.status_code < 400:
+                    self._learned = "json"
+                return retry
+            if resp.status_code < 400:
+                self._learned = mode
+        return resp
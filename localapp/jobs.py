@@ -0,0 +1,196 @@
+"""Background summarization jobs for the local app.
+
+An upload becomes a Job run on a small worker pool; the upload request
+returns at once with the job id. Every stage change (queued, uploading,
+summarizing, done/error) is appended to the job's event list and
+wakes the Server-Sent Events streams watching it, so a page that connects
+late (or reconnects with Last-Event-ID) replays what it missed.
+
+Every upload is a new job with a random id, so uploading a file again
+always asks the backend afresh. Finished results are kept in memory and,
+with LOCALAPP_RESULTS_DIR set, on disk for LOCALAPP_RESULTS_DAYS; reloading
+a result page, even after a restart, never calls the backend again.
+
+Env:
+- LOCALAPP_WORKERS: concurrent backend calls (default 2)
+- LOCALAPP_RESULTS_DIR: optional directory for finished results (unset: memory only)
+- LOCALAPP_RESULTS_DAYS: results older than this are removed from LOCALAPP_RESULTS_DIR (default 7)
+- LOCALAPP_KEEP_JOBS: finished jobs kept in memory (default 200)
+"""
+import html, json, os, secrets, tempfile, threading, time, traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, List, Optional
+
+TERMINAL = ("done", "error")
+
+
+class JobFailed(Exception):
+    """Raised by a job's runner; `html` is the error panel stored as its result."""
+
+    def __init__(self, html: str):
+        super().__init__("job failed")
+        self.html = html
+
+
+class Job:
+    def __init__(self, job_id: str, filename: str):
+        self.id = job_id
+        self.filename = filename
+        self.stage = "queued"
+        self.result = None  # the runner's return value, or the error panel's html
+        self.created = time.time()
+        self.finished: Optional[float] = None
+        self.events: List[dict] = []
+        self._cond = threading.Condition()
+        self.update("queued")
+
+    @property
+    def done(self) -> bool:
+        return self.stage in TERMINAL
+
+    def update(self, stage: str, detail: str = "", **extra) -> None:
+        with self._cond:
+            self.stage = stage
+            self.events.append({"stage": stage, "detail": detail,
+                                "t": round(time.time() - self.created, 2), **extra})
+            self._cond.notify_all()
+
+    def finish(self, result, stage: str = "done") -> None:
+        with self._cond:
+            self.result = result
+            self.finished = time.time()
+        self.update(stage)
+
+    def wait(self, start: int, timeout: float) -> List[dict]:
+        """Events from index `start` on, blocking up to `timeout` seconds for the first."""
+        with self._cond:
+            self._cond.wait_for(lambda: len(self.events) > start, timeout)
+            return self.events[start:]
+
+    def to_dict(self) -> dict:
+        return {"id": self.id, "filename": self.filename, "stage": self.stage, "result": self.result,
+                "created": self.created, "finished": self.finished, "events": self.events}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "Job":
+        job = cls.__new__(cls)
+        job.id, job.filename, job.stage, job.result = d["id"], d["filename"], d["stage"], d["result"]
+        job.created, job.finished, job.events = d["created"], d["finished"], d["events"]
+        job._cond = threading.Condition()
+        return job
+
+
+class JobQueue:
+    def __init__(self, workers: int = 2, results_dir: Optional[str] = None, keep: int = 200,
+                 max_age: float = 7 * 86400):
+        self.workers = max(1, workers)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="summarize")
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.keep = keep
+        self.results_dir = results_dir
+        self.max_age = max_age
+        if self.results_dir:
+            try:
+                os.makedirs(self.results_dir, exist_ok=True)
+            except OSError:
+                self.results_dir = None
+
+    @staticmethod
+    def new_id() -> str:
+        return secrets.token_hex(12)
+
+    # -- storage -----------------------------------------------------------
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.results_dir, job_id + ".json")
+
+    def _load(self, job_id: str) -> Optional[Job]:
+        if not self.results_dir or not job_id.isalnum():
+            return None
+        try:
+            with open(self._path(job_id), encoding="utf-8") as f:
+                return Job.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _save(self, job: Job) -> None:
+        if not self.results_dir:
+            return
+        try:
+            fd, tmp = tempfile.mkstemp(dir=self.results_dir, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(job.to_dict(), f, ensure_ascii=False)
+            os.replace(tmp, self._path(job.id))
+        except OSError:
+            pass
+        self._prune()
+
+    def _prune(self) -> None:
+        # drop stored results past max_age, so the directory does not grow without bound
+        cutoff = time.time() - self.max_age
+        try:
+            with os.scandir(self.results_dir) as it:
+                for e in it:
+                    if e.name.endswith((".json", ".tmp")) and e.stat().st_mtime < cutoff:
+                        os.remove(e.path)
+        except OSError:
+            pass
+
+    def _remember(self, job: Job) -> None:
+        # caller holds self._lock; only finished jobs are dropped
+        self._jobs[job.id] = job
+        self._jobs.move_to_end(job.id)
+        finished = [k for k, j in self._jobs.items() if j.done]
+        for k in finished[:max(0, len(finished) - self.keep)]:
+            del self._jobs[k]
+
+    # -- public API --------------------------------------------------------
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                job = self._load(job_id)
+                if job is not None:
+                    self._remember(job)
+            return job
+
+    def submit(self, filename: str, run: Callable[[Job], object]) -> Job:
+        """Queue `run(job) -> result` (JSON-serializable) as a new job."""
+        job = Job(self.new_id(), filename)
+        with self._lock:
+            self._remember(job)
+        self._pool.submit(self._run, job, run)
+        return job
+
+    def _run(self, job: Job, run: Callable[[Job], object]) -> None:
+        try:
+            job.finish(run(job))
+            self._save(job)
+        except JobFailed as e:
+            job.finish(e.html, "error")
+        except Exception:
+            job.finish(f"<pre>{html.escape(traceback.format_exc())}</pre>", "error")
+
+    def stream(self, job: Job, start: int = 0, keepalive: float = 15.0) -> Iterator[str]:
+        """Server-Sent Events for `job` from event `start` until it finishes."""
+        yield "retry: 2000\n\n"
+        while True:
+            events = job.wait(start, keepalive)
+            if not events:
+                yield ": keepalive\n\n"
+                continue
+            for ev in events:
+                yield f"id: {start}\nevent: {ev['stage']}\ndata: {json.dumps(ev)}\n\n"
+                start += 1
+                if ev["stage"] in TERMINAL:
+                    return
+
+
+def queue_from_env() -> JobQueue:
+    return JobQueue(
+        workers=int(os.getenv("LOCALAPP_WORKERS", "2") or 2),
+        results_dir=os.getenv("LOCALAPP_RESULTS_DIR", "").strip() or None,
+        keep=int(os.getenv("LOCALAPP_KEEP_JOBS", "200") or 200),
+        max_age=float(os.getenv("LOCALAPP_RESULTS_DAYS", "7") or 7) * 86400,
+    )
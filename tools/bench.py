@@ -0,0 +1,139 @@
+import argparse, glob, importlib, json, os, platform, statistics, sys, time
+# Benchmark suite for the extraction/summarization hot paths.
+#
+#   python3 tools/bench.py run --save bench/baseline.json
+#   python3 tools/bench.py run --compare bench/baseline.json --tolerance 0.15
+#   python3 tools/bench.py compare bench/baseline.json bench/current.json
+#
+# Text benchmarks use the real tenders in work/*.json; pdf_to_text runs on
+# synthetic PDFs (tools/synth_pdf.py) at 10, 100 and 500 pages. Extraction
+# caches are disabled so every run does the real work.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+os.environ["EXTRACT_CACHE_ENTRIES"] = "0"
+os.environ.pop("EXTRACT_CACHE_DIR", None)
+
+from synth_pdf import synth_tender
+
+# module names reused across the service directories
+_SHARED = ("pdf_cache", "spool", "metrics", "textdoc", "extract", "summarize", "models", "main", "app")
+
+def load(service_dir: str, module: str):
+    """Import `module` from one service directory without clashing with the others."""
+    for name in _SHARED:
+        sys.modules.pop(name, None)
+    sys.path.insert(0, os.path.join(ROOT, service_dir))
+    try:
+        return importlib.import_module(module)
+    finally:
+        sys.path.pop(0)
+
+def work_texts(pattern: str):
+    out = []
+    for p in sorted(glob.glob(pattern)):
+        try:
+            t = json.load(open(p)).get("text") or ""
+        except Exception:
+            continue
+        if len(t) > 1000:
+            out.append((os.path.splitext(os.path.basename(p))[0], t))
+    return out
+
+def timeit(fn, arg, repeat: int):
+    runs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(arg)
+        runs.append((time.perf_counter() - t0) * 1000)
+    return {"median_ms": statistics.median(runs), "min_ms": min(runs), "runs": repeat}
+
+def cases(a):
+    extract = load("backend-upgrade", "extract")
+    summarize = load("backend-upgrade", "summarize")
+    cloudfn = load("cloudfn_summarizer", "main")
+    backend = load("backend", "app")
+
+    def take_all(text):
+        # the seven per-request sections in backend/app.py
+        return backend.SECTION_LOCATOR.build(text)
+
+    text_fns = {
+        "extract_basic_fields": extract.extract_basic_fields,
+        "top_keywords": extract.top_keywords,
+        "heuristic_summary": summarize.heuristic_summary,
+        "top_sentences": cloudfn.top_sentences,
+        "Document": extract.Document,
+        "take_lines": take_all,
+    }
+    for name, text in work_texts(a.glob):
+        for fname, fn in text_fns.items():
+            yield f"{fname}/{name}", fn, text
+
+    workers = a.workers
+    for pages in [int(x) for x in a.pages.split(",") if x.strip()]:
+        pdf = synth_tender(pages)
+        yield f"pdf_to_text/synthetic-{pages}p", lambda d: extract.pdf_to_text(d, workers=workers), pdf
+
+def run(a):
+    results = {}
+    for key, fn, arg in cases(a):
+        fn(arg)  # warm-up: imports, regex compilation, pool start
+        results[key] = timeit(fn, arg, a.repeat)
+        print(f"{key:60} {results[key]['median_ms']:10.2f} ms", flush=True)
+    return {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.platform(),
+            "cpus": os.cpu_count(),
+            "repeat": a.repeat,
+        },
+        "results": results,
+    }
+
+def compare(base: dict, cur: dict, tolerance: float) -> int:
+    regressions = 0
+    for key in sorted(set(base["results"]) | set(cur["results"])):
+        b, c = base["results"].get(key), cur["results"].get(key)
+        if not b or not c:
+            print(f"{key:60} {'(only in ' + ('baseline' if b else 'current') + ')':>24}")
+            continue
+        ratio = c["median_ms"] / b["median_ms"] if b["median_ms"] else float("inf")
+        flag = "REGRESSION" if ratio > 1 + tolerance else "faster" if ratio < 1 - tolerance else ""
+        regressions += flag == "REGRESSION"
+        print(f"{key:60} {b['median_ms']:9.2f} -> {c['median_ms']:9.2f} ms  x{ratio:5.2f}  {flag}")
+    print(f"{regressions} regression(s) beyond {tolerance:.0%}")
+    return 1 if regressions else 0
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    r = sub.add_parser("run")
+    r.add_argument("--glob", default=os.path.join(ROOT, "work", "*.json"))
+    r.add_argument("--pages", default="10,100,500", help="synthetic PDF sizes for pdf_to_text")
+    r.add_argument("--workers", type=int, default=1, help="pdf_to_text workers (1 = serial)")
+    r.add_argument("--repeat", type=int, default=5)
+    r.add_argument("--save", default=None, help="write results JSON here")
+    r.add_argument("--compare", default=None, help="baseline JSON to compare against")
+    r.add_argument("--tolerance", type=float, default=0.15)
+    c = sub.add_parser("compare")
+    c.add_argument("baseline")
+    c.add_argument("current")
+    c.add_argument("--tolerance", type=float, default=0.15)
+    a = ap.parse_args()
+
+    if a.cmd == "compare":
+        sys.exit(compare(json.load(open(a.baseline)), json.load(open(a.current)), a.tolerance))
+
+    out = run(a)
+    if a.save:
+        os.makedirs(os.path.dirname(os.path.abspath(a.save)), exist_ok=True)
+        with open(a.save, "w") as f:
+            json.dump(out, f, indent=2)
+        print(f"saved {a.save}")
+    if a.compare:
+        print()
+        sys.exit(compare(json.load(open(a.compare)), out, a.tolerance))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import argparse, asyncio, os, sys, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+# Throughput of backend-upgrade /v1/summarize with pdf_url at increasing
+# numbers of in-flight requests. A local stub server plays the slow tender
+# host (fixed latency per download), and a /healthz probe runs alongside to
+# show how long the event loop is blocked at worst.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+sys.path.insert(0, os.path.join(ROOT, "backend-upgrade"))
+os.environ.setdefault("EXTRACT_CACHE_ENTRIES", "0")
+
+import httpx
+from synth_pdf import synth_tender
+
+def start_stub(pdf: bytes, latency: float) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        def do_GET(self):
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/pdf")
+            self.send_header("Content-Length", str(len(pdf)))
+            self.end_headers()
+            self.wfile.write(pdf)
+        def log_message(self, *args):
+            pass
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+async def run_level(client, url: str, inflight: int, total: int):
+    sem = asyncio.Semaphore(inflight)
+    done = asyncio.Event()
+    worst = 0.0
+
+    async def one():
+        async with sem:
+            r = await client.post("/v1/summarize", data={"pdf_url": url})
+            r.raise_for_status()
+
+    async def probe():
+        nonlocal worst
+        while not done.is_set():
+            t0 = time.perf_counter()
+            await client.get("/healthz")
+            worst = max(worst, time.perf_counter() - t0)
+            await asyncio.sleep(0.01)
+
+    p = asyncio.create_task(probe())
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - t0
+    done.set()
+    await p
+    return total / elapsed, worst
+
+async def main(a):
+    import main as svc
+    srv = start_stub(synth_tender(a.pages), a.latency_ms / 1000)
+    url = f"http://127.0.0.1:{srv.server_address[1]}/tender.pdf"
+    async with svc.lifespan(svc.app):
+        transport = httpx.ASGITransport(app=svc.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://svc", timeout=300) as client:
+            base = None
+            for inflight in [int(x) for x in a.inflight.split(",")]:
+                rps, worst = await run_level(client, url, inflight, max(a.requests, inflight * 2))
+                base = base or rps
+                print(f"in-flight {inflight:3}  {rps:6.2f} req/s  x{rps / base:4.1f}  worst /healthz {worst * 1000:7.1f} ms")
+    srv.shutdown()
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", type=int, default=5)
+    ap.add_argument("--latency-ms", type=float, default=300, help="stub server delay per download")
+    ap.add_argument("--inflight", default="1,2,4,8,16")
+    ap.add_argument("--requests", type=int, default=16)
+    asyncio.run(main(ap.parse_args()))
@@ -0,0 +1,41 @@
+import argparse, glob, json, os, sys, time
+# Compare backend-upgrade extract_basic_fields (single-pass FieldScanner)
+# against the original multi-regex implementation on the work/*.json texts,
+# scaled up to show how each grows with document length.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "backend-upgrade"))
+from extract import extract_basic_fields, _extract_basic_fields_multipass
+
+def load_texts(pattern):
+    out = []
+    for p in sorted(glob.glob(pattern)):
+        try:
+            t = json.load(open(p)).get("text") or ""
+        except Exception:
+            continue
+        if len(t) > 1000:
+            out.append((os.path.basename(p), t))
+    return out
+
+def best_of(fn, arg, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(arg)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+ap = argparse.ArgumentParser()
+ap.add_argument("--glob", default=os.path.join(ROOT, "work", "*.json"))
+ap.add_argument("--scale", default="1,10,40", help="comma-separated text multipliers")
+ap.add_argument("--repeat", type=int, default=3)
+a = ap.parse_args()
+
+for name, text in load_texts(a.glob):
+    for k in [int(x) for x in a.scale.split(",") if x.strip()]:
+        big = text * k
+        same = extract_basic_fields(big) == _extract_basic_fields_multipass(big)
+        new = best_of(extract_basic_fields, big, a.repeat)
+        old = best_of(_extract_basic_fields_multipass, big, a.repeat)
+        print(f"{name[:32]:32} x{k:<3} {len(big)/1e6:6.2f}MB  single-pass {new*1000:8.1f}ms  "
+              f"multipass {old*1000:8.1f}ms  speedup {old/new:4.2f}x  {'same' if same else 'DIFFERENT'}")
@@ -0,0 +1,102 @@
+import argparse, base64, json, os, statistics, sys, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+# Overhead of the invoker proxy against a local stand-in upstream. The
+# upstream sleeps --connect-ms on each new connection (TLS to Cloud Run) and
+# sends its response in --chunks pieces --chunk-ms apart, so time to first
+# byte through the proxy shows whether the body is streamed or buffered.
+# ID tokens come from a stand-in minter that sleeps --token-ms per token.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+import requests
+
+def start_upstream(connect_ms: float, chunks: int, chunk_ms: float, chunk_kb: int) -> ThreadingHTTPServer:
+    piece = b"x" * (chunk_kb * 1024)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        def setup(self):
+            super().setup()
+            time.sleep(connect_ms / 1000)
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(piece) * chunks))
+            self.end_headers()
+            for i in range(chunks):
+                if i:
+                    time.sleep(chunk_ms / 1000)
+                self.wfile.write(piece)
+                self.wfile.flush()
+        def log_message(self, *args):
+            pass
+
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+def stand_in_token(token_ms: float):
+    def fetch_id_token(request, audience):
+        time.sleep(token_ms / 1000)
+        enc = lambda d: base64.urlsafe_b64encode(json.dumps(d).encode()).rstrip(b"=").decode()
+        return f"{enc({'alg': 'none'})}.{enc({'aud': audience, 'exp': int(time.time()) + 3600})}.sig"
+    return fetch_id_token
+
+def start_proxy(target: str, token_ms: float):
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    import functions_framework
+    class Quiet(WSGIRequestHandler):
+        def log_request(self, *args):
+            pass
+    os.environ.update(TARGET_URL=target, APP_SECRET="bench")
+    app = functions_framework.create_app(target="invoke", source=os.path.join(ROOT, "invoker", "main.py"))
+    sys.modules["main"].id_token.fetch_id_token = stand_in_token(token_ms)
+    srv = make_server("127.0.0.1", 0, app, threaded=True, request_handler=Quiet)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+def timed(session: requests.Session, url: str, body: bytes, headers: dict) -> tuple:
+    t = time.perf_counter()
+    with session.post(url, data=body, headers=headers, stream=True) as r:
+        it = r.iter_content(64 * 1024)
+        first = next(it, b"")
+        ttfb = time.perf_counter() - t
+        n = len(first) + sum(len(c) for c in it)
+    return ttfb, time.perf_counter() - t, n
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--calls", type=int, default=20)
+    ap.add_argument("--body-kb", type=int, default=256)
+    ap.add_argument("--connect-ms", type=float, default=60)
+    ap.add_argument("--token-ms", type=float, default=100)
+    ap.add_argument("--chunks", type=int, default=8)
+    ap.add_argument("--chunk-ms", type=float, default=50)
+    ap.add_argument("--chunk-kb", type=int, default=64)
+    args = ap.parse_args()
+
+    up = start_upstream(args.connect_ms, args.chunks, args.chunk_ms, args.chunk_kb)
+    target = f"http://127.0.0.1:{up.server_port}/run"
+    proxy = start_proxy(target, args.token_ms)
+    body = json.dumps({"filename": "bench.pdf", "pdf_base64": "A" * (args.body_kb * 1024)}).encode()
+    headers = {"Content-Type": "application/json", "X-App-Secret": "bench"}
+
+    s = requests.Session()
+    rows = {"direct": [], "proxy": []}
+    for _ in range(args.calls):
+        rows["direct"].append(timed(s, target, body, headers))
+        rows["proxy"].append(timed(s, f"http://127.0.0.1:{proxy.server_port}/", body, headers))
+
+    med = lambda xs: round(statistics.median(xs) * 1000, 1)
+    for name, rs in rows.items():
+        warm = rs[1:]
+        print(json.dumps({"path": name, "first_ms": round(rs[0][1] * 1000, 1),
+                          "ttfb_ms": med([r[0] for r in warm]), "total_ms": med([r[1] for r in warm]),
+                          "bytes": rs[-1][2]}))
+    overhead = statistics.median(p[1] - d[1] for p, d in zip(rows["proxy"][1:], rows["direct"][1:]))
+    print(f"proxy overhead (warm, median): {overhead * 1000:.1f} ms")
+    proxy.shutdown()
+    up.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import argparse, asyncio, json, os, random, sys, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+# Latency of the chunked map-reduce summarizer in gcp_functions against a
+# local stub chat-completions server (fixed delay per call), by chunk count
+# and in-flight limit. The stub also records the peak number of concurrent
+# calls so the LLM_MAX_INFLIGHT bound can be checked.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+sys.path.insert(0, os.path.join(ROOT, "gcp_functions", "summarize_rfp"))
+
+import httpx
+from llm_mapreduce import CHARS_PER_TOKEN, map_reduce
+from synth_pdf import page_text
+
+def start_stub(latency: float) -> ThreadingHTTPServer:
+    lock = threading.Lock()
+    state = {"active": 0, "peak": 0, "calls": 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            with lock:
+                state["active"] += 1
+                state["calls"] += 1
+                state["peak"] = max(state["peak"], state["active"])
+            time.sleep(latency)
+            with lock:
+                state["active"] -= 1
+            words = body["messages"][-1]["content"].split()[:40]
+            out = json.dumps({"choices": [{"message": {"role": "assistant", "content": "- " + " ".join(words)}}]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+        def log_message(self, *args):
+            pass
+
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    srv.daemon_threads = True
+    srv.state = state
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+def document(chunks: int, chunk_tokens: int) -> str:
+    rnd = random.Random(0)
+    paras, size = [], 0
+    while size < chunks * chunk_tokens * CHARS_PER_TOKEN * 0.95:
+        p = page_text(len(paras), rnd, lines=8).replace("\n", " ")
+        paras.append(p)
+        size += len(p) + 2
+    return "\n\n".join(paras)
+
+async def main(a):
+    srv = start_stub(a.latency_ms / 1000)
+    url = f"http://127.0.0.1:{srv.server_address[1]}/v1/chat/completions"
+    async with httpx.AsyncClient(timeout=60, limits=httpx.Limits(max_connections=64)) as client:
+        async def complete(messages, max_tokens):
+            r = await client.post(url, json={"model": "stub", "messages": messages, "max_tokens": max_tokens})
+            r.raise_for_status()
+            return r.json()["choices"][0]["message"]["content"]
+
+        for inflight in [int(x) for x in a.inflight.split(",")]:
+            for n in [int(x) for x in a.chunks.split(",")]:
+                text = document(n, a.chunk_tokens)
+                srv.state["peak"] = 0
+                t0 = time.perf_counter()
+                r = await map_reduce(text, complete, "Summarize this RFP.", chunk_tokens=a.chunk_tokens, max_inflight=inflight)
+                dt = time.perf_counter() - t0
+                print(f"in-flight {inflight:2}  chunks {r['chunks']:3}  calls {r['calls']:3}  rounds {r['rounds']}  "
+                      f"peak concurrent {srv.state['peak']:2}  {dt * 1000:8.0f} ms")
+    srv.shutdown()
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--latency-ms", type=float, default=200, help="stub delay per completion")
+    ap.add_argument("--chunk-tokens", type=int, default=3000)
+    ap.add_argument("--chunks", default="1,2,4,8,16,32")
+    ap.add_argument("--inflight", default="1,4,8")
+    asyncio.run(main(ap.parse_args()))
@@ -0,0 +1,113 @@
+import argparse, base64, json, os, statistics, sys, threading, time, tracemalloc
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+# Upload size, latency and client heap of localapp's backend call: the old
+# path (fresh requests.post, base64 inside JSON, ID token refreshed per
+# call) against localapp/backend_client.py (keep-alive session, multipart
+# streamed from the file bytes, cached ID token). The stand-in backend
+# sleeps --connect-ms on every new connection (TLS handshake to Cloud Run)
+# and the stand-in credentials sleep --token-ms per refresh (token endpoint
+# round trip).
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+sys.path.insert(0, os.path.join(ROOT, "localapp"))
+
+import requests
+from backend_client import BackendClient, IdTokenCache
+from synth_pdf import synth_tender
+
+def start_backend(connect_ms: float) -> ThreadingHTTPServer:
+    state = {"connections": 0, "bytes": 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        def setup(self):
+            super().setup()
+            state["connections"] += 1
+            time.sleep(connect_ms / 1000)
+        def do_POST(self):
+            n = int(self.headers.get("Content-Length") or 0)
+            remaining = n
+            while remaining:
+                remaining -= len(self.rfile.read(min(remaining, 1 << 16)))
+            state["bytes"] += n
+            out = json.dumps({"title": "stand-in", "bytes": n}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+        def log_message(self, *args):
+            pass
+
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    srv.state = state
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+class StandInCredentials:
+    """Quacks like google-auth IDTokenCredentials; refresh() costs one token round trip."""
+    def __init__(self, token_ms: float):
+        self.token_ms = token_ms
+        self.token = None
+        self.expiry = None
+    def refresh(self, request):
+        time.sleep(self.token_ms / 1000)
+        self.token = "stand-in-token"
+        self.expiry = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(hours=1)
+
+def legacy_call(url: str, data: bytes, filename: str, token_ms: float) -> int:
+    # localapp/app.py before backend_client: new creds + refresh, base64 JSON, one-shot requests.post
+    creds = StandInCredentials(token_ms)
+    creds.refresh(None)
+    payload = {"filename": filename, "pdf_base64": base64.b64encode(data).decode("ascii"),
+               "options": {"format": "heavy"}}
+    headers = {"Content-Type": "application/json", "Authorization": f"Bearer {creds.token}"}
+    resp = requests.post(url, data=json.dumps(payload), headers=headers, timeout=180)
+    return resp.json()["bytes"]
+
+def run(name: str, call, n: int) -> dict:
+    times, heap = [], 0
+    sent = 0
+    for _ in range(n):
+        tracemalloc.start()
+        t = time.perf_counter()
+        sent = call()
+        times.append(time.perf_counter() - t)
+        heap = max(heap, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return {"case": name, "request_bytes": sent, "first_ms": round(times[0] * 1000, 1),
+            "median_ms": round(statistics.median(times[1:] or times) * 1000, 1),
+            "heap_peak_mb": round(heap / 1e6, 1)}
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--size-mb", type=float, default=8)
+    ap.add_argument("--calls", type=int, default=10)
+    ap.add_argument("--connect-ms", type=float, default=60, help="stand-in handshake cost per new connection")
+    ap.add_argument("--token-ms", type=float, default=120, help="stand-in ID token refresh cost")
+    args = ap.parse_args()
+
+    data = synth_tender(20, size_mb=args.size_mb)
+    srv = start_backend(args.connect_ms)
+    url = f"http://127.0.0.1:{srv.server_port}/run"
+
+    rows = []
+    srv.state["connections"] = 0
+    rows.append(run("legacy", lambda: legacy_call(url, data, "bench.pdf", args.token_ms), args.calls))
+    rows[-1]["connections"] = srv.state["connections"]
+
+    srv.state["connections"] = 0
+    client = BackendClient(url, upload="multipart")
+    client.tokens = IdTokenCache(lambda: StandInCredentials(args.token_ms), client.session, request=object())
+    rows.append(run("client", lambda: client.post_pdf(data, "bench.pdf", {"format": "heavy"}).json()["bytes"], args.calls))
+    rows[-1]["connections"] = srv.state["connections"]
+    rows[-1]["token_refreshes"] = client.tokens.refreshes
+
+    print(f"pdf {len(data) / 1e6:.1f} MB, {args.calls} calls")
+    for r in rows:
+        print(json.dumps(r))
+    srv.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import argparse, base64, json, os, resource, subprocess, sys, tempfile, tracemalloc
+# Memory comparison of the in-memory upload paths against the
+# spool-to-disk + mmap paths in backend-upgrade and backend. Each case runs
+# in a fresh subprocess and reports peak RSS growth over the post-import
+# baseline (file-backed mmap pages count here, but are reclaimable) and the
+# peak Python heap, which is where the extra copies of the upload live.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+
+CASES = {
+    "upgrade/bytes": "backend-upgrade",
+    "upgrade/spool": "backend-upgrade",
+    "backend/json-b64": "backend",
+    "backend/json-stream": "backend",
+}
+
+def peak_kb() -> int:
+    # VmHWM resets on exec; ru_maxrss would inherit the parent's peak on Linux
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def child(case: str, pdf_path: str, body_path: str) -> None:
+    os.environ["EXTRACT_CACHE_ENTRIES"] = "0"
+    os.environ["PDF_WORKERS"] = "1"
+    sys.path.insert(0, os.path.join(ROOT, CASES[case]))
+    if case.startswith("upgrade/"):
+        from extract import pdf_to_text
+        from spool import spool_stream
+    else:
+        from app import extract_text
+        from spool import spool_json_base64
+    base = peak_kb()
+    tracemalloc.start()
+    if case == "upgrade/bytes":          # await file.read() -> bytes -> BytesIO
+        with open(pdf_path, "rb") as f:
+            data = f.read()
+        n = len(pdf_to_text(data))
+    elif case == "upgrade/spool":
+        with open(pdf_path, "rb") as f, spool_stream(f) as buf:
+            n = len(pdf_to_text(buf))
+    elif case == "backend/json-b64":     # request.get_json() -> b64decode -> BytesIO
+        with open(body_path, "rb") as f:
+            body = json.loads(f.read())
+        raw = base64.b64decode(body["content"])
+        n = len(extract_text(raw)[0])
+    else:
+        with open(body_path, "rb") as f:
+            buf, _ = spool_json_base64(f)
+        with buf:
+            n = len(extract_text(buf)[0])
+    heap = tracemalloc.get_traced_memory()[1]
+    print(json.dumps({"case": case, "base_kb": base, "peak_kb": peak_kb(), "heap_peak": heap, "chars": n}))
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", type=int, default=60)
+    ap.add_argument("--size-mb", type=float, default=25)
+    ap.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    ap.add_argument("--pdf", default=None, help=argparse.SUPPRESS)
+    ap.add_argument("--body", default=None, help=argparse.SUPPRESS)
+    a = ap.parse_args()
+    if a.child:
+        return child(a.child, a.pdf, a.body)
+
+    from synth_pdf import synth_tender
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = os.path.join(tmp, "tender.pdf")
+        body_path = os.path.join(tmp, "body.json")
+        pdf = synth_tender(a.pages, a.size_mb)
+        with open(pdf_path, "wb") as f:
+            f.write(pdf)
+        with open(body_path, "w") as f:
+            json.dump({"filename": "tender.pdf", "content": base64.b64encode(pdf).decode("ascii")}, f)
+        del pdf
+        print(f"{a.pages} pages, {os.path.getsize(pdf_path) / 1e6:.1f} MB PDF")
+        for case in CASES:
+            out = subprocess.run([sys.executable, __file__, "--child", case, "--pdf", pdf_path, "--body", body_path],
+                                 check=True, capture_output=True, text=True).stdout
+            r = json.loads(out.strip().splitlines()[-1])
+            print(f"  {case:22} peak RSS +{(r['peak_kb'] - r['base_kb']) / 1024:7.1f} MB  "
+                  f"peak heap {r['heap_peak'] / 2**20:7.1f} MB  ({r['chars']} chars)")
+
+if __name__ == "__main__":
+    main()
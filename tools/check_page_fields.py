@@ -0,0 +1,74 @@
+import argparse, hashlib, os, random, sys, time
+# Randomized check that backend-upgrade's incremental field scan
+# (FieldScanner.scan_pages over an amendment's page diff) gives exactly what
+# a full scan of the joined pages gives. Pages are built from field
+# fragments, separator-only pages ("  -", "", runs of digits) and filler
+# words, then edited at random the way amendments are; each trial also
+# chains a few versions, reusing the checkpoints of the one before.
+#   check_page_fields.py [--trials 20000] [--seed 0]
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "backend-upgrade"))
+from extract import FIELD_SCANNER
+from page_store import Revision
+
+WORDS = "services maintenance support contractor canada parks bid schedule work site price".split()
+SNIPS = ["Closing date: 2025-09-30", "Closing date", "date:", "2025-10-12", "12 March 2026", "March 12, 2026",
+         "Solicitation No: W6381-26-0007", "Solicitation", "Tender", "tender", "No.", "#", "RFP-2231", "Price in CAD",
+         "Contact: bids@example.gc.ca", "(613) 555-0100", "613", "555-0100", "2024-06-01", "Deliverables",
+         "Mandatory requirements", "Rated criteria", "  - Provide all labour and equipment", "  -", "  - build a thing",
+         "  Submit monthly reports", "  1. First item here", "Submission instructions", "Buyer: Parks Canada Agency",
+         "Request for Proposal - snow", "USD only", "", " : ", "--", "."]
+
+def page(r: random.Random) -> str:
+    x = r.random()
+    if x < 0.08:
+        return ""
+    if x < 0.2:
+        return r.choice(["  -", "   \n  ", " : ", "--", "#", ".", "(613)", "555 1234", "  - "])
+    return "\n".join(r.choice(SNIPS) if r.random() < 0.4 else " ".join(r.choices(WORDS, k=r.randint(1, 6)))
+                     for _ in range(r.randint(1, 6)))
+
+def amend(r: random.Random, pages: list) -> list:
+    new = list(pages)
+    for _ in range(r.randint(0, 4)):
+        op, k = r.random(), r.randrange(len(new) + 1)
+        if op < 0.5 and new:
+            new[min(k, len(new) - 1)] = page(r)
+        elif op < 0.75:
+            new.insert(k, page(r))
+        elif len(new) > 1:
+            del new[min(k, len(new) - 1)]
+    return new
+
+def fingerprints(pages: list) -> list:
+    return [hashlib.sha1(p.encode("utf-8")).hexdigest() for p in pages]
+
+ap = argparse.ArgumentParser()
+ap.add_argument("--trials", type=int, default=20000)
+ap.add_argument("--versions", type=int, default=3, help="amendments chained per trial")
+ap.add_argument("--seed", type=int, default=0)
+a = ap.parse_args()
+
+t0 = time.perf_counter()
+bad = scanned = total = 0
+for trial in range(a.trials):
+    r = random.Random(a.seed * 1_000_003 + trial)
+    cur = [page(r) for _ in range(r.randint(1, 12))]
+    scan = FIELD_SCANNER.scan_pages(cur)[2]
+    for _ in range(a.versions):
+        new = amend(r, cur)
+        rev = Revision(fingerprints(new), {"fingerprints": fingerprints(cur), "pages": cur, "scan": scan})
+        fields, lines, scan = FIELD_SCANNER.scan_pages(new, None, scan, rev.ops)
+        want = FIELD_SCANNER.scan("\n".join(new))
+        scanned += scan["scanned"]
+        total += len(new)
+        if (fields, lines) != want:
+            bad += 1
+            if bad <= 5:
+                diff = {k: (fields[k], want[0][k]) for k in fields if fields[k] != want[0][k]}
+                print(f"MISMATCH trial {trial}\n  before {cur!r}\n  after  {new!r}\n  {diff}")
+            break
+        cur = new
+print(f"{a.trials} trials: {bad} mismatched; {scanned} of {total} pages rescanned; "
+      f"{time.perf_counter() - t0:.1f}s", file=sys.stderr)
+sys.exit(1 if bad else 0)
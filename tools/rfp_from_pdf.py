@@ -1,4 +1,16 @@
-import argparse, json, subprocess, sys, os, re, shutil
+import argparse, glob, hashlib, json, subprocess, sys, os, re, shutil, time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+# One PDF:   rfp_from_pdf.py --pdf file.pdf > doc.json
+# Bulk:      rfp_from_pdf.py --bulk 'tenders/*.pdf' --out work/tenders.jsonl [--workers N]
+# Bulk mode extracts on a process pool and appends one JSON document per line
+# to --out. <out>.manifest.jsonl records path, size, mtime, sha256 and the
+# output offset after each document, so a re-run skips files already
+# converted (unchanged size+mtime, or same content hash) and a crashed run
+# resumes: output past the last recorded offset is truncated and redone.
+# A file whose content changed is converted again and appended; the later
+# line for an id wins. Ids come from the path below the --bulk directory (or
+# the glob's fixed leading directories), so tenders/a/rfp0.pdf is "a-rfp0";
+# paths that still slugify alike get a short hash of the path appended.
 def extract_text(path: str) -> str:
     if shutil.which("pdftotext"):
         try:
@@ -8,36 +20,182 @@ def extract_text(path: str) -> str:
         except Exception:
             pass
     from pypdf import PdfReader
-    out=[]; 
+    out=[];
     for pg in PdfReader(path).pages:
         out.append(pg.extract_text() or "")
     return ("\n\n".join(out)).strip()
-def slugify(name: str) -> str:
-    s = os.path.splitext(os.path.basename(name))[0]
+def slugify(name: str, keep_dirs: bool = False) -> str:
+    s = os.path.splitext(name if keep_dirs else os.path.basename(name))[0]
     return re.sub(r"[^A-Za-z0-9]+","-",s).strip("-").lower() or "rfp"
-ap = argparse.ArgumentParser()
-ap.add_argument("--pdf", required=True)
-ap.add_argument("--id", default=None)
-ap.add_argument("--title", default=None)
-ap.add_argument("--buyer", default="Parks Canada")
-ap.add_argument("--jurisdiction", default="CA-federal")
-ap.add_argument("--method", default="RFP")
-ap.add_argument("--tags", default="general")
-ap.add_argument("--source", default="bulk-pdf")
-ap.add_argument("--summary", default=None)
-a = ap.parse_args()
-text = extract_text(os.path.expanduser(a.pdf))
-rid = a.id or slugify(a.pdf)
-title = a.title or os.path.splitext(os.path.basename(a.pdf))[0].replace("_"," ").replace("-"," ").strip()
-summary = a.summary or (" ".join(text.split()[:30]) + ("…" if len(text.split())>30 else ""))
-doc = {
-  "id": rid,
-  "title": title,
-  "procurement_method": a.method,
-  "buyer": { "name": a.buyer, "jurisdiction": a.jurisdiction },
-  "industry_tags": [t.strip() for t in a.tags.split(",") if t.strip()] or ["general"],
-  "summary": summary or "Summary not provided.",
-  "text": text,
-  "source": a.source
-}
-print(json.dumps(doc, ensure_ascii=False, indent=2))
+def make_doc(a, path: str, text: str, rid=None, title=None, summary=None) -> dict:
+    rid = rid or slugify(path)
+    title = title or os.path.splitext(os.path.basename(path))[0].replace("_"," ").replace("-"," ").strip()
+    summary = summary or (" ".join(text.split()[:30]) + ("…" if len(text.split())>30 else ""))
+    return {
+      "id": rid,
+      "title": title,
+      "procurement_method": a.method,
+      "buyer": { "name": a.buyer, "jurisdiction": a.jurisdiction },
+      "industry_tags": [t.strip() for t in a.tags.split(",") if t.strip()] or ["general"],
+      "summary": summary or "Summary not provided.",
+      "text": text,
+      "source": a.source
+    }
+
+def sha256_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def convert(a, path: str, rid: str, known_sha):
+    # runs in a pool worker; returns (path, stat, sha, json line or None when the content is unchanged)
+    st = os.stat(path)
+    sha = sha256_file(path)
+    if sha == known_sha:
+        return path, st, sha, None
+    return path, st, sha, json.dumps(make_doc(a, path, extract_text(path), rid), ensure_ascii=False)
+
+def find_pdfs(spec: str) -> list:
+    spec = os.path.expanduser(spec)
+    if os.path.isdir(spec):
+        spec = os.path.join(spec, "**", "*.pdf")
+    return sorted(os.path.abspath(p) for p in glob.glob(spec, recursive=True)
+                  if os.path.isfile(p) and p.lower().endswith(".pdf"))
+
+def bulk_root(spec: str) -> str:
+    # the directory a --bulk spec names, or the leading directories of a glob before its first wildcard
+    spec = os.path.abspath(os.path.expanduser(spec))
+    if os.path.isdir(spec):
+        return spec
+    parts = spec.split(os.sep)
+    fixed = next(i for i, part in enumerate(parts + ["*"]) if glob.has_magic(part))
+    return os.sep.join(parts[:fixed]) or os.sep
+
+def bulk_ids(pdfs: list, root: str) -> dict:
+    ids = {p: slugify(os.path.relpath(p, root), keep_dirs=True) for p in pdfs}
+    clash = {}
+    for p, rid in ids.items():
+        clash.setdefault(rid, []).append(p)
+    for rid, paths in clash.items():
+        if len(paths) < 2:
+            continue
+        print(f"id collision: {rid}: " + ", ".join(os.path.relpath(p, root) for p in paths)
+              + "; appending a hash of each path", file=sys.stderr)
+        for p in paths:
+            ids[p] = rid + "-" + hashlib.sha256(os.path.relpath(p, root).encode("utf-8")).hexdigest()[:8]
+    return ids
+
+def load_manifest(path: str) -> dict:
+    entries = {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    e = json.loads(line)
+                    entries[e["path"]] = e
+                except (ValueError, KeyError):
+                    break  # torn last line from a crash
+    except FileNotFoundError:
+        pass
+    return entries
+
+def bulk(a) -> int:
+    pdfs = find_pdfs(a.bulk)
+    ids = bulk_ids(pdfs, bulk_root(a.bulk))
+    out_path = os.path.expanduser(a.out)
+    manifest_path = out_path + ".manifest.jsonl"
+    done = {} if a.force else load_manifest(manifest_path)
+    if a.force:
+        for p in (out_path, manifest_path):
+            if os.path.exists(p):
+                os.remove(p)
+
+    # output beyond the last recorded document was written by a run that died before recording it
+    end = max((e["end"] for e in done.values()), default=0)
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    with open(out_path, "ab") as f:
+        f.truncate(end)
+    # rewrite the manifest once, dropping a torn last line
+    with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+        for e in done.values():
+            f.write(json.dumps(e) + "\n")
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+    todo, skipped = [], 0
+    for p in pdfs:
+        e = done.get(p)
+        st = os.stat(p)
+        if e and e.get("id") != ids[p]:
+            todo.append((p, None))  # converted under an id it no longer gets
+        elif e and e["size"] == st.st_size and e["mtime"] == st.st_mtime:
+            skipped += 1
+        else:
+            todo.append((p, e["sha256"] if e else None))
+    print(f"{len(pdfs)} PDFs: {skipped} already converted, {len(todo)} to do, {a.workers} workers", file=sys.stderr)
+
+    t0 = time.perf_counter()
+    converted = unchanged = failed = 0
+    last = 0.0
+    with open(out_path, "ab") as out, open(manifest_path, "a", encoding="utf-8") as man, \
+         ProcessPoolExecutor(max_workers=a.workers) as pool:
+        futures = {pool.submit(convert, a, p, ids[p], sha): p for p, sha in todo}
+        for fut in as_completed(futures):
+            try:
+                path, st, sha, line = fut.result()
+            except Exception as e:
+                failed += 1
+                print(f"failed: {futures[fut]}: {e}", file=sys.stderr)
+                continue
+            entry = {"path": path, "size": st.st_size, "mtime": st.st_mtime, "sha256": sha}
+            if line is None:
+                unchanged += 1
+                entry.update(id=done[path]["id"], end=done[path]["end"])
+            else:
+                converted += 1
+                out.write(line.encode("utf-8") + b"\n")
+                out.flush()
+                entry.update(id=json.loads(line)["id"], end=out.tell())
+            man.write(json.dumps(entry) + "\n")
+            man.flush()
+            done[path] = entry
+
+            n = converted + unchanged + failed
+            now = time.perf_counter() - t0
+            if now - last >= 1 or n == len(todo):
+                last = now
+                rate = n / now if now else 0.0
+                eta = (len(todo) - n) / rate if rate else 0.0
+                print(f"[{n}/{len(todo)}] {rate:.1f} docs/s  converted {converted}  unchanged {unchanged}  "
+                      f"failed {failed}  eta {eta:.0f}s", file=sys.stderr)
+    return 1 if failed else 0
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--pdf")
+    src.add_argument("--bulk", help="directory (searched recursively) or glob of PDFs")
+    ap.add_argument("--out", help="JSONL output for --bulk")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--force", action="store_true", help="--bulk: ignore the manifest and start over")
+    ap.add_argument("--id", default=None)
+    ap.add_argument("--title", default=None)
+    ap.add_argument("--buyer", default="Parks Canada")
+    ap.add_argument("--jurisdiction", default="CA-federal")
+    ap.add_argument("--method", default="RFP")
+    ap.add_argument("--tags", default="general")
+    ap.add_argument("--source", default="bulk-pdf")
+    ap.add_argument("--summary", default=None)
+    a = ap.parse_args()
+    if a.bulk:
+        if not a.out:
+            ap.error("--bulk needs --out")
+        return bulk(a)
+    text = extract_text(os.path.expanduser(a.pdf))
+    doc = make_doc(a, a.pdf, text, a.id, a.title, a.summary)
+    print(json.dumps(doc, ensure_ascii=False, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+import argparse, glob, json, os, sys, time
+# Index:    search_tenders.py index work/index work/*.json work/tenders.jsonl
+# Search:   search_tenders.py search work/index "snow removal" [-k 10]
+# Also:     search_tenders.py stats|compact work/index
+# Inputs are tender JSON files (tools/rfp_from_pdf.py --pdf), directories of
+# them, or the JSONL written by --bulk. Re-indexing is incremental: a source
+# file whose size and mtime match the last run is not read again, and a
+# document whose title and text are unchanged is not rewritten. Updated
+# documents replace their previous version by id. The index is the one
+# backend-upgrade serves on /v1/search (SEARCH_INDEX_DIR).
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "backend-upgrade"))
+
+from search_index import SearchIndex
+
+SOURCES = "sources.json"  # size/mtime of each input at its last indexing, kept beside the index
+
+def find_inputs(specs: list) -> list:
+    out = []
+    for spec in specs:
+        spec = os.path.expanduser(spec)
+        if os.path.isdir(spec):
+            spec = os.path.join(spec, "**", "*.json*")
+        out += [os.path.abspath(p) for p in glob.glob(spec, recursive=True)
+                if os.path.isfile(p) and p.endswith((".json", ".jsonl"))]
+    return sorted(set(out))
+
+def read_docs(path: str):
+    mtime = os.stat(path).st_mtime
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            items = (json.loads(line) for line in f if line.strip())
+        else:
+            items = [json.load(f)]
+        for d in items:
+            if isinstance(d, dict) and d.get("id") and isinstance(d.get("text"), str):
+                yield {"id": str(d["id"]), "title": d.get("title") or "", "text": d["text"],
+                       "source": os.path.relpath(path, ROOT), "mtime": mtime}
+
+def cmd_index(a) -> int:
+    t0 = time.perf_counter()
+    idx = SearchIndex(a.index)
+    seen_path = os.path.join(a.index, SOURCES)
+    try:
+        with open(seen_path, encoding="utf-8") as f:
+            seen = json.load(f)
+    except FileNotFoundError:
+        seen = {}
+    todo = []
+    own = os.path.abspath(a.index) + os.sep
+    for p in find_inputs(a.inputs):
+        if p.startswith(own):
+            continue
+        st = os.stat(p)
+        if a.force or seen.get(p) != [st.st_size, st.st_mtime]:
+            todo.append((p, [st.st_size, st.st_mtime]))
+    print(f"{len(todo)} input files changed", file=sys.stderr)
+
+    def docs():
+        for p, sig in todo:
+            try:
+                yield from read_docs(p)
+            except (OSError, ValueError) as e:
+                print(f"skipped: {p}: {e}", file=sys.stderr)
+                continue
+            seen[p] = sig
+    counts = idx.add(docs())
+    with open(seen_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(seen, f)
+    os.replace(seen_path + ".tmp", seen_path)
+    print(json.dumps(dict(counts, **idx.stats(), seconds=round(time.perf_counter() - t0, 2))))
+    return 0
+
+def cmd_search(a) -> int:
+    r = SearchIndex(a.index).search(a.query, a.k)
+    if a.json:
+        print(json.dumps(r, ensure_ascii=False, indent=2))
+        return 0
+    for i, hit in enumerate(r["results"], 1):
+        print(f"{i:>3}. {hit['score']:7.3f}  {hit['id']}  {hit['title']}  ({hit['source']})")
+    print(f"{r['total']} matching, {r['took_ms']} ms", file=sys.stderr)
+    return 0
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("index", help="add or update documents")
+    p.add_argument("index")
+    p.add_argument("inputs", nargs="+", help="JSON/JSONL files, directories or globs")
+    p.add_argument("--force", action="store_true", help="re-read every input (unchanged documents are still skipped)")
+    p = sub.add_parser("search")
+    p.add_argument("index")
+    p.add_argument("query")
+    p.add_argument("-k", type=int, default=10)
+    p.add_argument("--json", action="store_true")
+    for name in ("stats", "compact"):
+        sub.add_parser(name).add_argument("index")
+    a = ap.parse_args()
+    if a.cmd == "index":
+        return cmd_index(a)
+    if a.cmd == "search":
+        return cmd_search(a)
+    idx = SearchIndex(a.index)
+    if a.cmd == "compact":
+        idx.compact()
+    print(json.dumps(idx.stats()))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,35 +1,129 @@
-import json, sys, os
-in_path = sys.argv[1] if len(sys.argv)>1 else "work/out/result.out.json"
-j = json.load(open(in_path))
+import argparse, json, sys, os, tempfile, time
+from concurrent.futures import ProcessPoolExecutor
+# One file:  summarize_out.py work/out/x.out.json      (prints the .summary.md path)
+# Batch:     summarize_out.py work/out [--workers N] [--force]
+# Batch mode walks the directory for *.out.json and re-renders only those
+# whose .summary.md is missing or older than the source or than this script
+# (the template), on a process pool. Every file is written to a temp file
+# and renamed into place, so an interrupted run never leaves half a summary.
+TEMPLATE_MTIME = os.stat(os.path.abspath(__file__)).st_mtime
 
 def join_list(v): return ", ".join(v) if isinstance(v, list) else (v or "")
-echo = j.get("echo", {})
-
-lines = []
-lines.append(f"# {j.get('title','(No title)')}")
-lines.append("")
-lines.append(f"- **ID:** {j.get('id','')}")
-lines.append(f"- **Method:** {echo.get('procurement_method','')}")
-lines.append(f"- **Category:** {echo.get('category','')}")
-lines.append(f"- **Industry tags:** {join_list(j.get('industry_tags',[]))}")
-lines.append(f"- **Trade agreements:** {join_list(echo.get('trade_agreements',[]))}")
-lines.append(f"- **Closing date:** {j.get('closing_date','')}")
-lines.append(f"- **Fit score:** {j.get('score',{}).get('fit','')}")
-
-def bullets(label, items, limit=12):
-    if items:
-        lines.append(f"\n## {label}")
-        for it in items[:limit]:
-            if isinstance(it, dict):
-                txt = it.get('text') or it.get('title') or json.dumps(it, ensure_ascii=False)
+
+def render(j: dict) -> str:
+    echo = j.get("echo", {})
+
+    lines = []
+    lines.append(f"# {j.get('title','(No title)')}")
+    lines.append("")
+    lines.append(f"- **ID:** {j.get('id','')}")
+    lines.append(f"- **Method:** {echo.get('procurement_method','')}")
+    lines.append(f"- **Category:** {echo.get('category','')}")
+    lines.append(f"- **Industry tags:** {join_list(j.get('industry_tags',[]))}")
+    lines.append(f"- **Trade agreements:** {join_list(echo.get('trade_agreements',[]))}")
+    lines.append(f"- **Closing date:** {j.get('closing_date','')}")
+    lines.append(f"- **Fit score:** {j.get('score',{}).get('fit','')}")
+
+    def bullets(label, items, limit=12):
+        if items:
+            lines.append(f"\n## {label}")
+            for it in items[:limit]:
+                if isinstance(it, dict):
+                    txt = it.get('text') or it.get('title') or json.dumps(it, ensure_ascii=False)
+                else:
+                    txt = str(it)
+                lines.append(f"- {txt}")
+
+    bullets("Highlights", j.get("highlights",[]))
+    bullets("Warnings", j.get("warnings",[]))
+    bullets("Recommended actions", j.get("actions",[]))
+    return "\n".join(lines) + "\n"
+
+def summary_path(in_path: str) -> str:
+    return in_path.replace(".out.json",".summary.md")
+
+def write_atomic(path: str, text: str) -> None:
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".summary-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+def convert(in_path: str) -> str:
+    with open(in_path, encoding="utf-8") as f:
+        j = json.load(f)
+    out_path = summary_path(in_path)
+    write_atomic(out_path, render(j))
+    return out_path
+
+def convert_many(paths: list) -> list:
+    # one pool task per batch of files: the files are small, so per-task IPC would dominate
+    out = []
+    for p in paths:
+        try:
+            out.append((p, convert(p), None))
+        except Exception as e:
+            out.append((p, None, f"{type(e).__name__}: {e}"))
+    return out
+
+def stale(root: str, force: bool) -> tuple:
+    todo, fresh = [], 0
+    for dirpath, _dirs, files in os.walk(root):
+        names = set(files)
+        for fn in files:
+            if not fn.endswith(".out.json"):
+                continue
+            src = os.path.join(dirpath, fn)
+            md = fn[:-len(".out.json")] + ".summary.md"
+            if not force and md in names:
+                md_mtime = os.stat(os.path.join(dirpath, md)).st_mtime
+                if md_mtime >= os.stat(src).st_mtime and md_mtime >= TEMPLATE_MTIME:
+                    fresh += 1
+                    continue
+            todo.append(src)
+    return sorted(todo), fresh
+
+def batch(root: str, workers: int, force: bool) -> int:
+    t0 = time.perf_counter()
+    todo, fresh = stale(root, force)
+    workers = max(1, min(workers, len(todo) // 64 or 1))
+    size = max(1, -(-len(todo) // (workers * 4)))
+    batches = [todo[i:i + size] for i in range(0, len(todo), size)]
+    failed = 0
+    if workers == 1:
+        results = map(convert_many, batches)
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        results = pool.map(convert_many, batches)
+    for batch_result in results:
+        for src, out_path, err in batch_result:
+            if err:
+                failed += 1
+                print(f"failed: {src}: {err}", file=sys.stderr)
             else:
-                txt = str(it)
-            lines.append(f"- {txt}")
+                print(out_path)
+    if workers > 1:
+        pool.shutdown()
+    dt = time.perf_counter() - t0
+    print(f"rendered {len(todo) - failed}, up to date {fresh}, failed {failed} "
+          f"in {dt:.2f}s ({workers} workers)", file=sys.stderr)
+    return 1 if failed else 0
 
-bullets("Highlights", j.get("highlights",[]))
-bullets("Warnings", j.get("warnings",[]))
-bullets("Recommended actions", j.get("actions",[]))
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("path", nargs="?", default="work/out/result.out.json",
+                    help="an .out.json file, or a directory to refresh in batch")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--force", action="store_true", help="batch: re-render everything")
+    a = ap.parse_args()
+    if os.path.isdir(a.path):
+        return batch(a.path, a.workers, a.force)
+    print(convert(a.path))
+    return 0
 
-out_path = in_path.replace(".out.json",".summary.md")
-with open(out_path, "w") as f: f.write("\n".join(lines) + "\n")
-print(out_path)
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+import argparse, os, random
+# Minimal dependency-free PDF writer for benchmarks: N pages of tender-like
+# text in Helvetica, optionally padded with an unreferenced binary stream to
+# reach a target file size (scanned tenders are mostly image bytes).
+
+WORDS = ("services maintenance support contractor supplier requirements mandatory "
+         "evaluation criteria submission proposal tender solicitation deliverables "
+         "security insurance canada parks agency department bid closing date schedule "
+         "work site equipment training implementation experience reliability").split()
+
+def page_text(i: int, rnd: random.Random, lines: int = 40) -> str:
+    head = [
+        f"Request for Proposal - Page {i + 1}",
+        "Solicitation No: W6381-26-0007",
+        "Closing Date: 2025-09-30",
+        "Buyer: Parks Canada Agency",
+        "Contact: bids@example.gc.ca  (613) 555-0100",
+        "Deliverables",
+        "  - Provide all labour, equipment and supervision",
+        "  - Submit monthly progress reports",
+    ] if i == 0 else []
+    body = [" ".join(rnd.choice(WORDS) for _ in range(12)).capitalize() + "." for _ in range(lines)]
+    return "\n".join(head + body)
+
+def _escape(s: str) -> str:
+    return s.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def make_pdf(pages, pad_bytes: int = 0, seed: int = 0) -> bytes:
+    """Return PDF bytes with one page per string in `pages`."""
+    n = len(pages)
+    objs = [b"<< /Type /Catalog /Pages 2 0 R >>",
+            ("<< /Type /Pages /Kids [%s] /Count %d >>" % (" ".join(f"{3 + 2 * i} 0 R" for i in range(n)), n)).encode()]
+    font = 3 + 2 * n
+    for i, text in enumerate(pages):
+        objs.append((f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + 2 * i} 0 R "
+                     f"/Resources << /Font << /F1 {font} 0 R >> >> >>").encode())
+        ops = " ".join(f"({_escape(ln)}) Tj T*" for ln in text.split("\n"))
+        body = f"BT /F1 9 Tf 11 TL 36 756 Td {ops} ET".encode("latin-1", "replace")
+        objs.append(b"<< /Length %d >>\nstream\n" % len(body) + body + b"\nendstream")
+    objs.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    if pad_bytes > 0:
+        pad = random.Random(seed).randbytes(pad_bytes)
+        objs.append(b"<< /Length %d >>\nstream\n" % len(pad) + pad + b"\nendstream")
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, o in enumerate(objs):
+        offsets.append(len(out))
+        out += f"{i + 1} 0 obj\n".encode() + o + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objs) + 1}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{o:010d} 00000 n \n".encode() for o in offsets)
+    out += f"trailer\n<< /Size {len(objs) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+def synth_tender(n_pages: int, size_mb: float = 0, seed: int = 0) -> bytes:
+    rnd = random.Random(seed)
+    pages = [page_text(i, rnd) for i in range(n_pages)]
+    pdf = make_pdf(pages)
+    pad = int(size_mb * 1024 * 1024) - len(pdf)
+    return make_pdf(pages, pad_bytes=pad, seed=seed) if pad > 0 else pdf
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", type=int, default=100)
+    ap.add_argument("--size-mb", type=float, default=0, help="pad the file up to this size")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", required=True)
+    a = ap.parse_args()
+    with open(os.path.expanduser(a.out), "wb") as f:
+        f.write(synth_tender(a.pages, a.size_mb, a.seed))
+    print(a.out)